@@ -1,9 +1,11 @@
 from functools import wraps
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import redirect
 from django.contrib import messages
-from .models import UserProfile
+from .roles import get_request_profile
 
 
 def role_required(allowed_roles):
@@ -19,20 +21,19 @@ def role_required(allowed_roles):
         @wraps(view_func)
         @login_required
         def _wrapped_view(request, *args, **kwargs):
-            try:
-                user_profile = request.user.userprofile
-                if user_profile.role in allowed_roles:
-                    return view_func(request, *args, **kwargs)
-                else:
-                    messages.error(
-                        request, 
-                        f'Acesso negado. Você não tem permissão para acessar esta página. '
-                        f'Função necessária: {", ".join(allowed_roles)}'
-                    )
-                    return redirect('core:dashboard')
-            except UserProfile.DoesNotExist:
+            # Perfil carregado junto com o usuário: sem consultas extras
+            user_profile = get_request_profile(request)
+            if user_profile is None:
                 messages.error(request, 'Perfil de usuário não encontrado.')
                 return redirect('core:dashboard')
+            if user_profile.role in allowed_roles:
+                return view_func(request, *args, **kwargs)
+            messages.error(
+                request, 
+                f'Acesso negado. Você não tem permissão para acessar esta página. '
+                f'Função necessária: {", ".join(allowed_roles)}'
+            )
+            return redirect('core:dashboard')
         return _wrapped_view
     return decorator
 
@@ -52,6 +53,20 @@ def staff_required(view_func):
     return role_required(['admin', 'farmaceutico', 'operador'])(view_func)
 
 
+def async_login_required(view_func):
+    """
+    login_required para views async (o do Django 4.2 só envolve views
+    síncronas). O usuário da sessão é carregado fora do event loop.
+    """
+    @wraps(view_func)
+    async def _wrapped_view(request, *args, **kwargs):
+        is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return _wrapped_view
+
+
 class RoleRequiredMixin:
     """
     Mixin para Class-Based Views que requer determinados roles
@@ -67,16 +82,15 @@ class RoleRequiredMixin:
         if not request.user.is_authenticated:
             return redirect('authentication:login')
         
-        try:
-            user_profile = request.user.userprofile
-            if user_profile.role not in self.allowed_roles:
-                messages.error(
-                    request,
-                    f'Acesso negado. Função necessária: {", ".join(self.allowed_roles)}'
-                )
-                return redirect('core:dashboard')
-        except UserProfile.DoesNotExist:
+        user_profile = get_request_profile(request)
+        if user_profile is None:
             messages.error(request, 'Perfil de usuário não encontrado.')
             return redirect('core:dashboard')
+        if user_profile.role not in self.allowed_roles:
+            messages.error(
+                request,
+                f'Acesso negado. Função necessária: {", ".join(self.allowed_roles)}'
+            )
+            return redirect('core:dashboard')
         
         return super().dispatch(request, *args, **kwargs)
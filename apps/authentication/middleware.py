@@ -1,23 +1,20 @@
 from django.utils.deprecation import MiddlewareMixin
-from .models import UserProfile
+from django.utils.functional import SimpleLazyObject
+
+from .roles import get_profile_summary
 
 
 class UserProfileMiddleware(MiddlewareMixin):
     """
     Middleware para adicionar informações do perfil do usuário
-    ao contexto de todas as requisições
+    ao contexto de todas as requisições.
+    
+    `request.user_profile` é um resumo do perfil (ProfileSummary) resolvido
+    sob demanda a partir do perfil carregado com o usuário (ProfileModelBackend).
     """
     
     def process_request(self, request):
-        if hasattr(request, 'user') and request.user.is_authenticated:
-            try:
-                request.user_profile = request.user.userprofile
-            except UserProfile.DoesNotExist:
-                # Criar perfil se não existir
-                request.user_profile = UserProfile.objects.create(user=request.user)
-        else:
-            request.user_profile = None
-        
+        request.user_profile = SimpleLazyObject(lambda: get_profile_summary(request))
         return None
 
 
@@ -26,14 +23,15 @@ def user_profile_context_processor(request):
     Context processor para disponibilizar informações do perfil
     em todos os templates
     """
-    if hasattr(request, 'user_profile') and request.user_profile:
+    user_profile = getattr(request, 'user_profile', None)
+    if user_profile:
         return {
-            'user_profile': request.user_profile,
-            'user_role': request.user_profile.role,
-            'user_role_display': request.user_profile.get_role_display(),
-            'is_admin': request.user_profile.is_admin,
-            'is_farmaceutico': request.user_profile.is_farmaceutico,
-            'is_operador': request.user_profile.is_operador,
+            'user_profile': user_profile,
+            'user_role': user_profile.role,
+            'user_role_display': user_profile.get_role_display(),
+            'is_admin': user_profile.is_admin,
+            'is_farmaceutico': user_profile.is_farmaceutico,
+            'is_operador': user_profile.is_operador,
         }
     return {
         'user_profile': None,
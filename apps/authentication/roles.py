@@ -0,0 +1,65 @@
+"""
+Resolução da função (role) do usuário sem consultas extras ao banco.
+
+O ProfileModelBackend carrega o UserProfile junto com o usuário da sessão
+(select_related), então a função é lida do banco a cada requisição, na
+mesma consulta da autenticação: uma alteração de perfil vale na próxima
+requisição em qualquer worker.
+"""
+
+from .models import UserProfile
+
+
+class ProfileSummary:
+    """Dados do perfil usados em autorização e templates"""
+
+    def __init__(self, data):
+        self.pk = self.id = data['id']
+        self.user_id = data['user_id']
+        self.role = data['role']
+        self.role_display = data['role_display']
+
+    def __str__(self):
+        return self.role_display
+
+    def get_role_display(self):
+        return self.role_display
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    @property
+    def is_farmaceutico(self):
+        return self.role == 'farmaceutico'
+
+    @property
+    def is_operador(self):
+        return self.role == 'operador'
+
+
+def get_profile_summary(request):
+    """Resumo do perfil do usuário da requisição (None se anônimo)"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+
+    try:
+        # Já carregado pelo ProfileModelBackend; consulta só em sessões antigas
+        profile = user.userprofile
+    except UserProfile.DoesNotExist:
+        # Criar perfil se não existir
+        profile, created = UserProfile.objects.get_or_create(user=user)
+    return ProfileSummary({
+        'id': profile.pk,
+        'user_id': user.pk,
+        'role': profile.role,
+        'role_display': profile.get_role_display(),
+    })
+
+
+def get_request_profile(request):
+    """Resumo do perfil já resolvido pelo middleware, ou resolvido agora"""
+    if hasattr(request, 'user_profile'):
+        return request.user_profile or None
+    return get_profile_summary(request)
@@ -1,3 +1,52 @@
-from django.test import TestCase
+from django.contrib.auth import get_user
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from .models import UserProfile
+from .roles import get_profile_summary
+
+
+class RoleResolutionTests(TestCase):
+    """Função do usuário lida do banco junto com o usuário da sessão"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('gerente', password='senha-teste')
+        self.user.userprofile.role = 'admin'
+        self.user.userprofile.save()
+        self.client.force_login(self.user)
+
+    def test_role_change_in_another_process_applies_to_next_request(self):
+        self.assertEqual(self.client.get(reverse('core:metrics')).status_code, 200)
+
+        # Outro worker rebaixa o usuário: nenhum sinal dispara neste processo,
+        # cujo cache local continua como estava
+        UserProfile.objects.filter(user=self.user).update(role='operador')
+        response = self.client.get(reverse('core:metrics'))
+        self.assertRedirects(response, reverse('core:dashboard'), fetch_redirect_response=False)
+
+        # Nem depende do conteúdo do cache local
+        cache.clear()
+        response = self.client.get(reverse('core:metrics'))
+        self.assertRedirects(response, reverse('core:dashboard'), fetch_redirect_response=False)
+
+    def test_profile_loaded_with_session_user(self):
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        request.user = get_user(request)
+
+        with self.assertNumQueries(0):
+            summary = get_profile_summary(request)
+        self.assertEqual(summary.role, 'admin')
+        self.assertTrue(summary.is_admin)
+
+    def test_missing_profile_is_created(self):
+        UserProfile.objects.filter(user=self.user).delete()
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        request.user = get_user(request)
+
+        summary = get_profile_summary(request)
+        self.assertEqual(summary.role, 'operador')
+        self.assertTrue(UserProfile.objects.filter(user=self.user).exists())
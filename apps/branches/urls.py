@@ -1,6 +1,17 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Endpoints de polling: versões async quando servido por ASGI (uvicorn)
+if settings.ASYNC_API_VIEWS:
+    api_stock_sync = views.api_stock_sync_async
+    api_get_available_stock = views.api_get_available_stock_async
+    api_branch_stats = views.api_branch_stats_async
+else:
+    api_stock_sync = views.api_stock_sync
+    api_get_available_stock = views.api_get_available_stock
+    api_branch_stats = views.api_branch_stats
+
 app_name = 'branches'
 
 urlpatterns = [
@@ -23,7 +34,7 @@ urlpatterns = [
     path('transfers/<int:pk>/approve/', views.approve_transfer, name='approve_transfer'),
     
     # API para sincronização
-    path('api/stock/<int:branch_pk>/<int:medication_pk>/sync/', views.api_stock_sync, name='api_stock_sync'),
-    path('api/stock/available/', views.api_get_available_stock, name='api_get_available_stock'),
-    path('api/<int:branch_pk>/stats/', views.api_branch_stats, name='api_branch_stats'),
+    path('api/stock/<int:branch_pk>/<int:medication_pk>/sync/', api_stock_sync, name='api_stock_sync'),
+    path('api/stock/available/', api_get_available_stock, name='api_get_available_stock'),
+    path('api/<int:branch_pk>/stats/', api_branch_stats, name='api_branch_stats'),
 ]
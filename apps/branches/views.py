@@ -2,16 +2,25 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Sum, Count
+from django.http import JsonResponse, Http404
+from django.core.cache import cache
+from django.db.models import Sum, Count, F
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 # -*- coding: utf-8 -*-
 from .models import Branch, BranchStock, StockTransfer
 # BranchMedicationBatch foi removido
 from apps.inventory.models import Medication
-from apps.authentication.decorators import farmaceutico_required, admin_required
+from apps.authentication.decorators import farmaceutico_required, admin_required, async_login_required
+from apps.core.db import stock_write_transaction
+from apps.core.models import DataVersion, branch_data_version_name
 from apps.notifications.services import NotificationManager
 
+# Estatísticas da filial em cache (api_branch_stats e a versão async): a chave
+# inclui as versões da filial e do catálogo; o timeout só descarta versões antigas
+BRANCH_STATS_CACHE_KEY = 'branch_stats:{branch_id}:{branch_version}:{catalog_version}'
+BRANCH_STATS_CACHE_TIMEOUT = 3600
+
 
 @login_required
 def branch_list(request):
@@ -171,22 +180,26 @@ def update_branch_stock(request, branch_pk, medication_pk):
             reason = request.POST.get('reason', '')
             
             # Obter ou criar estoque da filial
-            branch_stock, created = BranchStock.objects.get_or_create(
-                branch=branch,
-                medication=medication,
-                defaults={'quantity': 0}
-            )
-            
-            old_quantity = branch_stock.quantity
-            branch_stock.quantity = new_quantity
-            branch_stock.save()
+            with stock_write_transaction():
+                branch_stock, created = BranchStock.objects.get_or_create(
+                    branch=branch,
+                    medication=medication,
+                    defaults={'quantity': 0}
+                )
+                
+                old_quantity = branch_stock.quantity
+                branch_stock.quantity = new_quantity
+                branch_stock.save()
             
-            # Verificar se precisa enviar alerta de estoque baixo
+            # Alerta de estoque baixo com debounce: apenas registrado aqui;
+            # o comando flush_pending_alerts (cron) envia um resumo por filial
+            notification_manager = NotificationManager()
             if branch_stock.is_low_stock:
-                notification_manager = NotificationManager()
-                notification_manager.send_low_stock_alert(
+                notification_manager.queue_low_stock_alert(
                     branch, medication, new_quantity
                 )
+            else:
+                notification_manager.discard_low_stock_alert(branch, medication)
             
             # Mensagem diferente se foi criado novo ou atualizado existente
             if created:
@@ -211,7 +224,6 @@ def update_branch_stock(request, branch_pk, medication_pk):
 @farmaceutico_required
 def create_transfer(request):
     """Criar solicitação de transferência entre filiais com prevenção de duplicidade"""
-    from django.db import transaction
     from django.db.models import F, Q
     
     if request.method == 'POST':
@@ -232,9 +244,10 @@ def create_transfer(request):
             # Fluxo de transferência de todos os medicamentos
             if transfer_all:
                 created_count = 0
-                notification_manager = NotificationManager()
+                # E-mails enfileirados e enviados numa única conexão após a transação
+                notification_manager = NotificationManager(batch=True)
                 
-                with transaction.atomic():
+                with stock_write_transaction():
                     # Itera por todos os estoques da filial de origem com lock
                     for from_stock in BranchStock.objects.select_for_update().select_related('medication').filter(branch=from_branch):
                         # Recalcular available_quantity após lock para garantir dados atualizados
@@ -270,6 +283,8 @@ def create_transfer(request):
                         notification_manager.send_transfer_notification(transfer)
                         created_count += 1
 
+                notification_manager.flush()
+
                 if created_count == 0:
                     messages.warning(request, 'Nenhum medicamento com quantidade disponível para transferir na filial de origem.')
                     return redirect('branches:create_transfer')
@@ -307,11 +322,11 @@ def create_transfer(request):
                 return redirect('branches:create_transfer')
             
             # Processar múltiplas transferências
-            notification_manager = NotificationManager()
+            notification_manager = NotificationManager(batch=True)
             created_transfers = []
             errors = []
             
-            with transaction.atomic():
+            with stock_write_transaction():
                 for medication_id, quantity in valid_transfers:
                     try:
                         medication = get_object_or_404(Medication, pk=medication_id)
@@ -383,6 +398,8 @@ def create_transfer(request):
                         logger = logging.getLogger(__name__)
                         logger.error(f'Erro ao criar transferência para {medication_id}: {str(e)}', exc_info=True)
             
+            notification_manager.flush()
+            
             # Mensagens de resultado
             if errors:
                 for error in errors:
@@ -483,7 +500,8 @@ def api_get_available_stock(request):
         }, status=400)
     
     try:
-        stock = BranchStock.objects.get(
+        # is_low_stock lê o medicamento: carregado na mesma consulta
+        stock = BranchStock.objects.select_related('medication').get(
             branch_id=branch_id,
             medication_id=medication_id
         )
@@ -506,32 +524,135 @@ def api_get_available_stock(request):
 
 @login_required
 def api_branch_stats(request, branch_pk):
-    """API para buscar estatísticas atualizadas de uma filial"""
+    """
+    API para buscar estatísticas atualizadas de uma filial, guardadas no
+    cache enquanto as versões da filial e do catálogo não mudam
+    """
     branch = get_object_or_404(Branch, pk=branch_pk)
     
-    # Calcular diretamente do banco para garantir sincronização
-    branch_stocks = BranchStock.objects.filter(branch=branch)
-    total_medications = branch_stocks.values('medication').distinct().count()
-    total_stock_quantity = branch_stocks.aggregate(total=Sum('quantity'))['total'] or 0
+    versions = dict(DataVersion.objects.filter(
+        name__in=[branch_data_version_name(branch.pk), 'catalog']
+    ).values_list('name', 'version'))
+    cache_key = BRANCH_STATS_CACHE_KEY.format(
+        branch_id=branch.pk,
+        branch_version=versions.get(branch_data_version_name(branch.pk), 0),
+        catalog_version=versions.get('catalog', 0)
+    )
+    stats = cache.get(cache_key)
+    if stats is None:
+        # Calcular diretamente do banco para garantir sincronização
+        branch_stocks = BranchStock.objects.filter(branch=branch)
+        stats = {
+            'total_medications': branch_stocks.values('medication').distinct().count(),
+            'total_stock_quantity': branch_stocks.aggregate(total=Sum('quantity'))['total'] or 0,
+            # available_quantity (quantity - reserved_quantity) <= minimum_stock
+            'low_stock_count': branch_stocks.filter(
+                quantity__lte=F('reserved_quantity') + F('medication__minimum_stock')
+            ).count(),
+        }
+        cache.set(cache_key, stats, BRANCH_STATS_CACHE_TIMEOUT)
+    
+    return JsonResponse({'success': True, **stats})
+
+
+@async_login_required
+async def api_stock_sync_async(request, branch_pk, medication_pk):
+    """api_stock_sync para ASGI (ORM assíncrono)"""
+    try:
+        stock = await BranchStock.objects.aget(
+            branch_id=branch_pk,
+            medication_id=medication_pk
+        )
+        return JsonResponse({
+            'success': True,
+            'quantity': stock.quantity,
+            'reserved_quantity': stock.reserved_quantity,
+            'available_quantity': stock.available_quantity,
+            'last_updated': stock.last_updated.isoformat()
+        })
+    except BranchStock.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'available_quantity': 0,
+            'error': 'Estoque não encontrado'
+        })
+
+
+@async_login_required
+async def api_get_available_stock_async(request):
+    """api_get_available_stock para ASGI (ORM assíncrono)"""
+    branch_id = request.GET.get('branch_id')
+    medication_id = request.GET.get('medication_id')
     
-    # Calcular estoque baixo
-    low_stock_count = 0
-    for stock in branch_stocks.select_related('medication'):
-        if stock.available_quantity <= stock.medication.minimum_stock:
-            low_stock_count += 1
+    if not branch_id or not medication_id:
+        return JsonResponse({
+            'success': False,
+            'available_quantity': 0,
+            'error': 'Parâmetros branch_id e medication_id são obrigatórios'
+        }, status=400)
     
-    return JsonResponse({
-        'success': True,
-        'total_medications': total_medications,
-        'total_stock_quantity': total_stock_quantity,
-        'low_stock_count': low_stock_count
-    })
+    try:
+        # is_low_stock lê o medicamento: carregado na mesma consulta
+        stock = await BranchStock.objects.select_related('medication').aget(
+            branch_id=branch_id,
+            medication_id=medication_id
+        )
+        return JsonResponse({
+            'success': True,
+            'quantity': stock.quantity,
+            'reserved_quantity': stock.reserved_quantity,
+            'available_quantity': stock.available_quantity,
+            'is_low_stock': stock.is_low_stock
+        })
+    except BranchStock.DoesNotExist:
+        return JsonResponse({
+            'success': True,
+            'quantity': 0,
+            'reserved_quantity': 0,
+            'available_quantity': 0,
+            'is_low_stock': False
+        })
+
+
+@async_login_required
+async def api_branch_stats_async(request, branch_pk):
+    """
+    api_branch_stats para ASGI: estatísticas da filial com ORM assíncrono,
+    guardadas no cache enquanto as versões da filial e do catálogo não mudam
+    """
+    if not await Branch.objects.filter(pk=branch_pk).aexists():
+        raise Http404('Filial não encontrada')
+    
+    versions = {
+        name: version async for name, version in DataVersion.objects.filter(
+            name__in=[branch_data_version_name(branch_pk), 'catalog']
+        ).values_list('name', 'version')
+    }
+    cache_key = BRANCH_STATS_CACHE_KEY.format(
+        branch_id=branch_pk,
+        branch_version=versions.get(branch_data_version_name(branch_pk), 0),
+        catalog_version=versions.get('catalog', 0)
+    )
+    stats = await cache.aget(cache_key)
+    if stats is None:
+        branch_stocks = BranchStock.objects.filter(branch_id=branch_pk)
+        total_stock_quantity = (await branch_stocks.aaggregate(total=Sum('quantity')))['total'] or 0
+        stats = {
+            'total_medications': await branch_stocks.values('medication').distinct().acount(),
+            'total_stock_quantity': total_stock_quantity,
+            # available_quantity (quantity - reserved_quantity) <= minimum_stock
+            'low_stock_count': await branch_stocks.filter(
+                quantity__lte=F('reserved_quantity') + F('medication__minimum_stock')
+            ).acount(),
+        }
+        await cache.aset(cache_key, stats, BRANCH_STATS_CACHE_TIMEOUT)
+    
+    return JsonResponse({'success': True, **stats})
 
 
 @admin_required
 def approve_transfer(request, pk):
     """Aprovar e processar transferência com transação atômica e prevenção de duplicidade"""
-    from django.db import transaction
     from django.db.models import F
     
     transfer = get_object_or_404(StockTransfer, pk=pk)
@@ -543,7 +664,7 @@ def approve_transfer(request, pk):
             return redirect('branches:transfer_detail', pk=pk)
         
         try:
-            with transaction.atomic():
+            with stock_write_transaction():
                 # Usar select_for_update para lock e prevenir condições de corrida
                 transfer = StockTransfer.objects.select_for_update().get(pk=pk)
                 
@@ -618,15 +739,28 @@ def approve_transfer(request, pk):
 
 @login_required
 def branch_dashboard(request):
-    """Dashboard geral de filiais"""
-    from django.http import HttpResponse
-    
-    branches = Branch.objects.filter(is_active=True)
+    """
+    Dashboard geral de filiais
+    
+    Métricas e alertas ficam em fragmentos em cache (versão 'stock') e cada
+    card de filial no seu próprio fragmento (versão da filial); `stats` e as
+    propriedades das filiais só consultam o banco quando o fragmento é
+    renderizado.
+    """
+    branches = Branch.objects.filter(is_active=True).select_related('manager')
     
-    # Estatísticas gerais
-    total_branches = branches.count()
-    total_medications = BranchStock.objects.values('medication').distinct().count()
+    context = {
+        'branches': branches,
+        'stats': SimpleLazyObject(lambda: _branch_dashboard_stats(branches)),
+    }
     
+    response = render(request, 'branches/dashboard.html', context)
+    response['Content-Type'] = 'text/html; charset=utf-8'
+    return response
+
+
+def _branch_dashboard_stats(branches):
+    """Métricas e alertas do dashboard de filiais"""
     # Filiais com estoque baixo
     branches_with_alerts = []
     for branch in branches:
@@ -637,17 +771,10 @@ def branch_dashboard(request):
                 'low_stock_count': low_stock_count
             })
     
-    # Transferências pendentes
-    pending_transfers = StockTransfer.objects.filter(status='pending').count()
-    
-    context = {
-        'branches': branches,
-        'total_branches': total_branches,
-        'total_medications': total_medications,
+    return {
+        'total_branches': len(branches),
+        'total_medications': BranchStock.objects.values('medication').distinct().count(),
         'branches_with_alerts': branches_with_alerts,
-        'pending_transfers': pending_transfers
+        # Transferências pendentes
+        'pending_transfers': StockTransfer.objects.filter(status='pending').count(),
     }
-    
-    response = render(request, 'branches/dashboard.html', context)
-    response['Content-Type'] = 'text/html; charset=utf-8'
-    return response
@@ -1,9 +1,12 @@
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, HttpResponseNotAllowed
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 import json
-from .notifications import NotificationManager, get_dashboard_stats
+from apps.authentication.decorators import async_login_required
+from .health import deep_status
+from .notifications import NotificationManager, count_notifications, get_dashboard_stats
 
 
 @login_required
@@ -19,13 +22,7 @@ def get_notifications(request):
         notifications = [n for n in all_notifications if n.get('id') not in read_ids]
 
         # Recalcular contagens após filtro
-        counts = {
-            'total': len(notifications),
-            'danger': len([n for n in notifications if n['type'] == 'danger']),
-            'warning': len([n for n in notifications if n['type'] == 'warning']),
-            'info': len([n for n in notifications if n['type'] == 'info']),
-            'success': len([n for n in notifications if n['type'] == 'success']),
-        }
+        counts = count_notifications(notifications)
         
         return JsonResponse({
             'success': True,
@@ -40,6 +37,32 @@ def get_notifications(request):
         }, status=500)
 
 
+@async_login_required
+async def get_notifications_async(request):
+    """get_notifications para ASGI: ORM e cache assíncronos"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        manager = NotificationManager(user=request.user)
+        all_notifications = await manager.aget_all_notifications()
+        
+        # A sessão (banco) ainda não tem API assíncrona no Django 4.2
+        read_ids = set(await sync_to_async(request.session.get)('read_notifications', []))
+        notifications = [n for n in all_notifications if n.get('id') not in read_ids]
+        
+        return JsonResponse({
+            'success': True,
+            'notifications': notifications,
+            'counts': count_notifications(notifications),
+            'timestamp': timezone.now().isoformat()
+        })
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
 @login_required
 @require_http_methods(["GET"])
 def get_critical_notifications(request):
@@ -60,6 +83,27 @@ def get_critical_notifications(request):
         }, status=500)
 
 
+@async_login_required
+async def get_critical_notifications_async(request):
+    """get_critical_notifications para ASGI"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        manager = NotificationManager(user=request.user)
+        critical_notifications = await manager.aget_critical_notifications(limit=10)
+        
+        return JsonResponse({
+            'success': True,
+            'notifications': critical_notifications,
+            'count': len(critical_notifications)
+        })
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
 @login_required
 @require_http_methods(["POST"])
 def mark_notification_read(request):
@@ -119,43 +163,24 @@ def get_dashboard_data(request):
 @login_required
 @require_http_methods(["GET"])
 def check_system_health(request):
-    """API para verificar saúde do sistema"""
+    """
+    API para verificar saúde do sistema
+    
+    Usa o status detalhado em cache (apps.core.health.deep_status); os
+    balanceadores de carga devem usar /health/live/ e /health/ready/.
+    """
     try:
-        from django.db import connection
-        from django.core.cache import cache
-        
-        # Verificar conexão com banco
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1")
-        
-        # Verificar cache (se configurado)
-        cache_working = True
-        try:
-            cache.set('health_check', 'ok', 10)
-            cache_working = cache.get('health_check') == 'ok'
-        except:
-            cache_working = False
-        
-        # Obter estatísticas do sistema
-        stats = get_dashboard_stats()
+        status = deep_status()
         
         health_status = {
-            'database': True,
-            'cache': cache_working,
-            'critical_alerts': stats.get('expired_count', 0) + stats.get('unresolved_alerts', 0),
-            'warnings': stats.get('low_stock_count', 0) + stats.get('near_expiry_count', 0),
-            'timestamp': timezone.now().isoformat()
+            'database': status['checks']['database']['ok'],
+            'cache': status['checks']['cache']['ok'],
+            'critical_alerts': status['critical_alerts'],
+            'warnings': status['warnings'],
+            'timestamp': status['generated_at'],
+            'overall': status['overall'],
         }
         
-        # Determinar status geral
-        overall_status = 'healthy'
-        if health_status['critical_alerts'] > 0:
-            overall_status = 'critical'
-        elif health_status['warnings'] > 5:
-            overall_status = 'warning'
-        
-        health_status['overall'] = overall_status
-        
         return JsonResponse({
             'success': True,
             'health': health_status
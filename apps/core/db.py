@@ -0,0 +1,94 @@
+"""
+Ajustes de banco para implantações pequenas em SQLite.
+
+- PRAGMAs por conexão (DEFAULT_SQLITE_PRAGMAS, ou SQLITE_PRAGMAS no
+  settings): WAL para leitores não esperarem o escritor, busy_timeout para
+  aguardar o lock em vez de falhar, etc. Só no banco 'default'.
+- stock_write_transaction(): transação de escrita de estoque. No SQLite abre
+  com BEGIN IMMEDIATE; o select_for_update() não tem efeito nesse banco, e uma
+  transação DEFERRED que lê antes de escrever falha com "database is locked"
+  (sem esperar o busy_timeout) quando outra escrita começa no meio dela.
+  No Django 5.1+ o settings usa OPTIONS['transaction_mode'] = 'IMMEDIATE' e
+  todo atomic() já começa assim.
+"""
+
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+# Django 5.1+: OPTIONS['transaction_mode'] do SQLite define o BEGIN do atomic()
+SQLITE_TRANSACTION_MODE_SUPPORTED = django.VERSION >= (5, 1)
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',     # leitores e um escritor simultâneos
+    'busy_timeout': 5000,      # ms aguardando o lock de escrita
+    'synchronous': 'NORMAL',   # seguro com WAL; fsync apenas nos checkpoints
+    'mmap_size': 268435456,    # 256 MB lidos via mmap
+    'cache_size': -20000,      # ~20 MB de cache de páginas por conexão
+}
+
+
+def get_sqlite_pragmas():
+    return getattr(settings, 'SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS)
+
+
+def apply_sqlite_pragmas(connection):
+    """
+    Aplicar os PRAGMAs a uma nova conexão SQLite do banco 'default'.
+
+    journal_mode=WAL fica gravado no arquivo: outros aliases (ex.: o
+    sqlite_source, só lido pelo copy_sqlite_to_postgres) não são alterados.
+    """
+    if connection.vendor != 'sqlite' or connection.alias != DEFAULT_DB_ALIAS:
+        return
+    with connection.cursor() as cursor:
+        for name, value in get_sqlite_pragmas().items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def stock_write_transaction(using=None):
+    """
+    transaction.atomic() para alterações de estoque.
+
+    No SQLite, a transação mais externa começa com BEGIN IMMEDIATE: o lock de
+    escrita é obtido logo no início (aguardando até busy_timeout), então as
+    leituras dentro dela já estão serializadas com as demais escritas. Em
+    outros bancos (e em blocos aninhados) equivale a transaction.atomic().
+    """
+    connection = transaction.get_connection(using)
+    if (
+        connection.vendor != 'sqlite'
+        or connection.in_atomic_block
+        or connection.settings_dict['OPTIONS'].get('transaction_mode') == 'IMMEDIATE'
+    ):
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    with immediate_transaction(connection):
+        with transaction.atomic(using=using):
+            yield
+
+
+@contextmanager
+def immediate_transaction(connection):
+    """
+    Transação SQLite aberta com BEGIN IMMEDIATE pelo cursor, sem autocommit
+    (gerenciamento manual de transações do Django): um atomic() dentro dela
+    vira um savepoint, e o commit ou rollback é feito aqui. Os callbacks de
+    on_commit rodam depois do commit, ao religar o autocommit.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('BEGIN IMMEDIATE')
+    connection.set_autocommit(False)
+    try:
+        yield
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        connection.set_autocommit(True)
@@ -0,0 +1,46 @@
+"""
+Cache de fragmentos de template versionado pelos dados.
+
+As chaves do `{% cache %}` incluem a versão dos dados exibidos (DataVersion)
+e a função do usuário. Qualquer alteração nos modelos monitorados troca a
+versão, então um fragmento em cache nunca fica desatualizado; o timeout
+apenas descarta as entradas órfãs.
+
+Versões disponíveis nos templates via `data_versions`:
+    data_versions.stock              - qualquer dado de estoque
+    data_versions.catalog            - medicamentos, categorias e fornecedores
+    data_versions|branch_version:pk  - estoque e transferências de uma filial
+
+As views passam os dados dos fragmentos como objetos lazy (SimpleLazyObject
+ou QuerySets), para que nenhuma consulta seja feita quando o fragmento vem
+do cache.
+"""
+
+from django.conf import settings
+
+from .models import DataVersion, branch_data_version_name
+
+DEFAULT_FRAGMENT_CACHE_TIMEOUT = 3600
+
+
+class DataVersions:
+    """Versões de dados carregadas numa única consulta, na primeira leitura"""
+    
+    def __init__(self):
+        self._versions = None
+    
+    def __getitem__(self, name):
+        if self._versions is None:
+            self._versions = dict(DataVersion.objects.values_list('name', 'version'))
+        return self._versions.get(name, 0)
+    
+    def branch(self, branch_id):
+        return self[branch_data_version_name(branch_id)]
+
+
+def fragment_cache_context(request):
+    """Context processor com as versões e o timeout dos fragmentos"""
+    return {
+        'data_versions': DataVersions(),
+        'fragment_cache_timeout': getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', DEFAULT_FRAGMENT_CACHE_TIMEOUT),
+    }
@@ -0,0 +1,106 @@
+"""
+Verificações de saúde para balanceadores de carga e monitoramento.
+
+    liveness()    - o processo responde (sem I/O)
+    readiness()   - ping no banco (conexão persistente) e no cache, com tempos
+    deep_status() - readiness + contadores de alertas, em cache por
+                    HEALTH_STATUS_CACHE_TIMEOUT segundos
+
+/health/live/ e /health/ready/ são respondidos pelo HealthCheckMiddleware,
+antes de sessão, autenticação e métricas: um probe a cada poucos segundos
+custa no máximo um SELECT 1 e uma escrita no cache. /health/status/ exige
+administrador ou METRICS_TOKEN.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.utils import timezone
+
+HEALTH_CACHE_KEY = 'health:ping'
+HEALTH_STATUS_CACHE_KEY = 'health:status'
+DEFAULT_HEALTH_STATUS_CACHE_TIMEOUT = 30
+
+
+def liveness():
+    return {'status': 'ok'}
+
+
+def _timed(check):
+    """Executar uma verificação e medir o tempo (ms)"""
+    started = time.perf_counter()
+    try:
+        check()
+        result = {'ok': True}
+    except Exception as e:
+        result = {'ok': False, 'error': f"{type(e).__name__}: {str(e)[:200]}"}
+    result['ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def check_database(alias='default'):
+    """SELECT 1 na conexão da thread (reaproveitada com CONN_MAX_AGE)"""
+    def ping():
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+    return _timed(ping)
+
+
+def check_cache(alias='default'):
+    def ping():
+        backend = caches[alias]
+        backend.set(HEALTH_CACHE_KEY, 'ok', 10)
+        if backend.get(HEALTH_CACHE_KEY) != 'ok':
+            raise RuntimeError('valor gravado não foi lido de volta')
+    return _timed(ping)
+
+
+def readiness():
+    checks = {
+        'database': check_database(),
+        'cache': check_cache(),
+    }
+    ready = all(check['ok'] for check in checks.values())
+    return {'status': 'ok' if ready else 'unavailable', 'checks': checks}
+
+
+def get_health_status_cache_timeout():
+    return getattr(settings, 'HEALTH_STATUS_CACHE_TIMEOUT', DEFAULT_HEALTH_STATUS_CACHE_TIMEOUT)
+
+
+def deep_status():
+    """Readiness + estatísticas do sistema, recalculadas no máximo a cada timeout"""
+    status = caches['default'].get(HEALTH_STATUS_CACHE_KEY)
+    if status is None:
+        status = _build_deep_status()
+        caches['default'].set(HEALTH_STATUS_CACHE_KEY, status, get_health_status_cache_timeout())
+    return status
+
+
+def _build_deep_status():
+    from .notifications import get_dashboard_stats
+
+    status = readiness()
+    stats = get_dashboard_stats()
+    critical_alerts = stats.get('expired_count', 0) + stats.get('unresolved_alerts', 0)
+    warnings = stats.get('low_stock_count', 0) + stats.get('near_expiry_count', 0)
+
+    if status['status'] != 'ok':
+        overall = 'error'
+    elif critical_alerts > 0:
+        overall = 'critical'
+    elif warnings > 5:
+        overall = 'warning'
+    else:
+        overall = 'healthy'
+
+    status.update(
+        overall=overall,
+        critical_alerts=critical_alerts,
+        warnings=warnings,
+        stats=stats,
+        generated_at=timezone.now().isoformat(),
+    )
+    return status
@@ -0,0 +1,214 @@
+from contextlib import contextmanager, nullcontext
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, transaction
+
+
+@contextmanager
+def preserved_timestamps(models):
+    """Desligar auto_now/auto_now_add para copiar as datas originais"""
+    changed = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                changed.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in changed:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+def strongly_connected_components(nodes, edges):
+    """
+    Componentes fortemente conexos (Tarjan), cada um depois dos componentes
+    que ele alcança: com edges = dependências, as dependências vêm antes
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+
+    def visit(node):
+        index[node] = lowlink[node] = len(index)
+        stack.append(node)
+        on_stack.add(node)
+        for target in edges.get(node, ()):
+            if target not in index:
+                visit(target)
+                lowlink[node] = min(lowlink[node], lowlink[target])
+            elif target in on_stack:
+                lowlink[node] = min(lowlink[node], index[target])
+        if lowlink[node] == index[node]:
+            component = []
+            while True:
+                member = stack.pop()
+                on_stack.discard(member)
+                component.append(member)
+                if member is node:
+                    break
+            components.append(component)
+
+    for node in nodes:
+        if node not in index:
+            visit(node)
+    return components
+
+
+class Command(BaseCommand):
+    help = 'Copiar todos os dados do SQLite para o PostgreSQL em lotes, mantendo as chaves primárias'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            default='sqlite_source',
+            help='Alias do banco SQLite de origem (padrão: sqlite_source)'
+        )
+        parser.add_argument(
+            '--target',
+            default='default',
+            help='Alias do banco PostgreSQL de destino, já migrado (padrão: default)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Registros lidos e inseridos por lote'
+        )
+        parser.add_argument(
+            '--no-flush',
+            action='store_true',
+            help='Não esvaziar as tabelas de destino antes da cópia'
+        )
+
+    def handle(self, *args, **options):
+        """Copiar modelo a modelo, na ordem das dependências, e ajustar as sequências"""
+        source_alias, target_alias = options['source'], options['target']
+        for alias in (source_alias, target_alias):
+            if alias not in connections.databases:
+                raise CommandError(f'Banco "{alias}" não configurado (use DATABASE_ENGINE=postgresql)')
+        
+        source, target = connections[source_alias], connections[target_alias]
+        if source.vendor != 'sqlite':
+            raise CommandError(f'A origem "{source_alias}" deve ser SQLite ({source.vendor})')
+        if target.vendor != 'postgresql':
+            raise CommandError(f'O destino "{target_alias}" deve ser PostgreSQL ({target.vendor})')
+        
+        groups = self._get_model_groups()
+        models = [model for group in groups for model in group]
+        source_tables = set(source.introspection.table_names())
+        target_tables = set(target.introspection.table_names())
+        missing = [model._meta.db_table for model in models if model._meta.db_table not in target_tables]
+        if missing:
+            raise CommandError(
+                f'Tabelas ausentes no destino: {", ".join(missing)}. '
+                f'Execute "manage.py migrate --database {target_alias}" antes da cópia.'
+            )
+        
+        if not options['no_flush']:
+            # Conteúdo criado pelo migrate (content types, permissões) é
+            # substituído pelo da origem, preservando as chaves estrangeiras
+            self._flush(target, models)
+        
+        total = 0
+        with preserved_timestamps(models):
+            for group in groups:
+                with self._group_transaction(group, target_alias):
+                    for model in group:
+                        if model._meta.db_table not in source_tables:
+                            self.stdout.write(self.style.WARNING(
+                                f'⚠️ {model._meta.label}: tabela ausente na origem, ignorada'
+                            ))
+                            continue
+                        copied = self._copy_model(model, source, source_alias, target_alias, options['batch_size'])
+                        total += copied
+                        self.stdout.write(f'  {model._meta.label}: {copied} registros')
+        
+        self._reset_sequences(target, models)
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} registros copiados de {source_alias} para {target_alias}'))
+
+    def _get_model_groups(self):
+        """
+        Modelos concretos (incluindo tabelas M2M) em grupos: cada grupo vem
+        depois dos modelos que ele referencia por chave estrangeira. Modelos
+        que se referenciam em ciclo (ou a si mesmos) ficam no mesmo grupo.
+        """
+        models = [
+            model for model in apps.get_models(include_auto_created=True)
+            if model._meta.managed and not model._meta.proxy
+        ]
+        copied = set(models)
+        dependencies = {
+            model: {
+                field.related_model._meta.concrete_model
+                for field in model._meta.concrete_fields
+                if field.is_relation and field.related_model._meta.concrete_model in copied
+            }
+            for model in models
+        }
+        return strongly_connected_components(models, dependencies)
+
+    def _group_transaction(self, group, target_alias):
+        """
+        Um grupo com ciclo de chaves estrangeiras é copiado numa única
+        transação: as FKs DEFERRABLE do PostgreSQL só são verificadas no
+        commit, então as linhas podem referenciar outras ainda não copiadas.
+        Os demais modelos confirmam cada lote separadamente.
+        """
+        if len(group) > 1 or any(
+            field.is_relation and field.related_model._meta.concrete_model is group[0]
+            for field in group[0]._meta.concrete_fields
+        ):
+            return transaction.atomic(using=target_alias)
+        return nullcontext()
+
+    def _flush(self, target, models):
+        tables = [model._meta.db_table for model in models]
+        statements = target.ops.sql_flush(no_style(), tables, allow_cascade=True)
+        with transaction.atomic(using=target.alias):
+            with target.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def _copy_model(self, model, source, source_alias, target_alias, batch_size):
+        """Ler em lotes pela chave primária e inserir com bulk_create"""
+        with source.cursor() as cursor:
+            source_columns = {
+                column.name for column in source.introspection.get_table_description(cursor, model._meta.db_table)
+            }
+        # Colunas adicionadas depois da última migração do SQLite ficam com o default
+        fields = [field for field in model._meta.concrete_fields if field.column in source_columns]
+        attnames = [field.attname for field in fields]
+        
+        rows = model._base_manager.using(source_alias).order_by('pk').values_list(*attnames)
+        copied = 0
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(model(**dict(zip(attnames, row))))
+            if len(batch) >= batch_size:
+                copied += self._insert(model, batch, target_alias)
+                batch = []
+        if batch:
+            copied += self._insert(model, batch, target_alias)
+        return copied
+
+    def _insert(self, model, batch, target_alias):
+        # Chaves estrangeiras do Django são DEFERRABLE no PostgreSQL: a
+        # verificação ocorre no commit do lote (ou do grupo, em ciclos; ver
+        # _group_transaction), quando este atomic() vira um savepoint
+        with transaction.atomic(using=target_alias):
+            model._base_manager.using(target_alias).bulk_create(batch)
+        return len(batch)
+
+    def _reset_sequences(self, target, models):
+        """Próximos IDs após o maior ID copiado"""
+        statements = target.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with target.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
@@ -0,0 +1,243 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F, Min, Value, Window
+from django.db.models.functions import Replace, Trim
+
+from apps.branches.models import Branch, BranchStock
+from apps.core.db import stock_write_transaction
+from apps.core.models import DataVersion, branch_data_version_name
+from apps.inventory.models import Medication
+from apps.suppliers.models import Supplier
+
+# Quantidades somadas ao mesclar linhas que violariam um unique_together
+# depois de apontarem para o mesmo registro canônico
+MERGE_SUM_FIELDS = {
+    'branches.BranchStock': ('quantity', 'reserved_quantity'),
+    'notifications.PendingAlert': ('suppressed_count',),
+}
+
+
+def normalized(field, *separators):
+    """Valor sem espaços nas pontas e sem separadores ('12.345.678/0001-90' == '12345678000190')"""
+    expression = Trim(field)
+    for separator in separators:
+        expression = Replace(expression, Value(separator), Value(''))
+    return expression
+
+
+def canonical_ids(queryset, *partition_by):
+    """Cada linha com o menor id do seu grupo (window function)"""
+    return queryset.annotate(
+        canonical_id=Window(Min('id'), partition_by=list(partition_by))
+    ).values('id', 'canonical_id')
+
+
+class Command(BaseCommand):
+    help = (
+        'Mesclar duplicatas de fornecedores (CNPJ), medicamentos (código de barras) e '
+        'estoques por filial (filial, medicamento) com operações em conjunto no banco'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--commit',
+            action='store_true',
+            help='Aplicar as alterações (padrão: executar e desfazer, exibindo o diff)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Linhas de exemplo exibidas por tabela'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Para cada modelo, um mapa duplicata -> canônico (menor id do grupo) vai
+        para uma tabela temporária; cada chave estrangeira é reapontada com um
+        único UPDATE ... FROM e as duplicatas são removidas com um DELETE.
+        Sem --commit, tudo roda na mesma transação e é desfeito no final.
+        """
+        self.limit = options['limit']
+        self.map_tables = set()
+        started = time.perf_counter()
+
+        with stock_write_transaction():
+            with connection.cursor() as cursor:
+                self.cursor = cursor
+                merged = self._dedupe(
+                    Supplier,
+                    'CNPJ',
+                    ['cnpj'],
+                    canonical_ids(
+                        Supplier.objects.exclude(cnpj__isnull=True)
+                        .annotate(key=normalized('cnpj', ' ', '.', '/', '-')).exclude(key=''),
+                        F('key')
+                    ),
+                )
+                merged += self._dedupe(
+                    Medication,
+                    'código de barras',
+                    ['barcode'],
+                    canonical_ids(
+                        Medication.objects.exclude(barcode__isnull=True)
+                        .annotate(key=normalized('barcode', ' ', '.', '-')).exclude(key=''),
+                        F('key')
+                    ),
+                )
+                # Depois dos medicamentos: linhas já mescladas no passo anterior não aparecem aqui
+                merged += self._dedupe(
+                    BranchStock,
+                    'filial e medicamento',
+                    ['branch', 'medication', 'quantity', 'reserved_quantity'],
+                    canonical_ids(BranchStock.objects.all(), F('branch_id'), F('medication_id')),
+                )
+                for table in self.map_tables:
+                    cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
+            if not options['commit']:
+                transaction.set_rollback(True)
+            elif merged:
+                # UPDATE/DELETE diretos não disparam os sinais de versão
+                for name in ['stock', 'catalog'] + [
+                    branch_data_version_name(pk) for pk in Branch.objects.values_list('pk', flat=True)
+                ]:
+                    DataVersion.bump(name)
+
+        elapsed = time.perf_counter() - started
+        if not options['commit']:
+            self.stdout.write(self.style.WARNING(
+                f'\nModo análise ({elapsed:.2f}s): nenhuma alteração aplicada. Use --commit para aplicar.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'\n✅ {merged} duplicata(s) removida(s) em {elapsed:.2f}s'))
+
+    def _dedupe(self, model, description, display_fields, ranked):
+        map_table = self._create_map(model, *ranked.query.sql_with_params())
+        count = self._count(map_table)
+        self.stdout.write(f'\n[{model._meta.verbose_name_plural}: {description}] {count} duplicata(s)')
+        if not count:
+            return 0
+
+        self._show_examples(model, map_table, display_fields)
+        for relation in model._meta.related_objects:
+            if relation.many_to_many:
+                continue
+            self._repoint(relation, map_table)
+        self._merge_rows(model, map_table)
+        return count
+
+    def _create_map(self, model, sql, params=(), suffix=''):
+        """Tabela temporária (duplicate_id, canonical_id) a partir de uma consulta com id e canonical_id"""
+        table = f'dedupe_{model._meta.db_table}{suffix}'
+        self.cursor.execute(f'DROP TABLE IF EXISTS {table}')
+        self.cursor.execute(
+            f'CREATE TEMPORARY TABLE {table} (duplicate_id bigint PRIMARY KEY, canonical_id bigint NOT NULL)'
+        )
+        self.cursor.execute(
+            f'INSERT INTO {table} (duplicate_id, canonical_id) '
+            f'SELECT id, canonical_id FROM ({sql}) ranked WHERE id <> canonical_id',
+            params
+        )
+        self.map_tables.add(table)
+        return table
+
+    def _count(self, map_table):
+        self.cursor.execute(f'SELECT COUNT(*) FROM {map_table}')
+        return self.cursor.fetchone()[0]
+
+    def _repoint(self, relation, map_table):
+        """Apontar as referências das duplicatas para o registro canônico"""
+        qn = connection.ops.quote_name
+        related, field = relation.related_model, relation.field
+        table, column = qn(related._meta.db_table), qn(field.column)
+
+        # Linhas que colidiriam num unique_together após o UPDATE são mescladas antes
+        for unique_fields in self._unique_sets(related, field.name):
+            collisions = self._collision_map(related, unique_fields, field.column, map_table)
+            collided = self._count(collisions)
+            if collided:
+                self.stdout.write(
+                    f'  {related._meta.db_table}: {collided} linha(s) mesclada(s) '
+                    f'por ({", ".join(unique_fields)})'
+                )
+                self._show_examples(
+                    related, collisions,
+                    unique_fields + list(MERGE_SUM_FIELDS.get(related._meta.label, ()))
+                )
+                self._merge_rows(related, collisions)
+
+        self.cursor.execute(
+            f'UPDATE {table} SET {column} = m.canonical_id FROM {map_table} m '
+            f'WHERE {table}.{column} = m.duplicate_id'
+        )
+        self.stdout.write(
+            f'  {related._meta.db_table}.{field.column}: {self.cursor.rowcount} referência(s) reapontada(s)'
+        )
+
+    def _unique_sets(self, model, field_name):
+        unique_sets = [list(fields) for fields in model._meta.unique_together if field_name in fields]
+        if model._meta.get_field(field_name).unique:
+            unique_sets.append([field_name])
+        return unique_sets
+
+    def _collision_map(self, model, unique_fields, fk_column, parent_map):
+        """Mapa das linhas que ficariam duplicadas com a chave estrangeira já reapontada"""
+        qn = connection.ops.quote_name
+        partition = ', '.join(
+            f'COALESCE(m.canonical_id, r.{qn(column)})' if column == fk_column else f'r.{qn(column)}'
+            for column in (model._meta.get_field(name).column for name in unique_fields)
+        )
+        sql = (
+            f'SELECT r.id AS id, MIN(r.id) OVER (PARTITION BY {partition}) AS canonical_id '
+            f'FROM {qn(model._meta.db_table)} r '
+            f'LEFT JOIN {parent_map} m ON m.duplicate_id = r.{qn(fk_column)}'
+        )
+        return self._create_map(model, sql, suffix='_collisions')
+
+    def _merge_rows(self, model, map_table):
+        """Somar as quantidades das duplicatas no registro canônico e remover as duplicatas"""
+        qn = connection.ops.quote_name
+        table = qn(model._meta.db_table)
+        columns = [
+            qn(model._meta.get_field(name).column)
+            for name in MERGE_SUM_FIELDS.get(model._meta.label, ())
+        ]
+        if columns:
+            assignments = ', '.join(f'{column} = {table}.{column} + s.{column}' for column in columns)
+            sums = ', '.join(f'SUM(d.{column}) AS {column}' for column in columns)
+            self.cursor.execute(
+                f'UPDATE {table} SET {assignments} FROM ('
+                f'SELECT m.canonical_id, {sums} FROM {table} d '
+                f'JOIN {map_table} m ON m.duplicate_id = d.id GROUP BY m.canonical_id'
+                f') s WHERE {table}.id = s.canonical_id'
+            )
+        self.cursor.execute(f'DELETE FROM {table} WHERE id IN (SELECT duplicate_id FROM {map_table})')
+
+    def _show_examples(self, model, map_table, field_names):
+        """Diff: duplicata -> canônico, com os campos relevantes de cada lado"""
+        if self.limit <= 0:
+            return
+        qn = connection.ops.quote_name
+        columns = [model._meta.get_field(name).column for name in field_names]
+        selected = ', '.join(
+            [f'd.{qn(column)}' for column in columns] + [f'c.{qn(column)}' for column in columns]
+        )
+        self.cursor.execute(
+            f'SELECT m.duplicate_id, m.canonical_id, {selected} FROM {map_table} m '
+            f'JOIN {qn(model._meta.db_table)} d ON d.id = m.duplicate_id '
+            f'JOIN {qn(model._meta.db_table)} c ON c.id = m.canonical_id '
+            f'ORDER BY m.canonical_id, m.duplicate_id LIMIT %s',
+            [self.limit]
+        )
+        rows = self.cursor.fetchall()
+        for row in rows:
+            duplicate_values, canonical_values = row[2:2 + len(columns)], row[2 + len(columns):]
+            describe = lambda values: ', '.join(f'{name}={value!r}' for name, value in zip(columns, values))
+            self.stdout.write(f'    - id={row[0]} ({describe(duplicate_values)})')
+            self.stdout.write(f'    + id={row[1]} ({describe(canonical_values)})')
+        remaining = self._count(map_table) - len(rows)
+        if remaining > 0:
+            self.stdout.write(f'    ... e mais {remaining}')
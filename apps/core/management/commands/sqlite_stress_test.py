@@ -0,0 +1,140 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+
+from apps.branches.models import Branch, BranchStock, StockTransfer
+from apps.core.db import stock_write_transaction
+from apps.inventory.models import Category, Medication
+from apps.suppliers.models import Supplier
+
+
+class Command(BaseCommand):
+    help = 'Teste de concorrência no SQLite: escritores simultâneos alterando o mesmo estoque'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--writers',
+            type=int,
+            default=20,
+            help='Threads escrevendo ao mesmo tempo'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=25,
+            help='Transações por escritor'
+        )
+        parser.add_argument(
+            '--mode',
+            choices=['immediate', 'deferred', 'both'],
+            default='both',
+            help='immediate: stock_write_transaction (BEGIN IMMEDIATE); deferred: transaction.atomic()'
+        )
+
+    def handle(self, *args, **options):
+        """Rodar cada modo num banco SQLite temporário (o banco configurado não é alterado)"""
+        if connection.vendor != 'sqlite':
+            raise CommandError('Este teste é específico para SQLite')
+
+        modes = ['deferred', 'immediate'] if options['mode'] == 'both' else [options['mode']]
+        failed = False
+        for mode in modes:
+            result = self._run_mode(mode, options['writers'], options['iterations'])
+            style = self.style.SUCCESS if not result['locked'] and result['consistent'] else self.style.ERROR
+            self.stdout.write(style(
+                f"{mode:<10} {result['committed']:>5} transações em {result['seconds']:.2f}s | "
+                f"'database is locked': {result['locked']} | outros erros: {result['errors']} | "
+                f"estoque final {result['final_quantity']} (esperado {result['expected_quantity']})"
+            ))
+            if mode == 'immediate' and (result['locked'] or not result['consistent']):
+                failed = True
+
+        if failed:
+            raise CommandError('Escritas concorrentes falharam com BEGIN IMMEDIATE')
+
+    def _run_mode(self, mode, writers, iterations):
+        handle, path = tempfile.mkstemp(prefix='sqlite_stress_', suffix='.sqlite3')
+        os.close(handle)
+        old_name = connection.settings_dict['NAME']
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = path
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            return self._stress(mode, writers, iterations)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            connection.settings_dict['TEST']['NAME'] = None
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def _stress(self, mode, writers, iterations):
+        user = User.objects.create_user('stress', password=None)
+        category = Category.objects.create(name='Stress')
+        supplier = Supplier.objects.create(name='Stress')
+        medication = Medication.objects.create(name='Stress', category=category, supplier=supplier, price=1)
+        branches = [
+            Branch.objects.create(name=f'Filial {code}', code=code, address='-', phone='+5514999999999')
+            for code in ('ST1', 'ST2')
+        ]
+        initial_quantity = writers * iterations * 10
+        stock = BranchStock.objects.create(branch=branches[0], medication=medication, quantity=initial_quantity)
+
+        counters = {'committed': 0, 'locked': 0, 'errors': 0}
+        lock = threading.Lock()
+        start = threading.Barrier(writers)
+        transaction_factory = stock_write_transaction if mode == 'immediate' else transaction.atomic
+
+        def writer():
+            start.wait()
+            try:
+                for _ in range(iterations):
+                    try:
+                        # Mesmo padrão de approve_transfer: ler, validar e gravar
+                        with transaction_factory():
+                            current = BranchStock.objects.select_for_update().get(pk=stock.pk)
+                            if current.quantity < 1:
+                                continue
+                            BranchStock.objects.filter(pk=stock.pk).update(quantity=F('quantity') - 1)
+                            StockTransfer.objects.create(
+                                from_branch=branches[0],
+                                to_branch=branches[1],
+                                medication=medication,
+                                quantity=1,
+                                status='completed',
+                                reason='Teste de concorrência',
+                                requested_by=user
+                            )
+                        outcome = 'committed'
+                    except OperationalError as e:
+                        outcome = 'locked' if 'locked' in str(e) else 'errors'
+                    except Exception:
+                        outcome = 'errors'
+                    with lock:
+                        counters[outcome] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=writer) for _ in range(writers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        final_quantity = BranchStock.objects.get(pk=stock.pk).quantity
+        expected_quantity = initial_quantity - counters['committed']
+        return dict(
+            counters,
+            seconds=elapsed,
+            final_quantity=final_quantity,
+            expected_quantity=expected_quantity,
+            consistent=final_quantity == expected_quantity
+            and StockTransfer.objects.count() == counters['committed'],
+        )
@@ -0,0 +1,227 @@
+"""
+Métricas de desempenho por requisição, sem serviço externo.
+
+O RequestMetricsMiddleware registra, por view:
+    - latência (histograma)
+    - consultas ao banco e tempo gasto nelas (execute_wrapper instalado em
+      cada conexão; a requisição medida é lida de uma contextvar, que o
+      sync_to_async copia para a thread onde o ORM roda nas views async de
+      polling, ativas com ASYNC_API_VIEWS: get_notifications_async,
+      get_critical_notifications_async e as APIs de estoque das filiais)
+    - tamanho da resposta (histograma)
+e o cache padrão (MetricsLocMemCache) conta acertos e falhas.
+
+Os valores ficam em memória no processo e são expostos em formato texto do
+Prometheus por /metrics (apenas administradores ou METRICS_TOKEN). Com vários
+workers, cada processo tem os próprios contadores.
+"""
+
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RESPONSE_SIZE_BUCKETS = (1024, 10240, 102400, 1048576, 10485760)
+
+METRICS_PREFIX = 'farmasystem'
+DEFAULT_SLOW_REQUEST_SECONDS = 1.0
+SLOW_REQUEST_TOP_QUERIES = 3
+
+
+class Histogram:
+    """Histograma cumulativo no formato do Prometheus"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Contadores e histogramas do processo (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.response_size = defaultdict(lambda: Histogram(RESPONSE_SIZE_BUCKETS))
+            self.requests = defaultdict(int)
+            self.db_queries = defaultdict(int)
+            self.db_seconds = defaultdict(float)
+            self.slow_requests = defaultdict(int)
+            self.cache_requests = defaultdict(int)
+
+    def record_request(self, view, method, status, seconds, queries, query_seconds, size, slow):
+        with self._lock:
+            self.latency[(view, method)].observe(seconds)
+            self.requests[(view, method, str(status))] += 1
+            self.db_queries[view] += queries
+            self.db_seconds[view] += query_seconds
+            if size is not None:
+                self.response_size[view].observe(size)
+            if slow:
+                self.slow_requests[view] += 1
+
+    def record_cache(self, alias, result, count=1):
+        with self._lock:
+            self.cache_requests[(alias, result)] += count
+
+    def render(self):
+        """Métricas no formato texto do Prometheus (versão 0.0.4)"""
+        with self._lock:
+            lines = []
+
+            name = f'{METRICS_PREFIX}_http_request_duration_seconds'
+            lines += [f'# HELP {name} Latência das requisições por view.', f'# TYPE {name} histogram']
+            for (view, method), histogram in sorted(self.latency.items()):
+                lines += _histogram_lines(name, histogram, view=view, method=method)
+
+            name = f'{METRICS_PREFIX}_http_requests_total'
+            lines += [f'# HELP {name} Requisições por view, método e status.', f'# TYPE {name} counter']
+            for (view, method, status), value in sorted(self.requests.items()):
+                lines.append(f'{name}{_labels(view=view, method=method, status=status)} {value}')
+
+            name = f'{METRICS_PREFIX}_http_response_size_bytes'
+            lines += [f'# HELP {name} Tamanho das respostas por view.', f'# TYPE {name} histogram']
+            for view, histogram in sorted(self.response_size.items()):
+                lines += _histogram_lines(name, histogram, view=view)
+
+            name = f'{METRICS_PREFIX}_db_queries_total'
+            lines += [f'# HELP {name} Consultas ao banco por view.', f'# TYPE {name} counter']
+            for view, value in sorted(self.db_queries.items()):
+                lines.append(f'{name}{_labels(view=view)} {value}')
+
+            name = f'{METRICS_PREFIX}_db_query_duration_seconds_total'
+            lines += [f'# HELP {name} Tempo gasto em consultas ao banco por view.', f'# TYPE {name} counter']
+            for view, value in sorted(self.db_seconds.items()):
+                lines.append(f'{name}{_labels(view=view)} {value:.6f}')
+
+            name = f'{METRICS_PREFIX}_slow_requests_total'
+            lines += [f'# HELP {name} Requisições acima de SLOW_REQUEST_SECONDS.', f'# TYPE {name} counter']
+            for view, value in sorted(self.slow_requests.items()):
+                lines.append(f'{name}{_labels(view=view)} {value}')
+
+            name = f'{METRICS_PREFIX}_cache_requests_total'
+            lines += [f'# HELP {name} Leituras do cache por resultado (hit/miss).', f'# TYPE {name} counter']
+            for (alias, result), value in sorted(self.cache_requests.items()):
+                lines.append(f'{name}{_labels(cache=alias, result=result)} {value}')
+
+            name = f'{METRICS_PREFIX}_cache_hit_ratio'
+            lines += [f'# HELP {name} Proporção de acertos do cache.', f'# TYPE {name} gauge']
+            for alias in sorted({alias for alias, result in self.cache_requests}):
+                hits = self.cache_requests.get((alias, 'hit'), 0)
+                total = hits + self.cache_requests.get((alias, 'miss'), 0)
+                lines.append(f'{name}{_labels(cache=alias)} {hits / total if total else 0:.4f}')
+
+            return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _histogram_lines(name, histogram, **labels):
+    lines = []
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {count}')
+    lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {histogram.count}')
+    lines.append(f'{name}_sum{_labels(**labels)} {histogram.sum:.6f}')
+    lines.append(f'{name}_count{_labels(**labels)} {histogram.count}')
+    return lines
+
+
+registry = MetricsRegistry()
+
+
+class QueryRecorder:
+    """execute_wrapper que mede as consultas de uma requisição"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            self.queries.append((elapsed, sql))
+
+    def slowest(self, limit):
+        return sorted(self.queries, key=lambda query: query[0], reverse=True)[:limit]
+
+
+_current_recorder = contextvars.ContextVar('query_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper permanente: repassa ao QueryRecorder da requisição em andamento"""
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection):
+    """Instalar record_query na conexão (chamado no sinal connection_created)"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def recording_queries(recorder):
+    """Medir com `recorder` as consultas feitas neste contexto, em qualquer thread"""
+    token = _current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_recorder.reset(token)
+
+
+def get_slow_request_seconds():
+    return getattr(settings, 'SLOW_REQUEST_SECONDS', DEFAULT_SLOW_REQUEST_SECONDS)
+
+
+_MISSING = object()
+
+
+class CacheMetricsMixin:
+    """Contar acertos e falhas das leituras de um backend de cache"""
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self.metrics_name = name or 'default'
+
+    def get(self, key, default=None, version=None):
+        # get_many(), get_or_set() e {% cache %} também passam por aqui
+        value = super().get(key, _MISSING, version)
+        registry.record_cache(self.metrics_name, 'miss' if value is _MISSING else 'hit')
+        return default if value is _MISSING else value
+
+
+class MetricsLocMemCache(CacheMetricsMixin, LocMemCache):
+    """LocMemCache com contagem de acertos/falhas"""
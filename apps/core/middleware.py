@@ -1,8 +1,23 @@
 """
-Middleware para garantir encoding UTF-8 em todas as respostas HTTP
+Middlewares do núcleo:
+- UTF8ResponseMiddleware: garante encoding UTF-8 em todas as respostas HTTP
+- RequestMetricsMiddleware: latência, consultas e tamanho por view (/metrics)
+- HealthCheckMiddleware: /health/live/ e /health/ready/ para balanceadores de carga
 """
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
 
+from .health import liveness, readiness
+from .metrics import (
+    SLOW_REQUEST_TOP_QUERIES, QueryRecorder, get_slow_request_seconds, recording_queries, registry
+)
+
+logger = logging.getLogger(__name__)
+
 
 class UTF8ResponseMiddleware(MiddlewareMixin):
     """
@@ -28,3 +43,118 @@ class UTF8ResponseMiddleware(MiddlewareMixin):
         
         return response
 
+
+class RequestMetricsMiddleware:
+    """
+    Mede cada requisição e registra em apps.core.metrics.registry.
+    
+    As consultas são contadas pelo execute_wrapper instalado em cada conexão
+    (apps.core.metrics.record_query), que lê o QueryRecorder da requisição de
+    uma contextvar: nas views async de polling (ASYNC_API_VIEWS, ligado pelo
+    asgi.py) o ORM roda na thread do sync_to_async, não na do event loop.
+    Requisições acima de SLOW_REQUEST_SECONDS são registradas no log com as
+    consultas mais lentas.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # No ASGI, não força a troca de thread antes das views async de polling
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recording_queries(recorder):
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, recorder)
+        return response
+    
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recording_queries(recorder):
+            response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - started, recorder)
+        return response
+    
+    def _record(self, request, response, elapsed, recorder):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        slow = elapsed >= get_slow_request_seconds()
+        registry.record_request(
+            view=view,
+            method=request.method,
+            status=response.status_code,
+            seconds=elapsed,
+            queries=recorder.count,
+            query_seconds=recorder.seconds,
+            size=self._response_size(response),
+            slow=slow,
+        )
+        if slow:
+            self._log_slow_request(request, view, elapsed, recorder)
+    
+    def _response_size(self, response):
+        if not response.streaming:
+            return len(response.content)
+        length = response.get('Content-Length')
+        return int(length) if length and length.isdigit() else None
+    
+    def _log_slow_request(self, request, view, elapsed, recorder):
+        top_queries = '\n'.join(
+            f'    {seconds * 1000:.1f} ms: {sql[:300]}'
+            for seconds, sql in recorder.slowest(SLOW_REQUEST_TOP_QUERIES)
+        )
+        logger.warning(
+            f"Requisição lenta: {request.method} {request.path} ({view}) em {elapsed:.3f}s, "
+            f"{recorder.count} consultas ({recorder.seconds:.3f}s no banco)"
+            + (f"\n{top_queries}" if top_queries else '')
+        )
+
+
+class HealthCheckMiddleware:
+    """
+    Responde aos probes de liveness e readiness antes do restante da pilha.
+    
+    Fica no topo do MIDDLEWARE: sem sessão, autenticação, validação de
+    ALLOWED_HOSTS (os balanceadores usam o IP) nem registro em /metrics.
+    Aceita os caminhos com ou sem a barra final.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        path = request.path_info.rstrip('/')
+        if path == '/health/live':
+            return self._response(liveness())
+        if path == '/health/ready':
+            return self._response(readiness())
+        return self.get_response(request)
+    
+    async def __acall__(self, request):
+        path = request.path_info.rstrip('/')
+        if path == '/health/live':
+            return self._response(liveness())
+        if path == '/health/ready':
+            # Mesma thread das demais consultas síncronas (conexão reaproveitada)
+            return self._response(await sync_to_async(readiness)())
+        return await self.get_response(request)
+    
+    def _response(self, status):
+        response = JsonResponse(status, status=200 if status['status'] == 'ok' else 503)
+        response['Cache-Control'] = 'no-store'
+        return response
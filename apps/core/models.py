@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
-from django.db import models
+import threading
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS, models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from decimal import Decimal
@@ -8,3 +11,200 @@ from django.utils import timezone
 
 # Modelos MedicationBatch e BatchLocation foram removidos
 # A funcionalidade de lotes foi completamente removida do sistema
+
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .db import apply_sqlite_pragmas
+from .metrics import install_query_recorder
+
+
+class DataVersion(models.Model):
+    """
+    Contador de versão dos dados de estoque.
+    Incrementado após o commit de cada transação que altera os modelos
+    monitorados; usado como parte da chave de caches (relatórios,
+    fragmentos) para invalidação imediata.
+    """
+    
+    name = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name='Nome'
+    )
+    
+    version = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Versão'
+    )
+    
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Atualizado em'
+    )
+    
+    class Meta:
+        verbose_name = 'Versão de Dados'
+        verbose_name_plural = 'Versões de Dados'
+    
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+    
+    @classmethod
+    def current(cls, name='stock'):
+        """Versão atual (0 se ainda não houve alterações)"""
+        return cls.objects.filter(name=name).values_list('version', flat=True).first() or 0
+    
+    @classmethod
+    def bump(cls, name='stock'):
+        """Incrementar a versão de forma atômica"""
+        updated = cls.objects.filter(name=name).update(
+            version=F('version') + 1,
+            updated_at=timezone.now()
+        )
+        if not updated:
+            version, created = cls.objects.get_or_create(name=name, defaults={'version': 1})
+            if not created:
+                cls.objects.filter(name=name).update(version=F('version') + 1)
+    
+    @classmethod
+    def bump_many(cls, names):
+        """Incrementar várias versões com um UPDATE (nomes ordenados: mesma ordem de locks)"""
+        names = sorted(set(names))
+        updated = cls.objects.filter(name__in=names).update(
+            version=F('version') + 1,
+            updated_at=timezone.now()
+        )
+        if updated < len(names):
+            existing = set(cls.objects.filter(name__in=names).values_list('name', flat=True))
+            for name in names:
+                if name not in existing:
+                    cls.bump(name)
+
+
+# Versões a incrementar no próximo commit, por thread e banco
+_pending_bumps = threading.local()
+
+
+def _pending_versions(using):
+    if not hasattr(_pending_bumps, 'names'):
+        _pending_bumps.names = defaultdict(set)
+    return _pending_bumps.names[using]
+
+
+def bump_data_versions_on_commit(names, using=DEFAULT_DB_ALIAS):
+    """
+    Incrementar as versões uma vez por transação, depois do commit.
+    
+    Os saves de uma transação (ex.: aprovação de transferência) só acumulam
+    os nomes; o primeiro callback após o commit grava todos num UPDATE, fora
+    do lock de escrita da transação, e os demais não encontram pendências.
+    Fora de transação, o incremento é imediato. Nomes de uma transação
+    desfeita são incrementados no próximo commit (apenas uma invalidação a mais).
+    """
+    _pending_versions(using).update(names)
+    transaction.on_commit(lambda: _flush_pending_versions(using), using=using)
+
+
+def _flush_pending_versions(using):
+    pending = _pending_versions(using)
+    if pending:
+        names = list(pending)
+        pending.clear()
+        DataVersion.bump_many(names)
+
+
+# Modelos cujas alterações mudam o conteúdo dos relatórios de estoque.
+# Atualizações via QuerySet.update() não disparam sinais; nos fluxos de
+# transferência elas ocorrem junto com o save() da StockTransfer.
+STOCK_DATA_MODELS = (
+    'inventory.Category',
+    'inventory.Medication',
+    'inventory.Stock',
+    'inventory.StockMovement',
+    'branches.Branch',
+    'branches.BranchStock',
+    'branches.StockTransfer',
+)
+
+
+def bump_stock_data_version(sender, **kwargs):
+    """Invalidar caches dependentes dos dados de estoque"""
+    if kwargs.get('raw'):
+        return
+    bump_data_versions_on_commit(['stock'], kwargs.get('using') or DEFAULT_DB_ALIAS)
+
+
+for _model in STOCK_DATA_MODELS:
+    post_save.connect(bump_stock_data_version, sender=_model, dispatch_uid=f'stock_version_save_{_model}')
+    post_delete.connect(bump_stock_data_version, sender=_model, dispatch_uid=f'stock_version_delete_{_model}')
+
+
+# Catálogo: usado nas listas de fornecedores e no estoque baixo das filiais
+# (minimum_stock do medicamento)
+CATALOG_DATA_MODELS = (
+    'inventory.Category',
+    'inventory.Medication',
+    'suppliers.Supplier',
+)
+
+
+def bump_catalog_data_version(sender, **kwargs):
+    """Invalidar fragmentos que exibem dados do catálogo"""
+    if kwargs.get('raw'):
+        return
+    bump_data_versions_on_commit(['catalog'], kwargs.get('using') or DEFAULT_DB_ALIAS)
+
+
+for _model in CATALOG_DATA_MODELS:
+    post_save.connect(bump_catalog_data_version, sender=_model, dispatch_uid=f'catalog_version_save_{_model}')
+    post_delete.connect(bump_catalog_data_version, sender=_model, dispatch_uid=f'catalog_version_delete_{_model}')
+
+
+# Versão por filial: filiais afetadas por cada alteração
+BRANCH_DATA_MODELS = {
+    'branches.Branch': lambda instance: [instance.pk],
+    'branches.BranchStock': lambda instance: [instance.branch_id],
+    'branches.StockTransfer': lambda instance: [instance.from_branch_id, instance.to_branch_id],
+    # Nome do gerente exibido nos cards das filiais
+    'auth.User': lambda instance: list(instance.managed_branches.values_list('pk', flat=True)),
+}
+
+# Modelos cujas filiais são consultadas antes da exclusão (o SET_NULL de
+# Branch.manager já foi aplicado quando o post_delete é disparado)
+BRANCH_DATA_MODELS_PRE_DELETE = ('auth.User',)
+
+
+def branch_data_version_name(branch_id):
+    return f'branch:{branch_id}'
+
+
+def bump_branch_data_version(sender, instance, **kwargs):
+    """Invalidar fragmentos das filiais envolvidas na alteração"""
+    if kwargs.get('raw'):
+        return
+    affected_branches = BRANCH_DATA_MODELS[sender._meta.label](instance)
+    bump_data_versions_on_commit(
+        [branch_data_version_name(branch_id) for branch_id in affected_branches if branch_id is not None],
+        kwargs.get('using') or DEFAULT_DB_ALIAS
+    )
+
+
+for _model in BRANCH_DATA_MODELS:
+    post_save.connect(bump_branch_data_version, sender=_model, dispatch_uid=f'branch_version_save_{_model}')
+    _delete_signal = pre_delete if _model in BRANCH_DATA_MODELS_PRE_DELETE else post_delete
+    _delete_signal.connect(bump_branch_data_version, sender=_model, dispatch_uid=f'branch_version_delete_{_model}')
+
+
+@receiver(connection_created, dispatch_uid='configure_sqlite_connection')
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """WAL, busy_timeout e demais PRAGMAs em cada nova conexão SQLite do banco default"""
+    apply_sqlite_pragmas(connection)
+
+
+@receiver(connection_created, dispatch_uid='install_query_recorder')
+def install_request_query_recorder(sender, connection, **kwargs):
+    """Consultas de cada conexão contadas nas métricas da requisição em andamento"""
+    install_query_recorder(connection)
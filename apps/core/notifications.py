@@ -1,12 +1,27 @@
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from django.db.models import Q, Sum, F
+from django.db.models.functions import Coalesce
 from datetime import datetime, timedelta
 from apps.inventory.models import Medication, Stock, Alert
 from apps.suppliers.models import Supplier
 
 
+# Notificações em cache: chave com a versão dos dados de estoque e timeout
+# curto para alertas, fornecedores e datas (segundos)
+NOTIFICATIONS_CACHE_KEY = 'core_notifications:{version}'
+DEFAULT_NOTIFICATIONS_CACHE_TIMEOUT = 30
+
+
 class NotificationManager:
-    """Gerenciador de notificações do sistema"""
+    """
+    Gerenciador de notificações do sistema
+    
+    get_all_notifications() e a versão async aget_all_notifications() montam
+    a mesma lista (mesmas consultas e textos) e a guardam no cache por
+    NOTIFICATIONS_CACHE_TIMEOUT segundos.
+    """
     
     def __init__(self, user=None):
         self.user = user
@@ -14,59 +29,80 @@ class NotificationManager:
     
     def get_all_notifications(self):
         """Obter todas as notificações do sistema"""
+        from .models import DataVersion
+        
+        cache_key = NOTIFICATIONS_CACHE_KEY.format(version=DataVersion.current('stock'))
+        cached = cache.get(cache_key)
+        if cached is not None:
+            self.notifications = cached
+            return cached
+        
         self.notifications = []
         
         # Verificar estoque baixo
-        self._check_low_stock()
-        
-        # Verificar vencimentos próximos
-        self._check_near_expiry()
+        for med in low_stock_medications():
+            self.notifications.append(self._low_stock_notification(med))
         
-        # Verificar medicamentos vencidos
-        self._check_expired_medications()
+        # Vencimentos próximos, vencidos, fornecedores inativos e alertas não resolvidos
+        for queryset, build_notification in self._counted_checks():
+            count = queryset.count()
+            if count > 0:
+                self.notifications.append(build_notification(count))
         
-        # Verificar fornecedores inativos
-        self._check_inactive_suppliers()
+        self.notifications.sort(key=lambda x: x['priority'], reverse=True)
+        cache.set(cache_key, self.notifications, get_notifications_cache_timeout())
+        return self.notifications
+    
+    async def aget_all_notifications(self):
+        """get_all_notifications() com ORM e cache assíncronos"""
+        from .models import DataVersion
         
-        # Verificar alertas não resolvidos
-        self._check_unresolved_alerts()
+        version = await DataVersion.objects.filter(name='stock').values_list('version', flat=True).afirst()
+        cache_key = NOTIFICATIONS_CACHE_KEY.format(version=version or 0)
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            self.notifications = cached
+            return cached
         
-        return sorted(self.notifications, key=lambda x: x['priority'], reverse=True)
-    
-    def _check_low_stock(self):
-        """Verificar medicamentos com estoque baixo"""
-        # Buscar todos os medicamentos ativos e verificar estoque usando a propriedade
-        medications = Medication.objects.filter(is_active=True).select_related('category')
+        self.notifications = []
         
-        for med in medications:
-            if med.is_low_stock:  # Usa a propriedade is_low_stock que já verifica current_stock
-                self.notifications.append({
-                    'id': f'low_stock_{med.id}',
-                    'type': 'warning',
-                    'priority': 3,
-                    'title': 'Estoque Baixo',
-                    'message': f'{med.name} com apenas {med.current_stock} unidades',
-                    'icon': 'fas fa-exclamation-triangle',
-                    'color': 'warning',
-                    'timestamp': timezone.now(),
-                    'action_url': f'/inventory/medications/{med.id}/',
-                    'action_text': 'Ver Medicamento',
-                    'category': 'estoque'
-                })
-    
-    def _check_near_expiry(self):
-        """Verificar medicamentos próximos ao vencimento"""
-        near_expiry_date = timezone.now().date() + timedelta(days=30)
+        async for med in low_stock_medications():
+            self.notifications.append(self._low_stock_notification(med))
         
-        near_expiry_stock = Stock.objects.filter(
-            is_active=True,
-            expiry_date__lte=near_expiry_date,
-            expiry_date__gte=timezone.now().date()
-        ).select_related('medication')
+        for queryset, build_notification in self._counted_checks():
+            count = await queryset.acount()
+            if count > 0:
+                self.notifications.append(build_notification(count))
         
-        count = near_expiry_stock.count()
-        if count > 0:
-            self.notifications.append({
+        self.notifications.sort(key=lambda x: x['priority'], reverse=True)
+        await cache.aset(cache_key, self.notifications, get_notifications_cache_timeout())
+        return self.notifications
+    
+    def _low_stock_notification(self, med):
+        return {
+            'id': f'low_stock_{med.id}',
+            'type': 'warning',
+            'priority': 3,
+            'title': 'Estoque Baixo',
+            'message': f'{med.name} com apenas {med.branch_stock} unidades',
+            'icon': 'fas fa-exclamation-triangle',
+            'color': 'warning',
+            'timestamp': timezone.now(),
+            'action_url': f'/inventory/medications/{med.id}/',
+            'action_text': 'Ver Medicamento',
+            'category': 'estoque'
+        }
+    
+    def _counted_checks(self):
+        """Verificações por contagem: (queryset, montagem da notificação)"""
+        today = timezone.now().date()
+        return [
+            # Medicamentos próximos ao vencimento
+            (Stock.objects.filter(
+                is_active=True,
+                expiry_date__lte=today + timedelta(days=30),
+                expiry_date__gte=today
+            ), lambda count: {
                 'id': 'near_expiry',
                 'type': 'warning',
                 'priority': 4,
@@ -78,18 +114,12 @@ class NotificationManager:
                 'action_url': '/reports/expiry/',
                 'action_text': 'Gerar Relatório',
                 'category': 'vencimento'
-            })
-    
-    def _check_expired_medications(self):
-        """Verificar medicamentos vencidos"""
-        expired_stock = Stock.objects.filter(
-            is_active=True,
-            expiry_date__lt=timezone.now().date()
-        ).select_related('medication')
-        
-        count = expired_stock.count()
-        if count > 0:
-            self.notifications.append({
+            }),
+            # Medicamentos vencidos
+            (Stock.objects.filter(
+                is_active=True,
+                expiry_date__lt=today
+            ), lambda count: {
                 'id': 'expired',
                 'type': 'danger',
                 'priority': 5,
@@ -101,18 +131,12 @@ class NotificationManager:
                 'action_url': '/reports/expiry/',
                 'action_text': 'Ação Imediata',
                 'category': 'vencimento'
-            })
-    
-    def _check_inactive_suppliers(self):
-        """Verificar fornecedores inativos há muito tempo"""
-        inactive_suppliers = Supplier.objects.filter(
-            is_active=False,
-            updated_at__lt=timezone.now() - timedelta(days=90)
-        )
-        
-        count = inactive_suppliers.count()
-        if count > 0:
-            self.notifications.append({
+            }),
+            # Fornecedores inativos há muito tempo
+            (Supplier.objects.filter(
+                is_active=False,
+                updated_at__lt=timezone.now() - timedelta(days=90)
+            ), lambda count: {
                 'id': 'inactive_suppliers',
                 'type': 'info',
                 'priority': 2,
@@ -124,18 +148,12 @@ class NotificationManager:
                 'action_url': '/suppliers/',
                 'action_text': 'Revisar',
                 'category': 'fornecedores'
-            })
-    
-    def _check_unresolved_alerts(self):
-        """Verificar alertas não resolvidos"""
-        unresolved_alerts = Alert.objects.filter(
-            is_resolved=False,
-            created_at__lt=timezone.now() - timedelta(hours=24)
-        )
-        
-        count = unresolved_alerts.count()
-        if count > 0:
-            self.notifications.append({
+            }),
+            # Alertas não resolvidos
+            (Alert.objects.filter(
+                is_resolved=False,
+                created_at__lt=timezone.now() - timedelta(hours=24)
+            ), lambda count: {
                 'id': 'unresolved_alerts',
                 'type': 'warning',
                 'priority': 3,
@@ -147,26 +165,43 @@ class NotificationManager:
                 'action_url': '/inventory/alerts/',
                 'action_text': 'Ver Alertas',
                 'category': 'alertas'
-            })
+            }),
+        ]
     
     def get_notification_counts(self):
         """Obter contadores de notificações por tipo"""
-        notifications = self.get_all_notifications()
-        
-        counts = {
-            'total': len(notifications),
-            'danger': len([n for n in notifications if n['type'] == 'danger']),
-            'warning': len([n for n in notifications if n['type'] == 'warning']),
-            'info': len([n for n in notifications if n['type'] == 'info']),
-            'success': len([n for n in notifications if n['type'] == 'success']),
-        }
-        
-        return counts
+        return count_notifications(self.get_all_notifications())
     
     def get_critical_notifications(self, limit=5):
         """Obter notificações mais críticas"""
         all_notifications = self.get_all_notifications()
         return all_notifications[:limit]
+    
+    async def aget_critical_notifications(self, limit=5):
+        all_notifications = await self.aget_all_notifications()
+        return all_notifications[:limit]
+
+
+def low_stock_medications():
+    """Medicamentos ativos com estoque (somado nas filiais) até o mínimo"""
+    return Medication.objects.filter(is_active=True).annotate(
+        branch_stock=Coalesce(Sum('branchstock__quantity'), 0)
+    ).filter(branch_stock__lte=F('minimum_stock'))
+
+
+def get_notifications_cache_timeout():
+    return getattr(settings, 'NOTIFICATIONS_CACHE_TIMEOUT', DEFAULT_NOTIFICATIONS_CACHE_TIMEOUT)
+
+
+def count_notifications(notifications):
+    """Contadores de notificações por tipo"""
+    return {
+        'total': len(notifications),
+        'danger': len([n for n in notifications if n['type'] == 'danger']),
+        'warning': len([n for n in notifications if n['type'] == 'warning']),
+        'info': len([n for n in notifications if n['type'] == 'info']),
+        'success': len([n for n in notifications if n['type'] == 'success']),
+    }
 
 
 def get_dashboard_stats():
@@ -179,9 +214,8 @@ def get_dashboard_stats():
         total=Sum('quantity')
     )['total'] or 0
     
-    # Estoque baixo - contar usando a propriedade is_low_stock
-    medications = Medication.objects.filter(is_active=True)
-    low_stock_count = sum(1 for med in medications if med.is_low_stock)
+    # Estoque baixo - mesma regra de Medication.is_low_stock, numa consulta
+    low_stock_count = low_stock_medications().count()
     
     # Próximos ao vencimento (30 dias)
     near_expiry_date = timezone.now().date() + timedelta(days=30)
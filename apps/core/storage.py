@@ -0,0 +1,80 @@
+"""
+Storage dos arquivos estáticos em produção.
+
+No `collectstatic` (etapa de build), os CSS/JS copiados para STATIC_ROOT são
+minificados; em seguida o WhiteNoise gera os nomes com hash (manifest) e as
+variantes .gz/.br. Os arquivos com hash são servidos com Cache-Control de
+longo prazo e `immutable`: após a primeira visita, nenhum byte estático é
+baixado de novo até o conteúdo mudar.
+"""
+
+import logging
+
+from django.conf import settings
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+# Minificadores opcionais (sem eles os arquivos são apenas comprimidos)
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+logger = logging.getLogger(__name__)
+
+
+def minify_css(source):
+    return rcssmin.cssmin(source) if rcssmin else source
+
+
+def minify_js(source):
+    return rjsmin.jsmin(source) if rjsmin else source
+
+
+MINIFIERS = {
+    '.css': minify_css,
+    '.js': minify_js,
+}
+
+
+class MinifiedManifestStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """Manifest + gzip/brotli do WhiteNoise, com minificação antes do hash"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run and getattr(settings, 'STATIC_MINIFY', True):
+            minified = self.minify_files(paths)
+            # O hash é calculado a partir de paths[nome] (por padrão o arquivo
+            # fonte): apontar os minificados para as cópias em STATIC_ROOT
+            paths = dict(paths, **{path: (self, path) for path in minified})
+        yield from super().post_process(paths, dry_run, **options)
+
+    def minify_files(self, paths):
+        """
+        Minificar as cópias em STATIC_ROOT (os fontes em static/ não mudam).
+        Retorna os caminhos minificados.
+        """
+        minified_paths = []
+        saved = 0
+        for path in paths:
+            name = path.lower()
+            extension = name[name.rfind('.'):]
+            minify = MINIFIERS.get(extension)
+            # Arquivos .min.* e de apps de terceiros já chegam minificados
+            if minify is None or name.endswith(f'.min{extension}'):
+                continue
+            with self.open(path) as source_file:
+                original = source_file.read().decode('utf-8')
+            minified = minify(original)
+            if len(minified) >= len(original):
+                continue
+            full_path = self.path(path)
+            with open(full_path, 'w', encoding='utf-8') as output:
+                output.write(minified)
+            minified_paths.append(path)
+            saved += len(original.encode('utf-8')) - len(minified.encode('utf-8'))
+        logger.info(f"Estáticos minificados: {saved // 1024} KB a menos")
+        return minified_paths
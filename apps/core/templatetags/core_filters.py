@@ -25,3 +25,8 @@ def subtract(value, arg):
         return float(value) - float(arg)
     except (ValueError, TypeError):
         return 0
+
+@register.filter
+def branch_version(data_versions, branch_id):
+    """Versão dos dados de uma filial (chave de {% cache %})"""
+    return data_versions.branch(branch_id)
@@ -1,3 +1,482 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import OperationalError, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from apps.branches import views as branch_views
+from apps.branches.models import Branch, BranchStock
+from apps.inventory.models import Category, Medication
+from apps.reports.models import Report
+from apps.suppliers.models import Supplier
+
+from . import api_views
+from .management.commands.copy_sqlite_to_postgres import Command as CopyCommand, strongly_connected_components
+from .db import stock_write_transaction
+from .middleware import RequestMetricsMiddleware
+from .models import DataVersion, branch_data_version_name
+
+
+class DataVersionTests(TestCase):
+    """Versões incrementadas uma vez por transação, depois do commit"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name='Analgésicos')
+            self.supplier = Supplier.objects.create(name='Distribuidora')
+            self.medication = Medication.objects.create(
+                name='Dipirona', category=self.category, supplier=self.supplier, price=1
+            )
+            self.branch = Branch.objects.create(name='Centro', code='CTR', address='-', phone='+5514999999999')
+
+    def versions(self):
+        return {
+            name: DataVersion.current(name)
+            for name in ('stock', 'catalog', branch_data_version_name(self.branch.pk))
+        }
+
+    def test_transaction_bumps_each_version_once_after_commit(self):
+        before = self.versions()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                stock = BranchStock.objects.create(branch=self.branch, medication=self.medication, quantity=10)
+                stock.quantity = 5
+                stock.save()
+                self.medication.minimum_stock = 3
+                self.medication.save()
+                # Nada é gravado em DataVersion durante a transação
+                self.assertEqual(self.versions(), before)
+
+        self.assertEqual(self.versions(), {name: version + 1 for name, version in before.items()})
+        self.assertGreater(len(callbacks), 1)
+
+    def test_pending_versions_written_in_one_update(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            BranchStock.objects.create(branch=self.branch, medication=self.medication, quantity=10)
+            self.medication.save()
+
+        with self.assertNumQueries(1):
+            for callback in callbacks:
+                callback()
+
+    def test_manager_changes_bump_managed_branch_version(self):
+        name = branch_data_version_name(self.branch.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            manager = User.objects.create(username='gerente')
+            self.branch.manager = manager
+            self.branch.save()
+        before = DataVersion.current(name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            manager.first_name = 'Maria'
+            manager.save()
+        self.assertEqual(DataVersion.current(name), before + 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            manager.delete()
+        self.assertEqual(DataVersion.current(name), before + 2)
+
+
+class DedupeCommandTests(TestCase):
+    """Mesclagem de duplicatas: análise desfeita por padrão, --commit aplica"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Analgésicos')
+        self.supplier = Supplier.objects.create(name='Distribuidora', cnpj='12.345.678/0001-90')
+        duplicate_supplier = Supplier.objects.create(name='Distribuidora S/A', cnpj=' 12345678000190')
+        self.medication = Medication.objects.create(
+            name='Dipirona', category=category, supplier=self.supplier, price=1, barcode='7891000100'
+        )
+        duplicate_medication = Medication.objects.create(
+            name='Dipirona 500mg', category=category, supplier=duplicate_supplier, price=1, barcode='789-1000-100'
+        )
+        self.branch = Branch.objects.create(name='Centro', code='CTR', address='-', phone='+5514999999999')
+        BranchStock.objects.create(
+            branch=self.branch, medication=self.medication, quantity=10, reserved_quantity=1
+        )
+        BranchStock.objects.create(
+            branch=self.branch, medication=duplicate_medication, quantity=5, reserved_quantity=2
+        )
+
+    def dedupe(self, *args):
+        output = StringIO()
+        call_command('dedupe', *args, stdout=output)
+        return output.getvalue()
+
+    def test_dry_run_reports_and_rolls_back(self):
+        version = DataVersion.current('catalog')
+        output = self.dedupe()
+
+        self.assertIn('1 duplicata(s)', output)
+        self.assertIn('Modo análise', output)
+        self.assertEqual(Supplier.objects.count(), 2)
+        self.assertEqual(Medication.objects.count(), 2)
+        self.assertEqual(BranchStock.objects.count(), 2)
+        self.assertEqual(DataVersion.current('catalog'), version)
+
+    def test_commit_merges_duplicates_and_repoints_references(self):
+        version = DataVersion.current('catalog')
+        self.dedupe('--commit')
+
+        self.assertEqual(list(Supplier.objects.values_list('pk', flat=True)), [self.supplier.pk])
+        medication = Medication.objects.get()
+        self.assertEqual((medication.pk, medication.supplier_id), (self.medication.pk, self.supplier.pk))
+        # Estoques que colidiriam em (filial, medicamento) são somados
+        stock = BranchStock.objects.get()
+        self.assertEqual((stock.medication_id, stock.quantity, stock.reserved_quantity), (medication.pk, 15, 3))
+        self.assertEqual(DataVersion.current('catalog'), version + 1)
+
+
+class HealthCheckTests(TestCase):
+    """Probes respondidos pelo HealthCheckMiddleware, antes do restante da pilha"""
+
+    def test_live_makes_no_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/health/live/', HTTP_HOST='10.0.0.5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'ok'})
+        self.assertEqual(response['Cache-Control'], 'no-store')
+
+    def test_ready_pings_database_and_cache(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/health/ready')
+        self.assertEqual(response.status_code, 200)
+        checks = response.json()['checks']
+        self.assertEqual({name: check['ok'] for name, check in checks.items()}, {'database': True, 'cache': True})
+
+    def test_ready_unavailable_when_a_check_fails(self):
+        with mock.patch.object(caches['default'], 'set', side_effect=ConnectionError('cache fora do ar')):
+            response = self.client.get('/health/ready/')
+        self.assertEqual(response.status_code, 503)
+        body = response.json()
+        self.assertEqual(body['status'], 'unavailable')
+        self.assertTrue(body['checks']['database']['ok'])
+        self.assertEqual(body['checks']['cache']['error'], 'ConnectionError: cache fora do ar')
+
+
+class AsyncApiViewTests(TestCase):
+    """Views async de polling (ASYNC_API_VIEWS) com as mesmas respostas das síncronas"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('polling', password='senha-teste')
+        category = Category.objects.create(name='Analgésicos')
+        supplier = Supplier.objects.create(name='Distribuidora')
+        self.medication = Medication.objects.create(
+            name='Dipirona', category=category, supplier=supplier, price=1, minimum_stock=10
+        )
+        self.branch = Branch.objects.create(name='Centro', code='CTR', address='-', phone='+5514999999999')
+        BranchStock.objects.create(branch=self.branch, medication=self.medication, quantity=8, reserved_quantity=1)
+
+    def request(self, path='/', user=None, **params):
+        request = RequestFactory().get(path, params)
+        request.user = user or self.user
+        request.session = SessionStore()
+        return request
+
+    def json(self, response):
+        return json.loads(response.content)
+
+    async def test_anonymous_redirected_to_login(self):
+        response = await api_views.get_notifications_async(self.request('/api/notifications/', AnonymousUser()))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('next=/api/notifications/', response.url)
+
+    async def test_notifications_match_sync_view(self):
+        sync_response = await sync_to_async(api_views.get_notifications)(self.request())
+        cache.clear()
+        async_response = await api_views.get_notifications_async(self.request())
+
+        sync_body, async_body = self.json(sync_response), self.json(async_response)
+        without_timestamp = lambda body: [
+            {key: value for key, value in n.items() if key != 'timestamp'} for n in body['notifications']
+        ]
+        self.assertEqual(without_timestamp(async_body), without_timestamp(sync_body))
+        self.assertEqual(async_body['counts'], sync_body['counts'])
+        self.assertIn(f'low_stock_{self.medication.pk}', [n['id'] for n in async_body['notifications']])
+
+        critical = self.json(await api_views.get_critical_notifications_async(self.request()))
+        self.assertEqual(critical['notifications'], async_body['notifications'][:10])
+
+    async def test_branch_endpoints_match_sync_views(self):
+        endpoints = [
+            ('api_stock_sync', (self.branch.pk, self.medication.pk), {}),
+            ('api_get_available_stock', (), {'branch_id': self.branch.pk, 'medication_id': self.medication.pk}),
+            ('api_branch_stats', (self.branch.pk,), {}),
+        ]
+        for name, args, params in endpoints:
+            with self.subTest(name):
+                sync_body = self.json(
+                    await sync_to_async(getattr(branch_views, name))(self.request(**params), *args)
+                )
+                async_body = self.json(await getattr(branch_views, f'{name}_async')(self.request(**params), *args))
+                self.assertEqual(async_body, sync_body)
+                self.assertTrue(async_body['success'])
+
+        stats = self.json(await branch_views.api_branch_stats_async(self.request(), self.branch.pk))
+        self.assertEqual((stats['total_stock_quantity'], stats['low_stock_count']), (8, 1))
+
+    def test_branch_stats_cached_until_data_versions_change(self):
+        stats = lambda: self.json(branch_views.api_branch_stats(self.request(), self.branch.pk))
+        first = stats()
+        # Filial e versões; as contagens vêm do cache
+        with self.assertNumQueries(2):
+            self.assertEqual(stats(), first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BranchStock.objects.filter(branch=self.branch).get().save()
+            self.medication.minimum_stock = 5
+            self.medication.save()
+        self.assertEqual(stats()['low_stock_count'], 0)
+
+    async def test_async_view_queries_recorded_in_metrics(self):
+        middleware = RequestMetricsMiddleware(api_views.get_notifications_async)
+        with mock.patch.object(middleware, '_record') as record:
+            response = await middleware(self.request('/api/notifications/'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(record.call_args.args[3].count, 0)
+
+
+class RequestMetricsQueryTests(TestCase):
+    """Consultas contadas também quando o ORM roda na thread do sync_to_async"""
+
+    def test_sync_view_queries_recorded(self):
+        def view(request):
+            list(User.objects.all())
+            return HttpResponse()
+
+        middleware = RequestMetricsMiddleware(view)
+        with mock.patch.object(middleware, '_record') as record:
+            middleware(RequestFactory().get('/'))
+        self.assertEqual(record.call_args.args[3].count, 1)
+
+    async def test_async_view_queries_recorded(self):
+        async def view(request):
+            await User.objects.acount()
+            await User.objects.filter(is_staff=True).aexists()
+            return HttpResponse()
+
+        middleware = RequestMetricsMiddleware(view)
+        with mock.patch.object(middleware, '_record') as record:
+            await middleware(RequestFactory().get('/'))
+        self.assertEqual(record.call_args.args[3].count, 2)
+
+    def test_queries_outside_requests_not_recorded(self):
+        middleware = RequestMetricsMiddleware(lambda request: HttpResponse())
+        with mock.patch.object(middleware, '_record') as record:
+            list(User.objects.all())
+            middleware(RequestFactory().get('/'))
+        self.assertEqual(record.call_args.args[3].count, 0)
+
+
+class CopyModelOrderTests(SimpleTestCase):
+    """Ordem de cópia do copy_sqlite_to_postgres: dependências antes, ciclos juntos"""
+
+    def test_cycle_grouped_after_its_dependencies(self):
+        edges = {'a': {'b'}, 'b': {'c'}, 'c': {'b', 'd'}, 'd': set(), 'e': {'a'}}
+        components = strongly_connected_components(['e', 'a', 'b', 'c', 'd'], edges)
+        self.assertEqual([sorted(component) for component in components], [['d'], ['b', 'c'], ['a'], ['e']])
+
+    def test_self_referencing_model_copied_in_one_transaction(self):
+        command = CopyCommand()
+        groups = command._get_model_groups()
+        models = [model for group in groups for model in group]
+        self.assertLess(models.index(User), models.index(Report))
+        self.assertIn([Report], groups)
+        self.assertNotIsInstance(command._group_transaction([Report], 'default'), nullcontext)
+        self.assertIsInstance(command._group_transaction([Branch], 'default'), nullcontext)
+
+
+USING_POSTGRESQL = settings.DATABASE_ENGINE == 'postgresql'
+
+
+@skipUnless(USING_POSTGRESQL, 'requer DATABASE_ENGINE=postgresql')
+class CopySqliteToPostgresTests(TransactionTestCase):
+    """Cópia real para o PostgreSQL, com chave estrangeira para linha copiada depois"""
+
+    # O runner prepara os bancos de todas as classes, mesmo as ignoradas
+    databases = {'default', 'sqlite_source'} if USING_POSTGRESQL else {'default'}
+
+    def test_forward_reference_in_self_fk_survives_small_batches(self):
+        user = User.objects.using('sqlite_source').create(username='origem')
+        with transaction.atomic(using='sqlite_source'):
+            Report.objects.using('sqlite_source').create(
+                pk=1, title='Seguidor', report_type='stock', generated_by=user, status='completed', source_id=2
+            )
+            Report.objects.using('sqlite_source').create(
+                pk=2, title='Líder', report_type='stock', generated_by=user, status='completed'
+            )
+
+        call_command('copy_sqlite_to_postgres', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(Report.objects.using('default').get(pk=1).source_id, 2)
+        self.assertEqual(Report.objects.using('default').count(), 2)
+
+
+class SqlitePragmaTests(SimpleTestCase):
+    """PRAGMAs (journal_mode=WAL grava no arquivo) aplicados só ao banco default"""
+
+    def journal_mode(self, alias):
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        for suffix in ('-wal', '-shm'):
+            self.addCleanup(lambda path=path + suffix: os.path.exists(path) and os.remove(path))
+        connection = SQLiteDatabaseWrapper(dict(connections['default'].settings_dict, NAME=path), alias)
+        try:
+            with connection.cursor() as cursor:
+                return cursor.execute('PRAGMA journal_mode').fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_default_alias_uses_wal(self):
+        self.assertEqual(self.journal_mode('default'), 'wal')
+
+    def test_other_aliases_left_untouched(self):
+        self.assertEqual(self.journal_mode('sqlite_source'), 'delete')
+
+
+class StockWriteTransactionTests(SimpleTestCase):
+    """Escritores simultâneos no SQLite esperam o lock em vez de falhar com 'database is locked'"""
+
+    alias = 'stock_writer'
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        for suffix in ('-wal', '-shm'):
+            self.addCleanup(lambda path=self.path + suffix: os.path.exists(path) and os.remove(path))
+        self.run_in_connection(lambda cursor: cursor.execute(
+            'CREATE TABLE counter (id integer PRIMARY KEY, value integer NOT NULL)'
+        ))
+        self.run_in_connection(lambda cursor: cursor.execute('INSERT INTO counter VALUES (1, 0)'))
+
+    def run_in_connection(self, func):
+        """Conexão própria para o arquivo temporário (as conexões são por thread)"""
+        connections[self.alias] = SQLiteDatabaseWrapper(
+            dict(connections['default'].settings_dict, NAME=self.path), self.alias
+        )
+        try:
+            with connections[self.alias].cursor() as cursor:
+                return func(cursor)
+        finally:
+            connections[self.alias].close()
+            del connections[self.alias]
+
+    def increment(self, errors):
+        def read_then_write(cursor):
+            for _ in range(5):
+                try:
+                    with stock_write_transaction(using=self.alias):
+                        cursor.execute('SELECT value FROM counter WHERE id = 1')
+                        value = cursor.fetchone()[0]
+                        time.sleep(0.01)
+                        cursor.execute('UPDATE counter SET value = %s WHERE id = 1', [value + 1])
+                except OperationalError as e:
+                    errors.append(e)
+        self.run_in_connection(read_then_write)
+
+    def test_concurrent_read_then_write_is_serialized(self):
+        errors = []
+        threads = [threading.Thread(target=self.increment, args=(errors,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        value = self.run_in_connection(
+            lambda cursor: cursor.execute('SELECT value FROM counter WHERE id = 1').fetchone()[0]
+        )
+        self.assertEqual(value, 20)
+
+    def test_rollback_on_error_and_commit_hooks_after_commit(self):
+        committed = []
+
+        def write(cursor):
+            with self.assertRaises(ValueError):
+                with stock_write_transaction(using=self.alias):
+                    cursor.execute('UPDATE counter SET value = 100 WHERE id = 1')
+                    raise ValueError
+            with stock_write_transaction(using=self.alias):
+                cursor.execute('UPDATE counter SET value = value + 1 WHERE id = 1')
+                transaction.on_commit(lambda: committed.append(True), using=self.alias)
+                self.assertEqual(committed, [])
+            self.assertTrue(connections[self.alias].get_autocommit())
+            return cursor.execute('SELECT value FROM counter WHERE id = 1').fetchone()[0]
+
+        self.assertEqual(self.run_in_connection(write), 1)
+        self.assertEqual(committed, [True])
+
+
+class MinifiedStaticStorageTests(SimpleTestCase):
+    """collectstatic: minificação, nomes com hash e variantes comprimidas"""
+
+    CSS = '.card {\n    color: #ffffff;\n    margin: 0px;\n}\n\n/* comentário */\n' * 40
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.static_root, ignore_errors=True)
+        os.makedirs(os.path.join(self.source, 'css'))
+        self.write('css/app.css', self.CSS)
+        self.write('css/vendor.min.css', self.CSS)
+
+    def write(self, name, content):
+        with open(os.path.join(self.source, name), 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def read(self, root, name, mode='r'):
+        with open(os.path.join(root, name), mode) as f:
+            return f.read()
+
+    def collectstatic(self, **extra_settings):
+        storages = dict(settings.STORAGES, staticfiles={
+            'BACKEND': 'apps.core.storage.MinifiedManifestStaticFilesStorage',
+        })
+        with override_settings(
+            STORAGES=storages,
+            STATIC_ROOT=self.static_root,
+            STATICFILES_DIRS=[self.source],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            **extra_settings
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(self.static_root, 'staticfiles.json')) as f:
+            return json.load(f)['paths']
+
+    def test_collected_css_is_minified_hashed_and_compressed(self):
+        paths = self.collectstatic()
+
+        hashed = paths['css/app.css']
+        self.assertNotEqual(hashed, 'css/app.css')
+        minified = self.read(self.static_root, hashed)
+        self.assertEqual(minified, '.card{color:#ffffff;margin:0px}' * 40)
+        for suffix in ('.gz', '.br'):
+            self.assertTrue(os.path.exists(os.path.join(self.static_root, hashed + suffix)))
+
+        # Fontes e arquivos já minificados ficam como estão
+        self.assertEqual(self.read(self.source, 'css/app.css'), self.CSS)
+        self.assertEqual(self.read(self.static_root, paths['css/vendor.min.css']), self.CSS)
+
+    def test_minification_can_be_disabled(self):
+        paths = self.collectstatic(STATIC_MINIFY=False)
+        self.assertEqual(self.read(self.static_root, paths['css/app.css']), self.CSS)
@@ -1,9 +1,18 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from . import api_views as api
 
 app_name = 'core'
 
+# Endpoints de polling: versões async quando servido por ASGI (uvicorn)
+if settings.ASYNC_API_VIEWS:
+    get_notifications = api.get_notifications_async
+    get_critical_notifications = api.get_critical_notifications_async
+else:
+    get_notifications = api.get_notifications
+    get_critical_notifications = api.get_critical_notifications
+
 urlpatterns = [
     # Dashboard principal (já existente)
     path('', views.dashboard, name='dashboard'),
@@ -21,6 +30,16 @@ urlpatterns = [
     # Integridade do sistema
     path('system-integrity/', views.system_integrity_view, name='system_integrity'),
     
+    # Métricas de desempenho (Prometheus)
+    path('metrics', views.metrics_view, name='metrics'),
+    
+    # Status detalhado (liveness/readiness ficam no HealthCheckMiddleware)
+    path('health/status/', views.health_status_view, name='health_status'),
+    
+    # Notificações (polling do frontend)
+    path('api/notifications/', get_notifications, name='api_notifications'),
+    path('api/notifications/critical/', get_critical_notifications, name='api_critical_notifications'),
+    
     # APIs antigas de lote removidas
     # path('api/batch/<str:batch_number>/locations/', views.api_batch_locations, name='api_batch_locations'),
     # path('api/medication/<int:medication_id>/batches/', views.api_medication_batches, name='api_medication_batches'),
@@ -1,14 +1,19 @@
 # -*- coding: utf-8 -*-
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import JsonResponse, HttpResponse
 from django.db.models import Sum, Count, Q, F
 from django.db import models
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
 # MedicationBatch e BatchLocation foram removidos
 from apps.inventory.models import Medication
 from apps.branches.models import Branch
 from apps.authentication.decorators import farmaceutico_required, admin_required
+from .health import deep_status
+from .metrics import registry as metrics_registry
 
 
 @login_required
@@ -16,36 +21,36 @@ def dashboard(request):
     """
     Dashboard principal do sistema
     Mostra estatísticas gerais e links para as seções principais
-    """
-    from apps.branches.models import BranchStock
-    
-    # Medicamentos únicos
-    total_medications = Medication.objects.filter(is_active=True).count()
-    
-    # Filiais ativas
-    total_branches = Branch.objects.filter(is_active=True).count()
-    
-    # Quantidade total em estoque (por filiais)
-    total_quantity = BranchStock.objects.aggregate(
-        total=Sum('quantity')
-    )['total'] or 0
-    
-    # Estatísticas de estoque baixo
-    low_stock_count = BranchStock.objects.filter(
-        quantity__lte=models.F('medication__minimum_stock')
-    ).count()
     
+    As métricas ficam num fragmento em cache (versão 'stock' + função do
+    usuário); `stats` só consulta o banco quando o fragmento é renderizado.
+    """
     context = {
-        'total_medications': total_medications,
-        'total_branches': total_branches,
-        'total_quantity': total_quantity,
-        'low_stock_count': low_stock_count,
+        'stats': SimpleLazyObject(_dashboard_stats),
         'critical_alerts': [],
     }
     
     return render(request, 'core/dashboard.html', context)
 
 
+def _dashboard_stats():
+    """Métricas do dashboard principal"""
+    from apps.branches.models import BranchStock
+    
+    return {
+        # Medicamentos únicos
+        'total_medications': Medication.objects.filter(is_active=True).count(),
+        # Filiais ativas
+        'total_branches': Branch.objects.filter(is_active=True).count(),
+        # Quantidade total em estoque (por filiais)
+        'total_quantity': BranchStock.objects.aggregate(total=Sum('quantity'))['total'] or 0,
+        # Estatísticas de estoque baixo
+        'low_stock_count': BranchStock.objects.filter(
+            quantity__lte=models.F('medication__minimum_stock')
+        ).count(),
+    }
+
+
 # @farmaceutico_required
 # def unified_stock_view(request):
 #     """
@@ -141,4 +146,52 @@ def system_integrity_view(request):
 @login_required
 def estoque_redirect(request):
     """Redireciona para a lista de filiais, novo fluxo de estoque agregado."""
-    return redirect('branches:branch_list')
\ No newline at end of file
+    return redirect('branches:branch_list')
+
+
+def metrics_view(request):
+    """
+    Métricas de desempenho no formato texto do Prometheus.
+    Acesso de administradores (sessão) ou do coletor com
+    `Authorization: Bearer <METRICS_TOKEN>`.
+    """
+    if _has_metrics_token(request):
+        return _metrics_response()
+    return _admin_metrics_view(request)
+
+
+def _has_metrics_token(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    return bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+@admin_required
+def _admin_metrics_view(request):
+    return _metrics_response()
+
+
+def _metrics_response():
+    return HttpResponse(
+        metrics_registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+def health_status_view(request):
+    """
+    Status detalhado (banco, cache e contadores de alertas), em cache por
+    HEALTH_STATUS_CACHE_TIMEOUT. Mesmo acesso de /metrics.
+    """
+    if _has_metrics_token(request):
+        return _health_status_response()
+    return _admin_health_status_view(request)
+
+
+@admin_required
+def _admin_health_status_view(request):
+    return _health_status_response()
+
+
+def _health_status_response():
+    status = deep_status()
+    return JsonResponse(status, status=200 if status['status'] == 'ok' else 503)
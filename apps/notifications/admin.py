@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import NotificationTemplate, NotificationLog
+from .models import NotificationTemplate, NotificationLog, NotificationLogSummary, PendingAlert
 
 
 @admin.register(NotificationTemplate)
@@ -7,7 +7,7 @@ class NotificationTemplateAdmin(admin.ModelAdmin):
     list_display = ['name', 'template_type', 'is_active', 'created_at']
     list_filter = ['template_type', 'is_active', 'created_at']
     search_fields = ['name', 'subject']
-    readonly_fields = ['created_at']
+    readonly_fields = ['created_at', 'updated_at']
     
     fieldsets = (
         ('Template', {
@@ -22,7 +22,7 @@ class NotificationTemplateAdmin(admin.ModelAdmin):
             'description': 'Mensagem para WhatsApp (opcional)'
         }),
         ('Metadados', {
-            'fields': ('created_at',),
+            'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         })
     )
@@ -34,6 +34,8 @@ class NotificationLogAdmin(admin.ModelAdmin):
     list_filter = ['notification_type', 'status', 'sent_at', 'template__template_type']
     search_fields = ['recipient_email', 'recipient_phone', 'subject', 'template__name']
     readonly_fields = ['sent_at', 'delivered_at']
+    list_select_related = ['template', 'branch']
+    show_full_result_count = False
     
     fieldsets = (
         ('Notificação', {
@@ -59,3 +61,26 @@ class NotificationLogAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         # Não permitir criação manual de logs
         return False
+
+
+@admin.register(NotificationLogSummary)
+class NotificationLogSummaryAdmin(admin.ModelAdmin):
+    list_display = ['month', 'branch', 'template_type', 'notification_type', 'status', 'total']
+    list_filter = ['notification_type', 'status', 'month']
+    list_select_related = ['branch']
+    
+    def has_add_permission(self, request):
+        # Resumos são gerados pelo comando prune_notification_logs
+        return False
+
+
+@admin.register(PendingAlert)
+class PendingAlertAdmin(admin.ModelAdmin):
+    list_display = ['medication', 'branch', 'alert_type', 'current_stock', 'is_pending', 'suppressed_count', 'last_seen_at', 'last_sent_at']
+    list_filter = ['alert_type', 'is_pending', 'branch']
+    search_fields = ['medication__name', 'branch__name']
+    readonly_fields = ['first_seen_at', 'last_seen_at', 'last_sent_at']
+    
+    def has_add_permission(self, request):
+        # Alertas pendentes são criados apenas pelo sistema
+        return False
@@ -65,6 +65,66 @@ class Command(BaseCommand):
 
 *Ação necessária:* Verificar necessidade de reposição
 
+_FarmaSystem - Notificação Automática_'''
+            },
+            
+            {
+                'name': 'Resumo de Estoque Baixo',
+                'template_type': 'low_stock_summary',
+                'subject': '🚨 ALERTA: {{medications_count}} medicamentos com estoque baixo - {{branch_name}}',
+                'email_body': '''
+                <html>
+                <head>
+                    <style>
+                        body { font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }
+                        .container { max-width: 600px; margin: 0 auto; background: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
+                        .header { background: #ef4444; color: white; padding: 20px; border-radius: 5px; text-align: center; }
+                        .content { padding: 20px 0; }
+                        .alert-box { background: #fef2f2; border: 1px solid #ef4444; padding: 15px; border-radius: 5px; margin: 15px 0; }
+                        .footer { background: #f8f9fa; padding: 15px; border-radius: 5px; margin-top: 20px; font-size: 12px; color: #666; }
+                    </style>
+                </head>
+                <body>
+                    <div class="container">
+                        <div class="header">
+                            <h1>🚨 RESUMO DE ESTOQUE BAIXO</h1>
+                        </div>
+                        <div class="content">
+                            <p><strong>Filial:</strong> {{branch_name}}</p>
+                            
+                            {% for med in medications %}
+                            <div class="alert-box">
+                                <h3>⚠️ {{med.name}}</h3>
+                                <p><strong>Estoque Atual:</strong> {{med.current_stock}} unidades</p>
+                                <p><strong>Estoque Mínimo:</strong> {{med.minimum_stock}} unidades</p>
+                                <p><strong>Fornecedor:</strong> {{med.supplier}}</p>
+                                {% if med.suppressed_count %}<p><small>{{med.suppressed_count}} alerta(s) repetido(s) agrupado(s)</small></p>{% endif %}
+                            </div>
+                            {% endfor %}
+                            
+                            <p><strong>Ação Necessária:</strong></p>
+                            <ul>
+                                <li>Verificar necessidade de nova compra</li>
+                                <li>Considerar transferência de outras filiais</li>
+                            </ul>
+                        </div>
+                        <div class="footer">
+                            <p>FarmaSystem - Sistema de Gestão de Farmácia</p>
+                            <p>Este é um email automático. Não responda.</p>
+                        </div>
+                    </div>
+                </body>
+                </html>
+                ''',
+                'whatsapp_message': '''🚨 *RESUMO ESTOQUE BAIXO*
+
+📍 *Filial:* {{branch_name}}
+📊 *Medicamentos:* {{medications_count}} com estoque baixo
+{% for med in medications %}
+💊 {{med.name}}: {{med.current_stock}}/{{med.minimum_stock}} unidades{% endfor %}
+
+*Ação necessária:* Verificar necessidade de reposição
+
 _FarmaSystem - Notificação Automática_'''
             },
             
@@ -104,6 +164,15 @@ _FarmaSystem - Notificação Automática_'''
                                 {% endfor %}
                             </div>
                             
+                            {% if expired_count %}
+                            <div class="warning-box">
+                                <h3>🚫 {{expired_count}} medicamento(s) já vencido(s)</h3>
+                                {% for med in expired_medications %}
+                                <p>• <strong>{{med.name}}</strong> - Vencido há {{med.days_expired}} dias</p>
+                                {% endfor %}
+                            </div>
+                            {% endif %}
+                            
                             <p><strong>Ações Recomendadas:</strong></p>
                             <ul>
                                 <li>Priorizar venda destes medicamentos</li>
@@ -123,7 +192,8 @@ _FarmaSystem - Notificação Automática_'''
 
 📍 *Filial:* {{branch_name}}
 📊 *Medicamentos:* {{medications_count}} próximos ao vencimento
-
+{% if expired_count %}🚫 *Vencidos:* {{expired_count}}
+{% endif %}
 *Ação necessária:* Verificar medicamentos que vencem em 30 dias
 
 _FarmaSystem - Notificação Automática_'''
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from apps.notifications.services import AlertCoalescer, NotificationManager
+
+
+class Command(BaseCommand):
+    help = 'Enviar alertas de estoque baixo pendentes cuja janela de silêncio expirou'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--quiet-window',
+            type=int,
+            default=None,
+            help='Janela de silêncio em segundos (padrão: NOTIFICATION_QUIET_WINDOW)'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Enviar um resumo por filial com os alertas vencidos.
+        Os alertas são apenas registrados durante as requisições: agendar no
+        cron (ex.: a cada 5 minutos). Falhas de envio ficam para a próxima execução.
+        """
+        coalescer = AlertCoalescer(quiet_window=options['quiet_window'])
+        manager = NotificationManager(batch=True)
+        
+        branches_count = manager.flush_pending_alerts(coalescer=coalescer)
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Alertas enviados para {branches_count} filial(is).')
+        )
@@ -0,0 +1,91 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from apps.notifications.models import NotificationLog, NotificationLogSummary
+
+
+class Command(BaseCommand):
+    help = 'Consolidar logs de notificação antigos em contagens mensais e removê-los em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'NOTIFICATION_LOG_RETENTION_DAYS', 180),
+            help='Manter logs dos últimos N dias (padrão: NOTIFICATION_LOG_RETENTION_DAYS)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=getattr(settings, 'NOTIFICATION_LOG_BATCH_SIZE', 500),
+            help='Registros removidos por transação'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas mostrar quantos registros seriam removidos'
+        )
+
+    def handle(self, *args, **options):
+        """Arquivar e remover logs anteriores ao período de retenção"""
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        old_logs = NotificationLog.objects.filter(sent_at__lt=cutoff)
+        
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING(f'⚠️ {old_logs.count()} logs anteriores a {cutoff:%d/%m/%Y} seriam arquivados.')
+            )
+            return
+        
+        removed = 0
+        while True:
+            # Cada lote é consolidado e removido na mesma transação, então uma
+            # execução interrompida pode ser repetida sem contar duas vezes
+            with transaction.atomic():
+                chunk_ids = list(
+                    old_logs.order_by('pk').values_list('pk', flat=True)[:options['chunk_size']]
+                )
+                if not chunk_ids:
+                    break
+                
+                chunk = NotificationLog.objects.filter(pk__in=chunk_ids)
+                self._archive(chunk)
+                removed += chunk.delete()[0]
+            
+            self.stdout.write(f'  {removed} logs arquivados...')
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'🎉 Retenção concluída! {removed} logs consolidados em resumos mensais.')
+        )
+
+    def _archive(self, chunk):
+        """Somar as contagens mensais de um lote em NotificationLogSummary"""
+        groups = chunk.annotate(
+            month=TruncMonth('sent_at')
+        ).values(
+            'month', 'branch_id', 'template__template_type', 'notification_type', 'status'
+        ).annotate(
+            count=Count('id')
+        ).order_by()
+        
+        for group in groups:
+            month = group['month']
+            if hasattr(month, 'date'):
+                month = month.date()
+            
+            summary, _ = NotificationLogSummary.objects.get_or_create(
+                month=month,
+                branch_id=group['branch_id'],
+                template_type=group['template__template_type'] or '',
+                notification_type=group['notification_type'],
+                status=group['status'],
+            )
+            NotificationLogSummary.objects.filter(pk=summary.pk).update(
+                total=F('total') + group['count']
+            )
@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from apps.branches.models import Branch
+from apps.notifications.models import NotificationLog
+from apps.notifications.services import NotificationManager, get_expiry_digest_data
+
+
+class Command(BaseCommand):
+    help = 'Enviar resumo de medicamentos vencidos e a vencer para cada filial (pode rodar de hora em hora)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'EXPIRY_DIGEST_DAYS', 30),
+            help='Dias à frente considerados próximos ao vencimento'
+        )
+        parser.add_argument(
+            '--interval-hours',
+            type=int,
+            default=getattr(settings, 'EXPIRY_DIGEST_INTERVAL_HOURS', 24),
+            help='Não reenviar para filiais que receberam resumo neste intervalo'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Ignorar o intervalo mínimo entre resumos'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas listar os resumos que seriam enviados'
+        )
+
+    def handle(self, *args, **options):
+        """Calcular e enfileirar o resumo de vencimentos de todas as filiais"""
+        today = timezone.localdate()
+        limit_date = today + timedelta(days=options['days'])
+        
+        branches = {
+            branch.pk: branch
+            for branch in Branch.objects.filter(is_active=True).filter(
+                # Campos opcionais: vazios ('') também não têm destinatário
+                (Q(email_notifications=True, email__isnull=False) & ~Q(email=''))
+                | (Q(whatsapp_notifications=True, whatsapp_number__isnull=False) & ~Q(whatsapp_number=''))
+            )
+        }
+        
+        if not options['force']:
+            # Última entrega bem-sucedida por filial, numa única query agrupada
+            since = timezone.now() - timedelta(hours=options['interval_hours'])
+            recent = NotificationLog.objects.filter(
+                template__template_type='expiry_alert',
+                status='sent',
+                branch_id__in=branches.keys(),
+            ).values('branch_id').annotate(
+                last_sent=Max('sent_at')
+            ).filter(last_sent__gte=since).values_list('branch_id', flat=True)
+            for branch_id in recent:
+                branches.pop(branch_id, None)
+        
+        digests = get_expiry_digest_data(today, limit_date, branch_ids=list(branches.keys()))
+        
+        manager = NotificationManager(batch=True)
+        sent_branches = 0
+        for branch_id, digest in digests.items():
+            branch = branches[branch_id]
+            self.stdout.write(
+                f"  {branch.name}: {len(digest['expiring'])} a vencer, {len(digest['expired'])} vencidos"
+            )
+            if options['dry_run']:
+                continue
+            
+            manager.send_expiry_alert(branch, digest['expiring'], digest['expired'])
+            sent_branches += 1
+        
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'⚠️ {len(digests)} resumos seriam enviados.'))
+            return
+        
+        manager.flush()
+        self.stdout.write(
+            self.style.SUCCESS(f'🎉 Resumos de vencimento enfileirados para {sent_branches} filial(is).')
+        )
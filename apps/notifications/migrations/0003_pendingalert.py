@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-19 10:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0002_branchmedicationbatch'),
+        ('inventory', '0001_initial'),
+        ('notifications', '0002_notificationtemplate_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificationtemplate',
+            name='template_type',
+            field=models.CharField(choices=[('low_stock', 'Estoque Baixo'), ('low_stock_summary', 'Resumo de Estoque Baixo'), ('expiry_alert', 'Vencimento Próximo'), ('expired_medication', 'Medicamento Vencido'), ('transfer_request', 'Solicitação de Transferência'), ('transfer_completed', 'Transferência Concluída'), ('daily_report', 'Relatório Diário')], max_length=20, verbose_name='Tipo de Template'),
+        ),
+        migrations.CreateModel(
+            name='PendingAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alert_type', models.CharField(choices=[('low_stock', 'Estoque Baixo'), ('low_stock_summary', 'Resumo de Estoque Baixo'), ('expiry_alert', 'Vencimento Próximo'), ('expired_medication', 'Medicamento Vencido'), ('transfer_request', 'Solicitação de Transferência'), ('transfer_completed', 'Transferência Concluída'), ('daily_report', 'Relatório Diário')], max_length=20, verbose_name='Tipo de Alerta')),
+                ('current_stock', models.PositiveIntegerField(default=0, verbose_name='Estoque Atual')),
+                ('is_pending', models.BooleanField(default=True, verbose_name='Aguardando Envio')),
+                ('suppressed_count', models.PositiveIntegerField(default=0, help_text='Alertas repetidos dentro da janela de silêncio desde o último envio', verbose_name='Repetições Suprimidas')),
+                ('first_seen_at', models.DateTimeField(auto_now_add=True, verbose_name='Primeira Ocorrência')),
+                ('last_seen_at', models.DateTimeField(auto_now=True, verbose_name='Última Ocorrência')),
+                ('last_sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Último Envio')),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_alerts', to='branches.branch', verbose_name='Filial')),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.medication', verbose_name='Medicamento')),
+            ],
+            options={
+                'verbose_name': 'Alerta Pendente',
+                'verbose_name_plural': 'Alertas Pendentes',
+                'ordering': ['branch', 'medication__name'],
+                'unique_together': {('branch', 'medication', 'alert_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2 on 2026-10-19 03:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('branches', '0002_branchmedicationbatch'),
+        ('notifications', '0003_pendingalert'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationLogSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Mês')),
+                ('template_type', models.CharField(blank=True, default='', max_length=20, verbose_name='Tipo de Template')),
+                ('notification_type', models.CharField(choices=[('email', 'E-mail'), ('whatsapp', 'WhatsApp'), ('sms', 'SMS')], max_length=10, verbose_name='Tipo de Notificação')),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('sent', 'Enviado'), ('failed', 'Falhou'), ('delivered', 'Entregue')], max_length=10, verbose_name='Status')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Total')),
+            ],
+            options={
+                'verbose_name': 'Resumo Mensal de Notificações',
+                'verbose_name_plural': 'Resumos Mensais de Notificações',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='notificationlog',
+            name='template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='notifications.notificationtemplate', verbose_name='Template Usado'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationlog',
+            index=models.Index(fields=['branch', '-sent_at'], name='notiflog_branch_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationlog',
+            index=models.Index(fields=['status', '-sent_at'], name='notiflog_status_sent_idx'),
+        ),
+        migrations.AddField(
+            model_name='notificationlogsummary',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='branches.branch', verbose_name='Filial'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='notificationlogsummary',
+            unique_together={('month', 'branch', 'template_type', 'notification_type', 'status')},
+        ),
+    ]
@@ -1,5 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.template import Template, Context
+
+
+# Cache em processo de templates compilados: {(pk, updated_at, campo): Template}
+_compiled_templates = {}
 
 
 class NotificationTemplate(models.Model):
@@ -7,6 +14,7 @@ class NotificationTemplate(models.Model):
     
     TEMPLATE_TYPES = [
         ('low_stock', 'Estoque Baixo'),
+        ('low_stock_summary', 'Resumo de Estoque Baixo'),
         ('expiry_alert', 'Vencimento Próximo'),
         ('expired_medication', 'Medicamento Vencido'),
         ('transfer_request', 'Solicitação de Transferência'),
@@ -52,12 +60,34 @@ class NotificationTemplate(models.Model):
         verbose_name='Criado em'
     )
     
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Atualizado em'
+    )
+    
     class Meta:
         verbose_name = 'Template de Notificação'
         verbose_name_plural = 'Templates de Notificação'
     
     def __str__(self):
         return f"{self.name} ({self.get_template_type_display()})"
+    
+    def get_compiled(self, field):
+        """Template Django compilado de um campo (subject, email_body, whatsapp_message)"""
+        if self.pk is None:
+            return Template(getattr(self, field) or '')
+        
+        # updated_at na chave garante que versões antigas nunca sejam reutilizadas
+        key = (self.pk, self.updated_at, field)
+        compiled = _compiled_templates.get(key)
+        if compiled is None:
+            compiled = Template(getattr(self, field) or '')
+            _compiled_templates[key] = compiled
+        return compiled
+    
+    def render(self, field, context_data):
+        """Renderizar um campo do template com dados dinâmicos"""
+        return self.get_compiled(field).render(Context(context_data))
 
 
 class NotificationLog(models.Model):
@@ -78,8 +108,10 @@ class NotificationLog(models.Model):
     
     template = models.ForeignKey(
         NotificationTemplate,
-        on_delete=models.CASCADE,
-        verbose_name='Template Usado'
+        on_delete=models.SET_NULL,
+        verbose_name='Template Usado',
+        null=True,
+        blank=True
     )
     
     branch = models.ForeignKey(
@@ -146,6 +178,132 @@ class NotificationLog(models.Model):
         verbose_name = 'Log de Notificação'
         verbose_name_plural = 'Logs de Notificações'
         ordering = ['-sent_at']
+        indexes = [
+            models.Index(fields=['branch', '-sent_at'], name='notiflog_branch_sent_idx'),
+            models.Index(fields=['status', '-sent_at'], name='notiflog_status_sent_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.template.name} - {self.get_notification_type_display()}"
+        template_name = self.template.name if self.template else 'Sem template'
+        return f"{template_name} - {self.get_notification_type_display()}"
+
+
+class NotificationLogSummary(models.Model):
+    """Contagens mensais de logs de notificação já removidos pela retenção"""
+    
+    month = models.DateField(
+        verbose_name='Mês'
+    )
+    
+    branch = models.ForeignKey(
+        'branches.Branch',
+        on_delete=models.CASCADE,
+        verbose_name='Filial',
+        null=True,
+        blank=True
+    )
+    
+    template_type = models.CharField(
+        max_length=20,
+        blank=True,
+        default='',
+        verbose_name='Tipo de Template'
+    )
+    
+    notification_type = models.CharField(
+        max_length=10,
+        choices=NotificationLog.NOTIFICATION_TYPES,
+        verbose_name='Tipo de Notificação'
+    )
+    
+    status = models.CharField(
+        max_length=10,
+        choices=NotificationLog.STATUS_CHOICES,
+        verbose_name='Status'
+    )
+    
+    total = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Total'
+    )
+    
+    class Meta:
+        verbose_name = 'Resumo Mensal de Notificações'
+        verbose_name_plural = 'Resumos Mensais de Notificações'
+        unique_together = ['month', 'branch', 'template_type', 'notification_type', 'status']
+        ordering = ['-month']
+    
+    def __str__(self):
+        return f"{self.month.strftime('%m/%Y')} - {self.get_notification_type_display()} {self.get_status_display()}: {self.total}"
+
+
+class PendingAlert(models.Model):
+    """Alerta aguardando envio consolidado (debounce por filial, medicamento e tipo)"""
+    
+    branch = models.ForeignKey(
+        'branches.Branch',
+        on_delete=models.CASCADE,
+        verbose_name='Filial',
+        related_name='pending_alerts'
+    )
+    
+    medication = models.ForeignKey(
+        'inventory.Medication',
+        on_delete=models.CASCADE,
+        verbose_name='Medicamento'
+    )
+    
+    alert_type = models.CharField(
+        max_length=20,
+        choices=NotificationTemplate.TEMPLATE_TYPES,
+        verbose_name='Tipo de Alerta'
+    )
+    
+    current_stock = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Estoque Atual'
+    )
+    
+    is_pending = models.BooleanField(
+        default=True,
+        verbose_name='Aguardando Envio'
+    )
+    
+    suppressed_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Repetições Suprimidas',
+        help_text='Alertas repetidos dentro da janela de silêncio desde o último envio'
+    )
+    
+    first_seen_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Primeira Ocorrência'
+    )
+    
+    last_seen_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Última Ocorrência'
+    )
+    
+    last_sent_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Último Envio'
+    )
+    
+    class Meta:
+        verbose_name = 'Alerta Pendente'
+        verbose_name_plural = 'Alertas Pendentes'
+        unique_together = ['branch', 'medication', 'alert_type']
+        ordering = ['branch', 'medication__name']
+    
+    def __str__(self):
+        return f"{self.medication.name} - {self.branch.name} ({self.get_alert_type_display()})"
+
+
+@receiver(post_save, sender=NotificationTemplate)
+@receiver(post_delete, sender=NotificationTemplate)
+def invalidate_compiled_templates(sender, instance, **kwargs):
+    """Descartar do cache as versões compiladas do template alterado"""
+    for key in [key for key in _compiled_templates if key[0] == instance.pk]:
+        _compiled_templates.pop(key, None)
@@ -2,37 +2,97 @@ import smtplib
 import requests
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from datetime import timedelta
 from django.conf import settings
-from django.core.mail import send_mail
-from django.template import Template, Context
-from .models import NotificationTemplate, NotificationLog
+from django.core.mail import send_mail, get_connection, EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import F, Q, Max
+from django.utils import timezone
+from .models import NotificationTemplate, NotificationLog, PendingAlert
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _get_active_template(cache, template_type):
+    """Buscar template ativo, memorizando o resultado no dicionário do serviço"""
+    template = cache.get(template_type)
+    if template is None:
+        template = NotificationTemplate.objects.get(
+            template_type=template_type,
+            is_active=True
+        )
+        cache[template_type] = template
+    return template
+
+
+class NotificationLogBuffer:
+    """
+    Acumula registros de NotificationLog e os grava com bulk_create.
+    
+    Com batch_size=1 cada registro é gravado imediatamente (comportamento
+    dos serviços usados isoladamente). Usado como context manager, grava o
+    que estiver acumulado ao sair do bloco, inclusive quando há exceção.
+    """
+    
+    def __init__(self, batch_size=None):
+        if batch_size is None:
+            batch_size = getattr(settings, 'NOTIFICATION_LOG_BATCH_SIZE', 500)
+        self.batch_size = batch_size
+        self.entries = []
+    
+    def add(self, **fields):
+        """Adicionar um registro de log"""
+        self.extend([NotificationLog(**fields)])
+    
+    def extend(self, logs):
+        """Adicionar vários registros de log já instanciados"""
+        self.entries.extend(logs)
+        if len(self.entries) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Gravar os registros acumulados num único INSERT por lote"""
+        if not self.entries:
+            return 0
+        
+        entries, self.entries = self.entries, []
+        NotificationLog.objects.bulk_create(entries, batch_size=self.batch_size)
+        return len(entries)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        return False
+
+
 class EmailNotificationService:
     """Serviço para envio de notificações por email"""
     
-    def __init__(self):
+    def __init__(self, log_buffer=None):
         self.smtp_server = getattr(settings, 'EMAIL_HOST', 'smtp.gmail.com')
         self.smtp_port = getattr(settings, 'EMAIL_PORT', 587)
         self.email_user = getattr(settings, 'EMAIL_HOST_USER', '')
         self.email_password = getattr(settings, 'EMAIL_HOST_PASSWORD', '')
         self.use_tls = getattr(settings, 'EMAIL_USE_TLS', True)
+        # Mensagens aguardando envio em lote (ver queue_notification/flush)
+        self.pending = []
+        # Templates já buscados por este serviço, por template_type
+        self._templates = {}
+        self.log_buffer = log_buffer or NotificationLogBuffer(batch_size=1)
     
     def send_notification(self, template_type, recipient_email, context_data, branch=None):
         """Enviar notificação por email"""
+        template = None
         try:
             # Buscar template
-            template = NotificationTemplate.objects.get(
-                template_type=template_type,
-                is_active=True
-            )
+            template = _get_active_template(self._templates, template_type)
             
             # Renderizar template
-            subject = self._render_template(template.subject, context_data)
-            body = self._render_template(template.email_body, context_data)
+            subject = template.render('subject', context_data)
+            body = template.render('email_body', context_data)
             
             # Enviar email
             success = send_mail(
@@ -45,7 +105,7 @@ class EmailNotificationService:
             )
             
             # Registrar log
-            log = NotificationLog.objects.create(
+            self.log_buffer.add(
                 template=template,
                 branch=branch,
                 recipient_email=recipient_email,
@@ -56,16 +116,16 @@ class EmailNotificationService:
             )
             
             logger.info(f"Email enviado para {recipient_email}: {subject}")
-            return True
+            return bool(success)
             
         except NotificationTemplate.DoesNotExist:
             logger.error(f"Template não encontrado: {template_type}")
             return False
         except Exception as e:
             logger.error(f"Erro ao enviar email: {str(e)}")
-            # Registrar erro no log
-            NotificationLog.objects.create(
-                template_id=1,  # Template padrão
+            # Registrar erro no log (template pode não ter sido carregado)
+            self.log_buffer.add(
+                template=template,
                 branch=branch,
                 recipient_email=recipient_email,
                 notification_type='email',
@@ -76,43 +136,149 @@ class EmailNotificationService:
             )
             return False
     
-    def _render_template(self, template_string, context_data):
-        """Renderizar template com dados dinâmicos"""
-        template = Template(template_string)
-        context = Context(context_data)
-        return template.render(context)
+    def queue_notification(self, template_type, recipient_email, context_data, branch=None):
+        """
+        Renderizar e enfileirar notificação para envio em lote via flush().
+        Retorna a mensagem enfileirada; flush() preenche o 'status' dela
+        ('sent' ou 'failed').
+        """
+        try:
+            template = _get_active_template(self._templates, template_type)
+        except NotificationTemplate.DoesNotExist:
+            logger.error(f"Template não encontrado: {template_type}")
+            return None
+        
+        item = {
+            'template': template,
+            'branch': branch,
+            'recipient_email': recipient_email,
+            'subject': template.render('subject', context_data),
+            'body': template.render('email_body', context_data),
+            'status': 'queued',
+        }
+        self.pending.append(item)
+        return item
+    
+    def flush(self):
+        """
+        Enviar notificações pendentes agrupadas por destinatário.
+        
+        Cada destinatário recebe um único e-mail (resumo quando há mais de uma
+        mensagem), todos enviados pela mesma conexão SMTP. Os resultados vão
+        para o log_buffer e são gravados com bulk_create.
+        """
+        if not self.pending:
+            return 0
+        
+        pending, self.pending = self.pending, []
+        
+        # Agrupar por destinatário preservando a ordem de chegada
+        digests = {}
+        for item in pending:
+            digests.setdefault(item['recipient_email'], []).append(item)
+        
+        logs = []
+        sent_count = 0
+        connection = get_connection(fail_silently=False)
+        
+        try:
+            connection.open()
+        except Exception as e:
+            logger.error(f"Erro ao abrir conexão SMTP: {str(e)}")
+            for items in digests.values():
+                logs.extend(self._build_logs(items, 'failed', str(e)))
+            self.log_buffer.extend(logs)
+            return 0
+        
+        try:
+            for recipient_email, items in digests.items():
+                subject, body = self._build_digest(items)
+                email = EmailMultiAlternatives(
+                    subject=subject,
+                    body='',  # Texto plano vazio
+                    from_email=self.email_user,
+                    to=[recipient_email],
+                    connection=connection
+                )
+                email.attach_alternative(body, 'text/html')
+                
+                try:
+                    success = connection.send_messages([email])
+                    status = 'sent' if success else 'failed'
+                    logs.extend(self._build_logs(items, status))
+                    if success:
+                        sent_count += 1
+                        logger.info(f"Email enviado para {recipient_email}: {subject}")
+                except Exception as e:
+                    logger.error(f"Erro ao enviar email para {recipient_email}: {str(e)}")
+                    logs.extend(self._build_logs(items, 'failed', str(e)))
+        finally:
+            connection.close()
+        
+        self.log_buffer.extend(logs)
+        return sent_count
+    
+    def _build_digest(self, items):
+        """Montar assunto e corpo de um resumo com as mensagens de um destinatário"""
+        if len(items) == 1:
+            return items[0]['subject'], items[0]['body']
+        
+        subject = f"FarmaSystem - Resumo de {len(items)} notificações"
+        sections = ''.join(
+            f"<h2>{item['subject']}</h2>{item['body']}" for item in items
+        )
+        body = f"<html><body>{sections}</body></html>"
+        return subject, body
+    
+    def _build_logs(self, items, status, error_message=None):
+        """Registrar o status nas mensagens e criar (sem salvar) os logs de um resumo"""
+        for item in items:
+            item['status'] = status
+        return [
+            NotificationLog(
+                template=item['template'],
+                branch=item['branch'],
+                recipient_email=item['recipient_email'],
+                notification_type='email',
+                status=status,
+                subject=item['subject'],
+                message=item['body'],
+                error_message=error_message
+            )
+            for item in items
+        ]
 
 
 class WhatsAppNotificationService:
     """Serviço para envio de notificações por WhatsApp"""
     
-    def __init__(self):
+    def __init__(self, log_buffer=None):
         # Configurações para API do WhatsApp (ex: Twilio, WhatsApp Business API)
         self.api_url = getattr(settings, 'WHATSAPP_API_URL', '')
         self.api_token = getattr(settings, 'WHATSAPP_API_TOKEN', '')
         self.from_number = getattr(settings, 'WHATSAPP_FROM_NUMBER', '')
+        # Templates já buscados por este serviço, por template_type
+        self._templates = {}
+        self.log_buffer = log_buffer or NotificationLogBuffer(batch_size=1)
     
     def send_notification(self, template_type, recipient_phone, context_data, branch=None):
         """Enviar notificação por WhatsApp"""
         try:
             # Buscar template
-            template = NotificationTemplate.objects.get(
-                template_type=template_type,
-                is_active=True
-            )
+            template = _get_active_template(self._templates, template_type)
             
             if not template.whatsapp_message:
                 logger.warning(f"Template {template_type} não possui mensagem WhatsApp")
                 return False
             
             # Renderizar mensagem
-            message = self._render_template(template.whatsapp_message, context_data)
+            message = template.render('whatsapp_message', context_data)
             
             # Enviar via API (exemplo usando Twilio)
             success = self._send_whatsapp_message(recipient_phone, message)
             
             # Registrar log
-            NotificationLog.objects.create(
+            self.log_buffer.add(
                 template=template,
                 branch=branch,
                 recipient_phone=recipient_phone,
@@ -164,22 +330,170 @@ class WhatsAppNotificationService:
             logger.error(f"Erro na API WhatsApp: {str(e)}")
             return False
     
-    def _render_template(self, template_string, context_data):
-        """Renderizar template com dados dinâmicos"""
-        template = Template(template_string)
-        context = Context(context_data)
-        return template.render(context)
+
+def get_expiry_digest_data(today, limit_date, branch_ids=None):
+    """
+    Listas de medicamentos vencidos e a vencer por filial, numa única query.
+    
+    Cruza o estoque de cada filial (BranchStock) com os lotes ativos do
+    medicamento (Stock) agrupando por filial, medicamento e validade.
+    Retorna {branch_id: {'expired': [...], 'expiring': [...]}}.
+    """
+    from apps.branches.models import BranchStock
+    
+    rows = BranchStock.objects.filter(
+        quantity__gt=0,
+        branch__is_active=True,
+        medication__is_active=True,
+        medication__stock__is_active=True,
+        medication__stock__quantity__gt=0,
+        medication__stock__expiry_date__lte=limit_date,
+    )
+    if branch_ids is not None:
+        rows = rows.filter(branch_id__in=branch_ids)
+    
+    rows = rows.values(
+        'branch_id',
+        'medication__name',
+        expiry_date=F('medication__stock__expiry_date'),
+    ).annotate(
+        branch_quantity=Max('quantity')
+    ).order_by('branch_id', 'expiry_date', 'medication__name')
+    
+    digests = {}
+    for row in rows:
+        digest = digests.setdefault(row['branch_id'], {'expired': [], 'expiring': []})
+        days = (row['expiry_date'] - today).days
+        item = {
+            'name': row['medication__name'],
+            'expiry_date': row['expiry_date'],
+            'quantity': row['branch_quantity'],
+        }
+        if days < 0:
+            item['days_expired'] = -days
+            digest['expired'].append(item)
+        else:
+            item['days_to_expire'] = days
+            digest['expiring'].append(item)
+    
+    return digests
+
+
+class AlertCoalescer:
+    """
+    Debounce de alertas por (filial, medicamento, tipo).
+    
+    Cada ocorrência é registrada em PendingAlert. Repetições dentro da janela
+    de silêncio (NOTIFICATION_QUIET_WINDOW, em segundos) são apenas contadas;
+    os alertas vencidos são enviados numa única mensagem por filial.
+    """
+    
+    def __init__(self, quiet_window=None):
+        if quiet_window is None:
+            quiet_window = getattr(settings, 'NOTIFICATION_QUIET_WINDOW', 3600)
+        self.quiet_window = timedelta(seconds=quiet_window)
+    
+    def register(self, branch, medication, alert_type, current_stock):
+        """Registrar ocorrência de alerta; retorna True se foi suprimida"""
+        now = timezone.now()
+        
+        with transaction.atomic():
+            alert, created = PendingAlert.objects.select_for_update().get_or_create(
+                branch=branch,
+                medication=medication,
+                alert_type=alert_type,
+                defaults={'current_stock': current_stock}
+            )
+            if created:
+                return False
+            
+            # Repetição: já aguardando envio ou enviado dentro da janela
+            suppressed = alert.is_pending or (
+                alert.last_sent_at is not None
+                and alert.last_sent_at > now - self.quiet_window
+            )
+            
+            alert.current_stock = current_stock
+            alert.is_pending = True
+            update_fields = ['current_stock', 'is_pending', 'last_seen_at']
+            if suppressed:
+                alert.suppressed_count = F('suppressed_count') + 1
+                update_fields.append('suppressed_count')
+            alert.save(update_fields=update_fields)
+        
+        if suppressed:
+            logger.info(
+                f"Alerta {alert_type} suprimido: {medication.name} - {branch.name}"
+            )
+        return suppressed
+    
+    def discard(self, branch, medication, alert_type):
+        """Cancelar alerta pendente (ex.: estoque reposto antes do envio)"""
+        return PendingAlert.objects.filter(
+            branch=branch,
+            medication=medication,
+            alert_type=alert_type,
+            is_pending=True
+        ).update(is_pending=False, suppressed_count=0)
+    
+    def get_due(self, branch=None):
+        """Alertas pendentes cuja janela de silêncio já expirou"""
+        cutoff = timezone.now() - self.quiet_window
+        due = PendingAlert.objects.filter(is_pending=True).filter(
+            Q(last_sent_at__isnull=True) | Q(last_sent_at__lte=cutoff)
+        ).select_related('branch', 'medication', 'medication__supplier')
+        if branch is not None:
+            due = due.filter(branch=branch)
+        return due
+    
+    def mark_sent(self, alerts):
+        """Marcar alertas como enviados e zerar as repetições contadas"""
+        return PendingAlert.objects.filter(
+            pk__in=[alert.pk for alert in alerts]
+        ).update(is_pending=False, suppressed_count=0, last_sent_at=timezone.now())
 
 
 class NotificationManager:
     """Gerenciador principal de notificações"""
     
-    def __init__(self):
-        self.email_service = EmailNotificationService()
-        self.whatsapp_service = WhatsAppNotificationService()
+    def __init__(self, batch=False):
+        # Com batch=True os e-mails são enfileirados e enviados em flush(),
+        # e os logs de todos os canais são gravados num único bulk_create
+        self.batch = batch
+        self.log_buffer = NotificationLogBuffer() if batch else NotificationLogBuffer(batch_size=1)
+        self.email_service = EmailNotificationService(log_buffer=self.log_buffer)
+        self.whatsapp_service = WhatsAppNotificationService(log_buffer=self.log_buffer)
+    
+    def _send_email(self, template_type, recipient_email, context, branch):
+        """
+        Enviar ou enfileirar e-mail conforme o modo do gerenciador.
+        Retorna a entrega ({'status': ...}); enfileirada, o status só é
+        definido em flush().
+        """
+        if self.batch:
+            return self.email_service.queue_notification(
+                template_type, recipient_email, context, branch
+            ) or {'status': 'failed'}
+        sent = self.email_service.send_notification(
+            template_type, recipient_email, context, branch
+        )
+        return {'status': 'sent' if sent else 'failed'}
+    
+    def _send_whatsapp(self, template_type, recipient_phone, context, branch):
+        """Enviar WhatsApp; retorna a entrega ({'status': ...})"""
+        sent = self.whatsapp_service.send_notification(
+            template_type, recipient_phone, context, branch
+        )
+        return {'status': 'sent' if sent else 'failed'}
+    
+    def flush(self):
+        """Enviar e-mails enfileirados no modo batch e gravar os logs pendentes"""
+        sent_count = self.email_service.flush()
+        self.log_buffer.flush()
+        return sent_count
     
     def send_low_stock_alert(self, branch, medication, current_stock):
-        """Enviar alerta de estoque baixo"""
+        """Enviar alerta de estoque baixo; retorna as entregas por canal"""
         context = {
             'branch_name': branch.name,
             'medication_name': medication.name,
@@ -188,34 +502,131 @@ class NotificationManager:
             'supplier': medication.supplier.name
         }
         
+        deliveries = []
+        
         # Enviar por email se configurado
         if branch.email_notifications and branch.email:
-            self.email_service.send_notification(
+            deliveries.append(self._send_email(
                 'low_stock',
                 branch.email,
                 context,
                 branch
-            )
+            ))
         
         # Enviar por WhatsApp se configurado
         if branch.whatsapp_notifications and branch.whatsapp_number:
-            self.whatsapp_service.send_notification(
+            deliveries.append(self._send_whatsapp(
                 'low_stock',
                 branch.whatsapp_number,
                 context,
                 branch
-            )
+            ))
+        
+        return deliveries
+    
+    def queue_low_stock_alert(self, branch, medication, current_stock):
+        """
+        Registrar alerta de estoque baixo com debounce; retorna True se foi
+        suprimido. O envio fica com o comando flush_pending_alerts (cron),
+        fora da requisição.
+        """
+        return AlertCoalescer().register(branch, medication, 'low_stock', current_stock)
+    
+    def discard_low_stock_alert(self, branch, medication):
+        """Cancelar alerta de estoque baixo pendente"""
+        return AlertCoalescer().discard(branch, medication, 'low_stock')
+    
+    def flush_pending_alerts(self, branch=None, coalescer=None):
+        """
+        Enviar alertas de estoque baixo vencidos, uma mensagem por filial.
+        
+        Só são marcados como enviados os alertas de filiais em que algum canal
+        entregou a mensagem (ou sem canal configurado); os demais continuam
+        pendentes para a próxima execução. Retorna o número de filiais atendidas.
+        """
+        coalescer = coalescer or AlertCoalescer()
+        
+        alerts_by_branch = {}
+        for alert in coalescer.get_due(branch).filter(alert_type='low_stock'):
+            alerts_by_branch.setdefault(alert.branch, []).append(alert)
+        
+        sent_by_branch = []
+        # Se uma filial falhar no meio, os logs das entregas já feitas são gravados
+        with self.log_buffer:
+            for alert_branch, alerts in alerts_by_branch.items():
+                if len(alerts) == 1:
+                    alert = alerts[0]
+                    deliveries = self.send_low_stock_alert(alert_branch, alert.medication, alert.current_stock)
+                else:
+                    deliveries = self.send_low_stock_summary(alert_branch, alerts)
+                sent_by_branch.append((alert_branch, alerts, deliveries))
+            
+            # No modo batch os e-mails saem (e recebem o status) aqui
+            self.flush()
+        
+        delivered = []
+        for alert_branch, alerts, deliveries in sent_by_branch:
+            if not deliveries or any(delivery['status'] == 'sent' for delivery in deliveries):
+                delivered.append(alert_branch)
+                coalescer.mark_sent(alerts)
+            else:
+                logger.warning(
+                    f"Falha no envio de {len(alerts)} alerta(s) de estoque baixo para {alert_branch.name}; "
+                    f"mantidos pendentes para nova tentativa"
+                )
+        
+        return len(delivered)
+    
+    def send_low_stock_summary(self, branch, alerts):
+        """Enviar resumo consolidado de alertas de estoque baixo de uma filial; retorna as entregas"""
+        context = {
+            'branch_name': branch.name,
+            'medications_count': len(alerts),
+            'suppressed_total': sum(alert.suppressed_count for alert in alerts),
+            'medications': [
+                {
+                    'name': alert.medication.name,
+                    'current_stock': alert.current_stock,
+                    'minimum_stock': alert.medication.minimum_stock,
+                    'supplier': alert.medication.supplier.name,
+                    'suppressed_count': alert.suppressed_count,
+                }
+                for alert in alerts
+            ]
+        }
+        
+        deliveries = []
+        if branch.email_notifications and branch.email:
+            deliveries.append(self._send_email(
+                'low_stock_summary',
+                branch.email,
+                context,
+                branch
+            ))
+        
+        if branch.whatsapp_notifications and branch.whatsapp_number:
+            deliveries.append(self._send_whatsapp(
+                'low_stock_summary',
+                branch.whatsapp_number,
+                context,
+                branch
+            ))
+        
+        return deliveries
     
-    def send_expiry_alert(self, branch, medications_expiring):
-        """Enviar alerta de medicamentos próximos ao vencimento"""
+    def send_expiry_alert(self, branch, medications_expiring, medications_expired=None):
+        """Enviar alerta de medicamentos próximos ao vencimento (e já vencidos)"""
+        medications_expired = medications_expired or []
         context = {
             'branch_name': branch.name,
             'medications_count': len(medications_expiring),
-            'medications': medications_expiring
+            'medications': medications_expiring,
+            'expired_count': len(medications_expired),
+            'expired_medications': medications_expired
         }
         
         if branch.email_notifications and branch.email:
-            self.email_service.send_notification(
+            self._send_email(
                 'expiry_alert',
                 branch.email,
                 context,
@@ -223,7 +634,7 @@ class NotificationManager:
             )
         
         if branch.whatsapp_notifications and branch.whatsapp_number:
-            self.whatsapp_service.send_notification(
+            self._send_whatsapp(
                 'expiry_alert',
                 branch.whatsapp_number,
                 context,
@@ -243,7 +654,7 @@ class NotificationManager:
         
         # Notificar filial de destino
         if transfer.to_branch.email_notifications and transfer.to_branch.email:
-            self.email_service.send_notification(
+            self._send_email(
                 'transfer_request',
                 transfer.to_branch.email,
                 context,
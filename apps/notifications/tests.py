@@ -0,0 +1,408 @@
+import smtplib
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.template import Template
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.branches.models import Branch
+from apps.inventory.models import Category, Medication
+from apps.suppliers.models import Supplier
+
+from . import models as notification_models
+from .models import NotificationLog, NotificationLogSummary, NotificationTemplate, PendingAlert
+from .services import AlertCoalescer, EmailNotificationService, NotificationLogBuffer, NotificationManager
+
+
+class NotificationTestMixin:
+
+    def setUp(self):
+        NotificationTemplate.objects.create(
+            name='Estoque baixo',
+            template_type='low_stock',
+            subject='Estoque baixo: {{ medication_name }}',
+            email_body='<p>{{ medication_name }} com {{ current_stock }} unidades</p>',
+        )
+        NotificationTemplate.objects.create(
+            name='Resumo de estoque baixo',
+            template_type='low_stock_summary',
+            subject='{{ medications_count }} medicamentos com estoque baixo',
+            email_body='{% for med in medications %}<p>{{ med.name }} ({{ med.suppressed_count }})</p>{% endfor %}',
+        )
+        self.category = Category.objects.create(name='Analgésicos')
+        self.supplier = Supplier.objects.create(name='Distribuidora')
+        self.branch = Branch.objects.create(
+            name='Centro', code='CTR', address='-', phone='+5514999999999', email='centro@farmacia.test'
+        )
+
+    def medication(self, name):
+        return Medication.objects.create(
+            name=name, category=self.category, supplier=self.supplier, price=1, minimum_stock=10
+        )
+
+
+class CompiledTemplateCacheTests(NotificationTestMixin, TestCase):
+    """Templates de notificação compilados uma vez por versão"""
+
+    def test_batch_parses_each_template_once(self):
+        service = EmailNotificationService()
+        with mock.patch.object(notification_models, 'Template', wraps=Template) as compile_template:
+            for index in range(50):
+                service.queue_notification(
+                    'low_stock', 'gerente@farmacia.test', {'medication_name': f'Item {index}', 'current_stock': 2}
+                )
+
+        # Um Template por campo (subject, email_body), não por mensagem
+        self.assertEqual(compile_template.call_count, 2)
+        self.assertEqual(service.pending[-1]['subject'], 'Estoque baixo: Item 49')
+
+    def test_saving_template_discards_compiled_versions(self):
+        template = NotificationTemplate.objects.get(template_type='low_stock')
+        self.assertEqual(template.render('subject', {'medication_name': 'Dipirona'}), 'Estoque baixo: Dipirona')
+
+        template.subject = 'Reposição: {{ medication_name }}'
+        template.save()
+
+        self.assertFalse([key for key in notification_models._compiled_templates if key[0] == template.pk])
+        reloaded = NotificationTemplate.objects.get(pk=template.pk)
+        self.assertEqual(reloaded.render('subject', {'medication_name': 'Dipirona'}), 'Reposição: Dipirona')
+
+
+class EmailBatchTests(NotificationTestMixin, TestCase):
+    """Envio em lote: uma conexão SMTP e um resumo por destinatário"""
+
+    def test_queued_notifications_sent_as_digests_over_one_connection(self):
+        service = EmailNotificationService()
+        items = [
+            service.queue_notification(
+                'low_stock', recipient, {'medication_name': name, 'current_stock': 2}, self.branch
+            )
+            for recipient, name in [
+                ('gerente@farmacia.test', 'Dipirona'),
+                ('compras@farmacia.test', 'Paracetamol'),
+                ('gerente@farmacia.test', 'Ibuprofeno'),
+                ('gerente@farmacia.test', 'Amoxicilina'),
+            ]
+        ]
+        self.assertEqual(mail.outbox, [])
+
+        with mock.patch(
+            'apps.notifications.services.get_connection', wraps=get_connection
+        ) as connections, mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.open'
+        ) as opened:
+            self.assertEqual(service.flush(), 2)
+
+        self.assertEqual((connections.call_count, opened.call_count), (1, 1))
+        self.assertEqual(service.pending, [])
+        self.assertEqual([item['status'] for item in items], ['sent'] * 4)
+
+        digest, single = mail.outbox
+        self.assertEqual(digest.to, ['gerente@farmacia.test'])
+        self.assertEqual(digest.subject, 'FarmaSystem - Resumo de 3 notificações')
+        html = digest.alternatives[0][0]
+        for name in ('Dipirona', 'Ibuprofeno', 'Amoxicilina'):
+            self.assertIn(f'<h2>Estoque baixo: {name}</h2>', html)
+        self.assertEqual(single.to, ['compras@farmacia.test'])
+        self.assertEqual(single.subject, 'Estoque baixo: Paracetamol')
+        self.assertEqual(NotificationLog.objects.filter(status='sent').count(), 4)
+
+
+class AlertCoalescingTests(NotificationTestMixin, TestCase):
+    """Debounce de alertas de estoque baixo e envio pelo flush_pending_alerts"""
+
+    def test_repeated_alerts_are_counted_not_sent(self):
+        dipirona = self.medication('Dipirona')
+        manager = NotificationManager()
+
+        self.assertFalse(manager.queue_low_stock_alert(self.branch, dipirona, 5))
+        self.assertTrue(manager.queue_low_stock_alert(self.branch, dipirona, 4))
+        self.assertTrue(manager.queue_low_stock_alert(self.branch, dipirona, 3))
+
+        # Registrar não envia nada durante a requisição
+        self.assertEqual(mail.outbox, [])
+        alert = PendingAlert.objects.get()
+        self.assertEqual((alert.current_stock, alert.suppressed_count, alert.is_pending), (3, 2, True))
+
+    def test_due_alerts_sent_as_one_summary_per_branch(self):
+        manager = NotificationManager(batch=True)
+        for name in ('Dipirona', 'Paracetamol', 'Ibuprofeno'):
+            manager.queue_low_stock_alert(self.branch, self.medication(name), 2)
+        manager.queue_low_stock_alert(self.branch, Medication.objects.get(name='Dipirona'), 1)
+
+        self.assertEqual(manager.flush_pending_alerts(), 1)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, '3 medicamentos com estoque baixo')
+        self.assertIn('Dipirona (1)', mail.outbox[0].alternatives[0][0])
+        self.assertFalse(PendingAlert.objects.filter(is_pending=True).exists())
+        self.assertFalse(PendingAlert.objects.filter(last_sent_at__isnull=True).exists())
+        self.assertFalse(PendingAlert.objects.exclude(suppressed_count=0).exists())
+
+        # Dentro da janela de silêncio nada é reenviado
+        self.assertEqual(NotificationManager(batch=True).flush_pending_alerts(), 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_delivery_keeps_alerts_pending(self):
+        manager = NotificationManager(batch=True)
+        manager.queue_low_stock_alert(self.branch, self.medication('Dipirona'), 2)
+
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages',
+            side_effect=smtplib.SMTPException('servidor indisponível')
+        ):
+            self.assertEqual(manager.flush_pending_alerts(), 0)
+
+        alert = PendingAlert.objects.get()
+        self.assertTrue(alert.is_pending)
+        self.assertIsNone(alert.last_sent_at)
+        self.assertEqual(NotificationLog.objects.get().status, 'failed')
+
+        # Próxima execução tenta de novo
+        self.assertEqual(NotificationManager(batch=True).flush_pending_alerts(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(PendingAlert.objects.get().is_pending)
+
+    def test_branch_without_channels_is_marked_sent(self):
+        self.branch.email_notifications = False
+        self.branch.save()
+        NotificationManager().queue_low_stock_alert(self.branch, self.medication('Dipirona'), 2)
+
+        self.assertEqual(NotificationManager().flush_pending_alerts(), 1)
+        self.assertFalse(PendingAlert.objects.get().is_pending)
+
+    def test_discard_cancels_pending_alert(self):
+        dipirona = self.medication('Dipirona')
+        manager = NotificationManager()
+        manager.queue_low_stock_alert(self.branch, dipirona, 2)
+        manager.discard_low_stock_alert(self.branch, dipirona)
+
+        self.assertEqual(AlertCoalescer().get_due().count(), 0)
+        self.assertEqual(manager.flush_pending_alerts(), 0)
+        self.assertEqual(mail.outbox, [])
+
+    def test_quiet_window_after_send(self):
+        dipirona = self.medication('Dipirona')
+        coalescer = AlertCoalescer(quiet_window=600)
+        coalescer.register(self.branch, dipirona, 'low_stock', 5)
+        coalescer.mark_sent(list(coalescer.get_due()))
+
+        # Nova ocorrência logo após o envio: contada e retida até a janela expirar
+        self.assertTrue(coalescer.register(self.branch, dipirona, 'low_stock', 4))
+        self.assertEqual(coalescer.get_due().count(), 0)
+
+        PendingAlert.objects.update(last_sent_at=timezone.now() - timedelta(seconds=601))
+        self.assertEqual(list(coalescer.get_due().values_list('current_stock', 'suppressed_count')), [(4, 1)])
+        # Primeira ocorrência de outro medicamento não é suprimida
+        self.assertFalse(coalescer.register(self.branch, self.medication('Paracetamol'), 'low_stock', 3))
+
+    def test_flush_pending_alerts_command(self):
+        manager = NotificationManager()
+        for name in ('Dipirona', 'Paracetamol'):
+            manager.queue_low_stock_alert(self.branch, self.medication(name), 2)
+        PendingAlert.objects.update(last_sent_at=timezone.now() - timedelta(seconds=120), is_pending=True)
+
+        out = StringIO()
+        call_command('flush_pending_alerts', '--quiet-window', '300', stdout=out)
+        self.assertIn('0 filial(is)', out.getvalue())
+        self.assertEqual(mail.outbox, [])
+
+        call_command('flush_pending_alerts', '--quiet-window', '60', stdout=out)
+        self.assertIn('1 filial(is)', out.getvalue())
+        self.assertEqual([message.subject for message in mail.outbox], ['2 medicamentos com estoque baixo'])
+        self.assertFalse(PendingAlert.objects.filter(is_pending=True).exists())
+
+
+class NotificationLogBufferTests(NotificationTestMixin, TestCase):
+    """Gravação em lote dos logs de notificação"""
+
+    def log(self, buffer, status='sent'):
+        buffer.add(
+            branch=self.branch, recipient_email='centro@farmacia.test',
+            notification_type='email', status=status, subject='Teste', message=''
+        )
+
+    def test_logs_written_in_batches(self):
+        buffer = NotificationLogBuffer(batch_size=3)
+        self.log(buffer)
+        self.log(buffer)
+        self.assertFalse(NotificationLog.objects.exists())
+
+        with self.assertNumQueries(1):
+            self.log(buffer)
+        self.assertEqual((NotificationLog.objects.count(), buffer.entries), (3, []))
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_pending_logs_flushed_on_exit_and_on_error(self):
+        with NotificationLogBuffer(batch_size=10) as buffer:
+            self.log(buffer)
+        self.assertEqual(NotificationLog.objects.count(), 1)
+
+        with self.assertRaises(RuntimeError):
+            with NotificationLogBuffer(batch_size=10) as buffer:
+                self.log(buffer, status='failed')
+                raise RuntimeError('falha no meio do lote')
+        self.assertEqual(NotificationLog.objects.filter(status='failed').count(), 1)
+
+    def test_send_failure_is_logged_with_its_template(self):
+        with mock.patch(
+            'apps.notifications.services.send_mail', side_effect=smtplib.SMTPException('servidor indisponível')
+        ):
+            sent = EmailNotificationService().send_notification(
+                'low_stock', 'centro@farmacia.test', {'medication_name': 'Dipirona'}, self.branch
+            )
+
+        self.assertFalse(sent)
+        log = NotificationLog.objects.get()
+        self.assertEqual((log.status, log.error_message), ('failed', 'servidor indisponível'))
+        self.assertEqual(log.template.template_type, 'low_stock')
+
+    def test_unfinished_alert_flush_keeps_logs_of_delivered_branches(self):
+        other = Branch.objects.create(
+            name='Bairro', code='BRR', address='-', phone='+5514999999996', email='bairro@farmacia.test'
+        )
+        manager = NotificationManager()
+        manager.queue_low_stock_alert(self.branch, self.medication('Dipirona'), 2)
+        manager.queue_low_stock_alert(other, self.medication('Paracetamol'), 2)
+        manager.log_buffer.batch_size = 10
+
+        # A primeira filial é atendida, a segunda falha antes do flush
+        original = NotificationManager.send_low_stock_alert
+        delivered = []
+        def send_then_fail(manager, branch, medication, current_stock):
+            if delivered:
+                raise RuntimeError('falha inesperada')
+            delivered.append(branch)
+            return original(manager, branch, medication, current_stock)
+
+        with mock.patch.object(NotificationManager, 'send_low_stock_alert', send_then_fail):
+            with self.assertRaises(RuntimeError):
+                manager.flush_pending_alerts()
+
+        self.assertEqual(NotificationLog.objects.get().branch, delivered[0])
+
+
+class PruneNotificationLogsTests(NotificationTestMixin, TestCase):
+    """Retenção: logs antigos viram contagens mensais e são removidos em lotes"""
+
+    def setUp(self):
+        super().setUp()
+        self.template = NotificationTemplate.objects.get(template_type='low_stock')
+        # Em ordem de pk: os logs de janeiro enviados ficam em lotes diferentes
+        for day, status in [(date(2024, 1, 10), 'sent'), (date(2024, 2, 5), 'sent'),
+                            (date(2024, 1, 20), 'sent'), (date(2024, 1, 25), 'failed')]:
+            self.log(status, timezone.make_aware(datetime(day.year, day.month, day.day, 12)))
+        self.recent = self.log('sent', timezone.now())
+
+    def log(self, status, sent_at):
+        log = NotificationLog.objects.create(
+            template=self.template, branch=self.branch, recipient_email='centro@farmacia.test',
+            notification_type='email', status=status, subject='Teste', message=''
+        )
+        NotificationLog.objects.filter(pk=log.pk).update(sent_at=sent_at)
+        return log
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('prune_notification_logs', '--days', '180', *args, stdout=out)
+        return out.getvalue()
+
+    def summary_totals(self):
+        return {
+            (summary.month, summary.status): summary.total
+            for summary in NotificationLogSummary.objects.filter(
+                branch=self.branch, template_type='low_stock', notification_type='email'
+            )
+        }
+
+    def test_dry_run_keeps_logs(self):
+        self.assertIn('4 logs', self.run_command('--dry-run'))
+        self.assertEqual(NotificationLog.objects.count(), 5)
+        self.assertFalse(NotificationLogSummary.objects.exists())
+
+    def test_old_logs_archived_in_chunks(self):
+        output = self.run_command('--chunk-size', '2')
+
+        self.assertIn('2 logs arquivados', output)
+        self.assertIn('4 logs consolidados', output)
+        self.assertEqual(list(NotificationLog.objects.all()), [self.recent])
+        self.assertEqual(self.summary_totals(), {
+            (date(2024, 1, 1), 'sent'): 2,
+            (date(2024, 1, 1), 'failed'): 1,
+            (date(2024, 2, 1), 'sent'): 1,
+        })
+
+    def test_existing_summaries_are_incremented(self):
+        self.run_command()
+        self.log('sent', timezone.make_aware(datetime(2024, 1, 28, 12)))
+        self.run_command()
+
+        self.assertEqual(self.summary_totals()[(date(2024, 1, 1), 'sent')], 3)
+        self.assertEqual(NotificationLogSummary.objects.count(), 3)
+
+
+class ExpiryDigestCommandTests(NotificationTestMixin, TestCase):
+    """Resumo de vencimentos: filiais sem destinatário e intervalo mínimo entre envios"""
+
+    def setUp(self):
+        super().setUp()
+        NotificationTemplate.objects.create(
+            name='Vencimento próximo',
+            template_type='expiry_alert',
+            subject='{{ medications_count }} a vencer em {{ branch_name }}',
+            email_body='{% for med in medications %}<p>{{ med.name }}</p>{% endfor %}',
+        )
+        self.sem_email = Branch.objects.create(
+            name='Sem email', code='SEM', address='-', phone='+5514999999998', email=''
+        )
+        self.sem_whatsapp = Branch.objects.create(
+            name='Sem WhatsApp', code='SWA', address='-', phone='+5514999999997', email=None,
+            whatsapp_notifications=True, whatsapp_number=''
+        )
+        digest_data = mock.patch(
+            'apps.notifications.management.commands.send_expiry_digests.get_expiry_digest_data',
+            side_effect=self.digest_data
+        )
+        self.get_expiry_digest_data = digest_data.start()
+        self.addCleanup(digest_data.stop)
+
+    def digest_data(self, today, limit_date, branch_ids=None):
+        item = {'name': 'Dipirona', 'expiry_date': today + timedelta(days=5), 'quantity': 3, 'days_to_expire': 5}
+        return {branch_id: {'expiring': [item], 'expired': []} for branch_id in branch_ids}
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('send_expiry_digests', *args, stdout=out)
+        return out.getvalue()
+
+    def test_branches_without_recipient_are_skipped(self):
+        self.run_command()
+
+        branch_ids = self.get_expiry_digest_data.call_args.kwargs['branch_ids']
+        self.assertEqual(branch_ids, [self.branch.pk])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['centro@farmacia.test'])
+        self.assertEqual(mail.outbox[0].subject, '1 a vencer em Centro')
+
+    def test_dry_run_sends_nothing(self):
+        output = self.run_command('--dry-run')
+
+        self.assertIn('Centro: 1 a vencer, 0 vencidos', output)
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(NotificationLog.objects.exists())
+
+    def test_interval_skips_recently_notified_branches(self):
+        self.run_command()
+        self.run_command()
+        self.assertEqual(len(mail.outbox), 1)
+
+        # Fora do intervalo (ou com --force) o resumo é reenviado
+        NotificationLog.objects.update(sent_at=timezone.now() - timedelta(hours=25))
+        self.run_command()
+        self.run_command('--force')
+        self.assertEqual(len(mail.outbox), 3)
@@ -4,8 +4,11 @@ from .models import Report
 
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
-    list_display = ['title', 'report_type', 'generated_by', 'created_at']
-    list_filter = ['report_type', 'created_at']
+    list_display = ['title', 'report_type', 'status', 'generated_by', 'created_at', 'finished_at', 'render_duration', 'page_count']
+    list_filter = ['report_type', 'status', 'created_at']
     search_fields = ['title', 'description']
     ordering = ['-created_at']
-    readonly_fields = ['created_at']
\ No newline at end of file
+    readonly_fields = [
+        'created_at', 'started_at', 'finished_at', 'error_message', 'cache_key', 'source',
+        'render_duration', 'peak_memory_kb', 'page_count'
+    ]
\ No newline at end of file
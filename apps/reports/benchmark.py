@@ -0,0 +1,347 @@
+"""
+Benchmark da geração de relatórios em escala.
+
+Cada tamanho de catálogo roda num banco de teste descartável (o mesmo usado
+pelo `manage.py test`), populado com dados sintéticos via bulk_create. Para
+cada tipo de relatório são medidas separadamente as fases:
+
+- data_collection: consultas e montagem do contexto (`build_context`);
+- html_render:     templates renderizados por chunk (entrada do WeasyPrint);
+- pdf:             layout e escrita do PDF por engine (WeasyPrint x ReportLab).
+
+Cada fase registra tempo, número de consultas e pico de memória (tracemalloc,
+numa segunda execução para não distorcer o tempo). O resultado é um dict
+serializável em JSON, comparável entre commits com `compare_results`.
+"""
+
+import json
+import logging
+import platform
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.branches.models import Branch, BranchStock, StockTransfer
+from apps.inventory.models import Category, Medication, Stock, StockMovement
+from apps.suppliers.models import Supplier
+
+from .pdf_generator import pdf_generator, get_available_engines, REPORT_TEMPLATES
+from .render_pool import current_peak_rss_kb
+
+logger = logging.getLogger('apps.reports.pdf')
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_BRANCHES = 3
+SEED_BATCH_SIZE = 5000
+# Variação relativa a partir da qual `compare_results` aponta regressão
+REGRESSION_THRESHOLD = 0.2
+
+TRANSFER_STATUSES = [status for status, label in StockTransfer.STATUS_CHOICES]
+MOVEMENT_TYPES = [movement_type for movement_type, label in StockMovement.MOVEMENT_TYPES]
+
+
+@contextmanager
+def benchmark_database(verbosity=0):
+    """
+    Banco de teste descartável; o banco configurado nunca é alterado.
+
+    As tabelas são criadas direto dos modelos (TEST['MIGRATE'] = False): o
+    histórico de migrações ainda traz colunas removidas dos modelos, como
+    Stock.batch_number NOT NULL, que impediriam popular o estoque.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_migrate = test_settings.get('MIGRATE', True)
+    test_settings['MIGRATE'] = False
+    try:
+        connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    finally:
+        test_settings['MIGRATE'] = old_migrate
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+
+
+def _bulk_create(model, objects):
+    """bulk_create em lotes a partir de um gerador"""
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= SEED_BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def seed_catalog(size, branches=DEFAULT_BRANCHES):
+    """
+    Catálogo sintético: `size` medicamentos com estoque em cada filial, um
+    lote com validade espalhada (vencidos e a vencer), uma movimentação por
+    medicamento e uma transferência para cada 10 medicamentos
+    """
+    user = User.objects.create_user('benchmark', password=None)
+    supplier = Supplier.objects.create(name='Fornecedor Benchmark')
+    categories = Category.objects.bulk_create(
+        Category(name=f'Categoria {index:02d}') for index in range(20)
+    )
+    branch_list = Branch.objects.bulk_create(
+        Branch(
+            name=f'Filial Benchmark {index:02d}',
+            code=f'BM{index:03d}',
+            address='Endereço sintético',
+            phone='+5514999999999'
+        )
+        for index in range(branches)
+    )
+
+    _bulk_create(Medication, (
+        Medication(
+            name=f'Medicamento {index:06d}',
+            category=categories[index % len(categories)],
+            supplier=supplier,
+            barcode=f'789{index:010d}',
+            price=Decimal('9.90'),
+            minimum_stock=10 + index % 50
+        )
+        for index in range(size)
+    ))
+    medication_ids = list(Medication.objects.order_by('pk').values_list('pk', flat=True))
+
+    _bulk_create(BranchStock, (
+        BranchStock(
+            branch=branch,
+            medication_id=medication_id,
+            quantity=(index * 7 + offset * 13) % 120
+        )
+        for index, medication_id in enumerate(medication_ids)
+        for offset, branch in enumerate(branch_list)
+    ))
+
+    today = timezone.now().date()
+    _bulk_create(Stock, (
+        Stock(
+            medication_id=medication_id,
+            quantity=1 + index % 200,
+            expiry_date=today + timedelta(days=index % 400 - 60),
+            purchase_price=Decimal('5.00')
+        )
+        for index, medication_id in enumerate(medication_ids)
+    ))
+
+    _bulk_create(StockMovement, (
+        StockMovement(
+            medication_id=medication_id,
+            movement_type=MOVEMENT_TYPES[index % len(MOVEMENT_TYPES)],
+            quantity=1 + index % 30,
+            user=user
+        )
+        for index, medication_id in enumerate(medication_ids)
+    ))
+
+    if len(branch_list) > 1:
+        _bulk_create(StockTransfer, (
+            StockTransfer(
+                from_branch=branch_list[index % len(branch_list)],
+                to_branch=branch_list[(index + 1) % len(branch_list)],
+                medication_id=medication_id,
+                quantity=1 + index % 20,
+                status=TRANSFER_STATUSES[index % len(TRANSFER_STATUSES)],
+                reason='Transferência sintética',
+                requested_by=user
+            )
+            for index, medication_id in enumerate(medication_ids[::10])
+        ))
+
+    return user
+
+
+def measure(func, track_memory=True):
+    """
+    Executar `func` medindo tempo e consultas; com `track_memory`, executa de
+    novo sob tracemalloc para obter o pico de memória alocada
+    """
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+
+    measurement = {
+        'seconds': round(elapsed, 4),
+        'queries': len(queries),
+        'peak_memory_kb': None,
+    }
+    if track_memory:
+        tracemalloc.start()
+        try:
+            func()
+            measurement['peak_memory_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+        finally:
+            tracemalloc.stop()
+    return result, measurement
+
+
+def _count_rows(report_type, context):
+    if report_type == 'stock':
+        return len(context['medicamentos'])
+    if report_type == 'movements':
+        return len(context['movimentacoes'])
+    return len(context['vencimentos']['expired']) + len(context['vencimentos']['near_expiry'])
+
+
+def _render_html(report_type, context):
+    """Templates de todos os chunks, como o WeasyPrint os recebe"""
+    return sum(
+        len(render_to_string(REPORT_TEMPLATES[report_type], chunk_context))
+        for chunk_context in pdf_generator._iter_row_chunks(context)
+    )
+
+
+def benchmark_report(report_type, user, engines, track_memory=True):
+    """Medir as fases de um tipo de relatório no banco atual"""
+    context, data_collection = measure(
+        lambda: pdf_generator.build_context(report_type, user, {}), track_memory
+    )
+    html_bytes, html_render = measure(lambda: _render_html(report_type, context), track_memory)
+    html_render['html_bytes'] = html_bytes
+
+    result = {
+        'report_type': report_type,
+        'rows': _count_rows(report_type, context),
+        'data_collection': data_collection,
+        'html_render': html_render,
+        'engines': {},
+    }
+
+    available = get_available_engines()
+    for engine in engines:
+        if engine not in available:
+            result['engines'][engine] = {'available': False}
+            continue
+        render_info = {}
+        parts, pdf_measurement = measure(
+            lambda: pdf_generator.render_pdf(report_type, context, render_info=render_info, engine=engine),
+            track_memory
+        )
+        pdf_measurement.update({
+            'available': True,
+            'pages': render_info.get('pages'),
+            'parts': len(parts),
+            'pdf_bytes': sum(len(part) for part in parts),
+        })
+        result['engines'][engine] = pdf_measurement
+
+    return result
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, report_types=None, engines=None, branches=DEFAULT_BRANCHES,
+                  track_memory=True, progress=None):
+    """
+    Rodar o benchmark para cada tamanho de catálogo; `progress(mensagem)`
+    recebe o andamento
+    """
+    report_types = list(report_types or REPORT_TEMPLATES)
+    engines = list(engines or ('weasyprint', 'reportlab'))
+    progress = progress or (lambda message: None)
+
+    results = {
+        'generated_at': timezone.now().isoformat(),
+        'commit': get_git_commit(),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'available_engines': get_available_engines(),
+            'pdf_chunk_size': pdf_generator.chunk_size,
+            'pdf_max_pages': pdf_generator.max_pages,
+            'track_memory': track_memory,
+        },
+        'runs': [],
+    }
+
+    for size in sizes:
+        with benchmark_database():
+            progress(f'Populando catálogo sintético com {size} medicamentos')
+            started = time.perf_counter()
+            user = seed_catalog(size, branches)
+            run = {
+                'size': size,
+                'branches': branches,
+                'seed_seconds': round(time.perf_counter() - started, 4),
+                'reports': [],
+            }
+            for report_type in report_types:
+                progress(f'Medindo relatório {report_type} ({size} medicamentos)')
+                run['reports'].append(benchmark_report(report_type, user, engines, track_memory))
+            run['process_peak_rss_kb'] = current_peak_rss_kb()
+        results['runs'].append(run)
+
+    return results
+
+
+def get_git_commit():
+    """Commit atual (para comparar resultados entre versões), se disponível"""
+    try:
+        output = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def write_results(results, path):
+    """Gravar o resultado em JSON, criando o diretório se necessário"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding='utf-8')
+    return path
+
+
+def iter_timings(results):
+    """(tamanho, relatório, fase, segundos) de cada medição"""
+    for run in results['runs']:
+        for report in run['reports']:
+            for phase in ('data_collection', 'html_render'):
+                yield run['size'], report['report_type'], phase, report[phase]['seconds']
+            for engine, measurement in report['engines'].items():
+                if measurement.get('available'):
+                    yield run['size'], report['report_type'], f'pdf:{engine}', measurement['seconds']
+
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """
+    Comparar dois resultados: lista de dicts com a variação relativa de cada
+    medição presente em ambos; 'regression' quando piora acima de `threshold`
+    """
+    baseline_timings = {key[:3]: key[3] for key in iter_timings(baseline)}
+    comparison = []
+    for size, report_type, phase, seconds in iter_timings(current):
+        previous = baseline_timings.get((size, report_type, phase))
+        if previous is None:
+            continue
+        change = (seconds - previous) / previous if previous else 0.0
+        comparison.append({
+            'size': size,
+            'report_type': report_type,
+            'phase': phase,
+            'baseline_seconds': previous,
+            'seconds': seconds,
+            'change': round(change, 4),
+            'regression': change > threshold,
+        })
+    return comparison
@@ -0,0 +1,85 @@
+"""
+Registro das engines de PDF com importação sob demanda.
+
+WeasyPrint carrega Pango/cairo ao ser importado; fazer isso no import do
+módulo de PDFs custava tempo em toda inicialização (workers, comandos do
+manage.py, testes), já que as URLs importam as views de relatórios. Aqui
+cada engine só é importada (e testada) no primeiro uso, uma vez por processo.
+
+    get_default_engine()     -> 'weasyprint', 'reportlab' ou None
+    get_available_engines()  -> engines utilizáveis, na ordem de preferência
+"""
+
+import importlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('apps.reports.pdf')
+
+_probe_lock = threading.Lock()
+
+
+class PDFEngine:
+    """Engine registrada: módulos importados na primeira verificação"""
+
+    def __init__(self, name: str, label: str, status: str, modules: tuple):
+        self.name = name
+        self.label = label
+        self.status = status
+        self.modules = modules
+        self.available = None
+        self.error = None
+
+    @property
+    def probed(self) -> bool:
+        return self.available is not None
+
+    def probe(self) -> bool:
+        """Importar os módulos da engine (apenas na primeira chamada)"""
+        if self.available is None:
+            with _probe_lock:
+                if self.available is None:
+                    try:
+                        for module in self.modules:
+                            importlib.import_module(module)
+                        self.available = True
+                        logger.info(f"Engine PDF {self.name} carregada")
+                    except Exception as e:
+                        # ImportError, ou OSError quando faltam as bibliotecas
+                        # nativas (GTK+/Pango no Windows, libpango no Linux)
+                        self.error = f"{type(e).__name__}: {str(e)[:100]}"
+                        self.available = False
+                        logger.warning(f"Engine PDF {self.name} indisponível ({self.error})")
+        return self.available
+
+
+# Engines na ordem de preferência
+ENGINES: Dict[str, PDFEngine] = {}
+
+
+def register_engine(name: str, label: str, status: str, modules: tuple) -> PDFEngine:
+    engine = PDFEngine(name, label, status, modules)
+    ENGINES[name] = engine
+    return engine
+
+
+register_engine('weasyprint', 'WeasyPrint (Preferido)', 'optimal', ('weasyprint', 'weasyprint.text.fonts'))
+register_engine('reportlab', 'ReportLab (Fallback)', 'functional', ('reportlab.pdfgen.canvas', 'reportlab.lib.pagesizes'))
+
+
+def get_engine(name: str) -> Optional[PDFEngine]:
+    return ENGINES.get(name)
+
+
+def get_available_engines() -> List[str]:
+    """Engines utilizáveis neste ambiente (a preferida primeiro)"""
+    return [name for name, engine in ENGINES.items() if engine.probe()]
+
+
+def get_default_engine() -> Optional[str]:
+    """Engine preferida disponível (None se nenhuma biblioteca PDF estiver instalada)"""
+    for name, engine in ENGINES.items():
+        if engine.probe():
+            return name
+    return None
@@ -0,0 +1,197 @@
+"""
+Exportação dos relatórios em formatos tabulares (CSV, XLSX e NDJSON).
+
+Usa os mesmos provedores de dados dos PDFs (`PDFGenerator.iter_*_rows`), que
+leem o banco em lotes; os writers geram a saída linha a linha, com memória
+constante independentemente do tamanho do relatório.
+"""
+
+import csv
+import importlib.util
+import json
+import logging
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+
+from django.utils import timezone
+
+from .movements import MovementsReport
+from .pdf_generator import pdf_generator
+
+# XLSX é opcional; o openpyxl só é importado ao exportar (as URLs carregam
+# este módulo em todo processo)
+XLSX_AVAILABLE = importlib.util.find_spec('openpyxl') is not None
+
+logger = logging.getLogger('apps.reports.pdf')
+
+# Colunas exportadas por tipo de relatório: (chave da linha, cabeçalho)
+EXPORT_COLUMNS = {
+    'stock': (
+        ('name', 'Medicamento'),
+        ('category', 'Categoria'),
+        ('total_quantity', 'Estoque Total'),
+        ('total_reserved', 'Reservado'),
+        ('available_quantity', 'Disponível'),
+        ('minimum_stock', 'Estoque Mínimo'),
+        ('is_low_stock', 'Estoque Baixo'),
+    ),
+    'movements': (
+        ('date', 'Data'),
+        ('type', 'Tipo'),
+        ('medication_name', 'Medicamento'),
+        ('quantity', 'Quantidade'),
+        ('from_location', 'Origem'),
+        ('to_location', 'Destino'),
+        ('user', 'Usuário'),
+        ('status', 'Status'),
+    ),
+    'expiration': (
+        ('situation', 'Situação'),
+        ('medication_name', 'Medicamento'),
+        ('category', 'Categoria'),
+        ('expiry_date', 'Data de Vencimento'),
+        ('total_quantity', 'Quantidade'),
+        ('days_expired', 'Dias Vencido'),
+        ('days_until_expiry', 'Dias Restantes'),
+    ),
+}
+
+
+class ExportError(Exception):
+    """Formato ou tipo de relatório não suportado"""
+    pass
+
+
+def iter_report_rows(report_type, parameters=None):
+    """Linhas do relatório direto dos provedores de dados (sem materializar)"""
+    if report_type == 'stock':
+        return pdf_generator.iter_stock_rows()
+    if report_type == 'movements':
+        movements_report = MovementsReport.from_parameters(parameters)
+        return movements_report.iter_rows(chunk_size=pdf_generator.chunk_size)
+    if report_type == 'expiration':
+        today, limit = pdf_generator.get_expiration_period()
+        return pdf_generator.iter_expiration_rows(today, limit)
+    raise ExportError(f"Tipo de relatório desconhecido: {report_type}")
+
+
+class ExportWriter(ABC):
+    """Writer base: converte linhas (dicts) em blocos de bytes"""
+
+    content_type = 'application/octet-stream'
+    extension = 'bin'
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    @abstractmethod
+    def stream(self, rows):
+        """Gerar os blocos de bytes do arquivo a partir das linhas"""
+
+    def _format_value(self, value):
+        """Datas com fuso local; demais valores inalterados"""
+        if isinstance(value, datetime):
+            return timezone.localtime(value).replace(tzinfo=None) if timezone.is_aware(value) else value
+        return value
+
+
+class _LineBuffer:
+    """Arquivo mínimo para o csv.writer: devolve a linha em vez de acumulá-la"""
+
+    def write(self, value):
+        return value
+
+
+class CSVExportWriter(ExportWriter):
+    """CSV separado por ';' com BOM UTF-8 (abre corretamente no Excel em pt-BR)"""
+
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(_LineBuffer(), delimiter=';')
+        yield '\ufeff'.encode('utf-8')
+        yield writer.writerow([label for key, label in self.columns]).encode('utf-8')
+        for row in rows:
+            values = [self._format_csv_value(row.get(key)) for key, label in self.columns]
+            yield writer.writerow(values).encode('utf-8')
+
+    def _format_csv_value(self, value):
+        value = self._format_value(value)
+        if value is None:
+            return ''
+        if isinstance(value, bool):
+            return 'Sim' if value else 'Não'
+        if isinstance(value, datetime):
+            return value.strftime('%d/%m/%Y %H:%M')
+        if isinstance(value, date):
+            return value.strftime('%d/%m/%Y')
+        return value
+
+
+class NDJSONExportWriter(ExportWriter):
+    """Um objeto JSON por linha, com as chaves originais dos provedores"""
+
+    content_type = 'application/x-ndjson'
+    extension = 'ndjson'
+
+    def stream(self, rows):
+        keys = [key for key, label in self.columns]
+        for row in rows:
+            record = {key: row.get(key) for key in keys}
+            yield (json.dumps(record, default=str, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+class XLSXExportWriter(ExportWriter):
+    """
+    XLSX em modo write-only do openpyxl: as linhas vão direto para o XML
+    temporário da planilha; o arquivo final é lido em blocos
+    """
+
+    content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    extension = 'xlsx'
+    read_block_size = 64 * 1024
+
+    def stream(self, rows):
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Relatório')
+        sheet.append([label for key, label in self.columns])
+        for row in rows:
+            sheet.append([self._format_value(row.get(key)) for key, label in self.columns])
+
+        with tempfile.TemporaryFile() as output:
+            workbook.save(output)
+            output.seek(0)
+            while True:
+                block = output.read(self.read_block_size)
+                if not block:
+                    break
+                yield block
+
+
+EXPORT_WRITERS = {
+    'csv': CSVExportWriter,
+    'ndjson': NDJSONExportWriter,
+}
+if XLSX_AVAILABLE:
+    EXPORT_WRITERS['xlsx'] = XLSXExportWriter
+
+
+def get_export_writer(report_type, export_format):
+    """Writer do formato pedido para as colunas do relatório"""
+    if report_type not in EXPORT_COLUMNS:
+        raise ExportError(f"Tipo de relatório desconhecido: {report_type}")
+    writer_class = EXPORT_WRITERS.get(export_format)
+    if writer_class is None:
+        raise ExportError(f"Formato de exportação indisponível: {export_format}")
+    return writer_class(EXPORT_COLUMNS[report_type])
+
+
+def export_report(report_type, export_format, parameters=None):
+    """Retornar (writer, gerador de bytes) para uma StreamingHttpResponse"""
+    writer = get_export_writer(report_type, export_format)
+    logger.info(f"Exportando relatório {report_type} em {export_format}")
+    return writer, writer.stream(iter_report_rows(report_type, parameters))
@@ -0,0 +1,287 @@
+"""
+Fila de jobs de relatório.
+
+A requisição apenas enfileira um Report com status 'pending'; o PDF é
+renderizado fora do ciclo da requisição (thread em segundo plano ou o comando
+`run_report_worker`) e gravado em Report.file_path.
+
+Relatórios idênticos (mesmo tipo, parâmetros, dia e versão dos dados de
+estoque) compartilham o mesmo arquivo: pedidos feitos enquanto a renderização
+está em andamento viram seguidores do job líder, e pedidos posteriores são
+atendidos pelo arquivo já gerado até que o estoque mude. A constraint
+report_single_inflight_leader garante um único líder em andamento por chave
+entre todos os processos.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from apps.core.models import DataVersion
+from .models import Report
+from .pdf_generator import pdf_generator, REPORT_TITLES
+from . import render_pool
+
+logger = logging.getLogger('apps.reports.pdf')
+
+REPORT_DESCRIPTIONS = {
+    'stock': 'Relatório completo de estoque com métricas consolidadas',
+    'movements': 'Relatório de movimentações dos últimos 30 dias',
+    'expiration': 'Relatório de lotes vencidos e próximos ao vencimento',
+}
+
+class ReportQueueFull(Exception):
+    """Fila de relatórios cheia; a view responde 429/503 com Retry-After"""
+    
+    def __init__(self, message, status_code=503, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after or getattr(settings, 'REPORT_RETRY_AFTER', 30)
+
+
+def build_cache_key(report_type, parameters=None):
+    """Chave do conteúdo do relatório: tipo, parâmetros, data e versão dos dados"""
+    payload = json.dumps({
+        'type': report_type,
+        'parameters': parameters or {},
+        'date': timezone.localdate().isoformat(),
+        'version': DataVersion.current('stock'),
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def enqueue_report(report_type, user, parameters=None):
+    """Criar o job do relatório, reaproveitando renderizações idênticas"""
+    parameters = parameters or {}
+    cache_key = build_cache_key(report_type, parameters)
+    
+    fields = dict(
+        title=f"{REPORT_TITLES[report_type]} - {timezone.localtime().strftime('%d/%m/%Y %H:%M')}",
+        report_type=report_type,
+        generated_by=user,
+        description=REPORT_DESCRIPTIONS.get(report_type, ''),
+        parameters=parameters,
+        status='pending',
+        cache_key=cache_key,
+    )
+    
+    source = _find_reusable_report(cache_key)
+    report = None
+    if source is None:
+        # Relatórios em cache ou já em andamento não custam renderização
+        _check_queue_capacity(user)
+        try:
+            with transaction.atomic():
+                report = Report.objects.create(**fields)
+        except IntegrityError:
+            # Outro processo criou o líder desta chave entre a busca e a criação
+            source = _find_reusable_report(cache_key)
+            if source is None:
+                raise
+    if report is None:
+        report = Report.objects.create(source=source, **fields)
+    
+    if source is None:
+        if getattr(settings, 'REPORT_JOB_BACKEND', 'thread') == 'thread':
+            transaction.on_commit(lambda: _start_thread(report.pk))
+        logger.info(f"Relatório {report.pk} ({report_type}) enfileirado para {user.username}")
+    elif source.status == 'completed':
+        _copy_result(report, source)
+        logger.info(f"Relatório {report.pk} ({report_type}) servido do cache (origem {source.pk})")
+    else:
+        # O líder pode ter terminado entre a busca e a criação do seguidor
+        _resolve_followers(Report.objects.get(pk=source.pk))
+        report.refresh_from_db()
+        logger.info(f"Relatório {report.pk} ({report_type}) aguardando renderização {source.pk}")
+    
+    return report
+
+
+def claim_next_report():
+    """Reservar o próximo job pendente; o UPDATE condicional evita processamento duplo"""
+    pending_ids = Report.objects.filter(
+        status='pending',
+        source__isnull=True
+    ).order_by('created_at').values_list('pk', flat=True)[:10]
+    
+    for report_id in pending_ids:
+        report = _claim(report_id)
+        if report is not None:
+            return report
+    return None
+
+
+def run_report_job(report_id):
+    """Processar um job específico, se ainda estiver pendente"""
+    report = _claim(report_id)
+    if report is None:
+        return None
+    return process_report(report)
+
+
+def process_report(report):
+    """Renderizar o PDF de um job já reservado e registrar o resultado"""
+    render_info = {}
+    started = time.monotonic()
+    try:
+        parts, render_info = _render_report(report)
+        content, filename = pdf_generator.package_parts(report.report_type, parts)
+        report.file_path.save(filename, ContentFile(content), save=False)
+        report.status = 'completed'
+        report.error_message = None
+        logger.info(f"Relatório {report.pk} gerado: {report.file_path.name}")
+        
+    except Exception as e:
+        logger.error(f"Erro ao processar relatório {report.pk}: {str(e)}", exc_info=True)
+        report.status = 'failed'
+        report.error_message = str(e)
+        _save_error_pdf(report, str(e))
+    
+    report.render_duration = round(time.monotonic() - started, 3)
+    report.peak_memory_kb = render_info.get('peak_rss_kb')
+    report.page_count = render_info.get('pages')
+    report.finished_at = timezone.now()
+    report.save(update_fields=[
+        'file_path', 'status', 'error_message', 'finished_at',
+        'render_duration', 'peak_memory_kb', 'page_count'
+    ])
+    _resolve_followers(report)
+    return report
+
+
+def _render_report(report):
+    """Montar o contexto aqui e renderizar conforme PDF_RENDER_BACKEND"""
+    backend = getattr(settings, 'PDF_RENDER_BACKEND', 'inline')
+    if backend not in ('process', 'subprocess'):
+        render_info = {}
+        parts = pdf_generator.generate_report(
+            report.report_type,
+            report.generated_by,
+            report.parameters,
+            render_info=render_info
+        )
+        # Pico do processo inteiro, não apenas desta renderização
+        render_info['peak_rss_kb'] = render_pool.current_peak_rss_kb()
+        return parts, render_info
+    
+    context = pdf_generator.build_context(report.report_type, report.generated_by, report.parameters)
+    if backend == 'subprocess':
+        return render_pool.render_isolated(report.report_type, context)
+    return render_pool.render(report.report_type, context)
+
+
+def _save_error_pdf(report, error_message):
+    """Anexar o PDF de erro padrão ao job que falhou"""
+    try:
+        error_pdf = pdf_generator._render_error_pdf(
+            REPORT_TITLES.get(report.report_type, report.report_type),
+            error_message
+        )
+        filename = f"erro_{pdf_generator.build_filename(report.report_type)}"
+        report.file_path.save(filename, ContentFile(error_pdf), save=False)
+    except Exception as e:
+        logger.critical(f"Falha na geração do PDF de erro do relatório {report.pk}: {str(e)}")
+
+
+def _check_queue_capacity(user):
+    """Limitar jobs em andamento por usuário (429) e no total (503)"""
+    in_flight = Report.objects.filter(
+        status__in=['pending', 'processing'],
+        source__isnull=True
+    )
+    
+    user_limit = getattr(settings, 'REPORT_USER_QUEUE_LIMIT', 3)
+    if in_flight.filter(generated_by=user).count() >= user_limit:
+        raise ReportQueueFull(
+            f"Você já possui {user_limit} relatórios em geração. Aguarde a conclusão.",
+            status_code=429
+        )
+    
+    queue_limit = getattr(settings, 'REPORT_QUEUE_LIMIT', 20)
+    if in_flight.count() >= queue_limit:
+        logger.warning(f"Fila de relatórios cheia ({queue_limit} jobs em andamento)")
+        raise ReportQueueFull(
+            "O sistema está gerando muitos relatórios no momento. Tente novamente em instantes.",
+            status_code=503
+        )
+
+
+def _find_reusable_report(cache_key):
+    """Job líder com a mesma chave: concluído (com arquivo) ou ainda em andamento"""
+    inflight_timeout = getattr(settings, 'REPORT_CACHE_INFLIGHT_TIMEOUT', 300)
+    candidate = Report.objects.filter(
+        cache_key=cache_key,
+        source__isnull=True,
+        status__in=['pending', 'processing', 'completed']
+    ).order_by('-created_at').first()
+    
+    if candidate is None:
+        return None
+    if candidate.status == 'completed':
+        if candidate.file_path and candidate.file_path.storage.exists(candidate.file_path.name):
+            return candidate
+        return None
+    # Job travado (processo encerrado no meio) não deve segurar novos pedidos:
+    # encerrado como falha, libera a vaga de líder da chave
+    if candidate.created_at < timezone.now() - timedelta(seconds=inflight_timeout):
+        expired = Report.objects.filter(pk=candidate.pk, status__in=['pending', 'processing']).update(
+            status='failed',
+            error_message='Renderização expirada (REPORT_CACHE_INFLIGHT_TIMEOUT)',
+            finished_at=timezone.now()
+        )
+        if expired:
+            _resolve_followers(Report.objects.get(pk=candidate.pk))
+        return None
+    return candidate
+
+
+def _copy_result(report, source):
+    """Apontar o relatório para o resultado do líder"""
+    report.status = source.status
+    report.file_path.name = source.file_path.name if source.file_path else None
+    report.error_message = source.error_message
+    report.finished_at = timezone.now()
+    report.save(update_fields=['file_path', 'status', 'error_message', 'finished_at'])
+
+
+def _resolve_followers(report):
+    """Propagar o resultado do líder para os pedidos que aguardavam a mesma renderização"""
+    if not report.is_finished:
+        return 0
+    return Report.objects.filter(source=report, status='pending').update(
+        status=report.status,
+        file_path=report.file_path.name if report.file_path else None,
+        error_message=report.error_message,
+        finished_at=report.finished_at or timezone.now()
+    )
+
+
+def _claim(report_id):
+    """Marcar job como 'processing' se ainda estiver 'pending'"""
+    claimed = Report.objects.filter(pk=report_id, status='pending').update(
+        status='processing',
+        started_at=timezone.now()
+    )
+    if not claimed:
+        return None
+    return Report.objects.select_related('generated_by').get(pk=report_id)
+
+
+def _start_thread(report_id):
+    """Processar o job numa thread daemon do próprio processo"""
+    def target():
+        try:
+            run_report_job(report_id)
+        finally:
+            # Threads não passam pelo ciclo de request, fechar conexões manualmente
+            connections.close_all()
+    
+    threading.Thread(target=target, name=f'report-job-{report_id}', daemon=True).start()
@@ -0,0 +1,98 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from apps.reports import render_pool
+from apps.reports.pdf_generator import pdf_generator, PDFGenerator, REPORT_TEMPLATES, get_default_engine
+
+
+class Command(BaseCommand):
+    help = 'Comparar o tempo de renderização de PDFs com a engine fria e pré-aquecida'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--report-type',
+            choices=sorted(REPORT_TEMPLATES),
+            default='stock',
+            help='Tipo de relatório renderizado'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=10,
+            help='Renderizações por cenário'
+        )
+        parser.add_argument(
+            '--skip-subprocess',
+            action='store_true',
+            help='Não medir os cenários com processo isolado'
+        )
+
+    def handle(self, *args, **options):
+        """Medir os cenários frio x aquecido com o mesmo contexto"""
+        engine = get_default_engine()
+        if not engine:
+            raise CommandError('Nenhuma engine PDF disponível')
+
+        report_type = options['report_type']
+        iterations = options['iterations']
+        user = User.objects.order_by('pk').first()
+        context = pdf_generator.build_context(report_type, user, {})
+
+        self.stdout.write(self.style.SUCCESS(
+            f'📊 Benchmark de renderização ({engine}) - relatório {report_type}, {iterations} iterações'
+        ))
+
+        results = []
+
+        # Antes: CSS parseado a cada renderização, gerador recém-criado
+        cold = PDFGenerator()
+        results.append(('Primeira renderização (processo frio)', self._measure(
+            lambda: cold.render_pdf(report_type, context), 1
+        )))
+        results.append(('No processo, CSS reparseado a cada vez', self._measure(
+            lambda: (cold._stylesheets.clear(), cold.render_pdf(report_type, context)), iterations
+        )))
+
+        # Depois: engine pré-aquecida (CSS, fontes e templates em memória)
+        warm = PDFGenerator()
+        warm.warm_up()
+        results.append(('No processo, engine pré-aquecida', self._measure(
+            lambda: warm.render_pdf(report_type, context), iterations
+        )))
+
+        if not options['skip_subprocess']:
+            with override_settings(PDF_RENDER_STANDBY=False):
+                results.append(('Processo isolado, sem reserva', self._measure(
+                    lambda: render_pool.render_isolated(report_type, context), iterations
+                )))
+            with override_settings(PDF_RENDER_STANDBY=True):
+                render_pool.render_isolated(report_type, context)
+                # Dar tempo ao processo de reserva para terminar o aquecimento
+                time.sleep(3)
+                results.append(('Processo isolado, reserva aquecida', self._measure(
+                    lambda: render_pool.render_isolated(report_type, context),
+                    iterations,
+                    between=lambda: time.sleep(3)
+                )))
+
+        self.stdout.write(f"\n{'Cenário':<45}{'média (ms)':>12}{'mediana':>12}{'máx':>12}")
+        for label, timings in results:
+            self.stdout.write(
+                f"{label:<45}{statistics.mean(timings):>12.1f}"
+                f"{statistics.median(timings):>12.1f}{max(timings):>12.1f}"
+            )
+
+    def _measure(self, func, iterations, between=None):
+        """Executar `func` e retornar os tempos em milissegundos (`between` fora da medição)"""
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+            if between:
+                between()
+        return timings
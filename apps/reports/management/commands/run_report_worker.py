@@ -0,0 +1,55 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.reports.jobs import claim_next_report, process_report
+from apps.reports.pdf_generator import pdf_generator
+
+
+class Command(BaseCommand):
+    help = 'Processar a fila de relatórios em PDF (use com REPORT_JOB_BACKEND = "worker")'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Processar os jobs pendentes e encerrar'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=getattr(settings, 'REPORT_WORKER_POLL_INTERVAL', 2),
+            help='Segundos entre consultas à fila quando vazia'
+        )
+
+    def handle(self, *args, **options):
+        """Consumir a fila de relatórios"""
+        self.stdout.write(self.style.SUCCESS('🚀 Worker de relatórios iniciado'))
+        processed = 0
+        
+        # Renderização no próprio processo: aquecer a engine antes do primeiro job
+        if getattr(settings, 'PDF_RENDER_BACKEND', 'inline') == 'inline' and getattr(settings, 'PDF_PREWARM', True):
+            elapsed = pdf_generator.warm_up()
+            self.stdout.write(f'  Engine PDF pré-aquecida em {elapsed:.2f}s')
+        
+        try:
+            while True:
+                close_old_connections()
+                report = claim_next_report()
+                
+                if report is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                
+                report = process_report(report)
+                processed += 1
+                style = self.style.SUCCESS if report.status == 'completed' else self.style.ERROR
+                self.stdout.write(style(f'  Relatório {report.pk} ({report.report_type}): {report.get_status_display()}'))
+        except KeyboardInterrupt:
+            pass
+        
+        self.stdout.write(self.style.SUCCESS(f'🎉 Worker encerrado. {processed} relatório(s) processado(s).'))
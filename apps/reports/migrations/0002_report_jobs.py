@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-19 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='error_message',
+            field=models.TextField(blank=True, null=True, verbose_name='Mensagem de Erro'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Fim do Processamento'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Início do Processamento'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Na Fila'), ('processing', 'Processando'), ('completed', 'Concluído'), ('failed', 'Falhou')], default='pending', max_length=20, verbose_name='Status'),
+        ),
+        migrations.AlterField(
+            model_name='report',
+            name='report_type',
+            field=models.CharField(choices=[('stock', 'Relatório de Estoque'), ('movements', 'Relatório de Movimentações'), ('expiration', 'Relatório de Vencimentos'), ('estoque', 'Relatório de Estoque'), ('movimentacao', 'Relatório de Movimentação'), ('vencimento', 'Relatório de Vencimentos'), ('vendas', 'Relatório de Vendas'), ('fornecedores', 'Relatório de Fornecedores')], max_length=20, verbose_name='Tipo de Relatório'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(fields=['status', 'created_at'], name='report_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-19 03:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_report_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='cache_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='Chave de Cache'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='source',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='followers', to='reports.report', verbose_name='Relatório de Origem'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-19 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0003_report_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Páginas'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='peak_memory_kb',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Pico de Memória (KB)'),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='render_duration',
+            field=models.FloatField(blank=True, null=True, verbose_name='Duração da Renderização (s)'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-19 04:15
+
+from django.db import migrations, models
+
+
+def expire_duplicate_leaders(apps, schema_editor):
+    """Manter só o líder em andamento mais recente de cada chave antes da constraint"""
+    Report = apps.get_model('reports', 'Report')
+    seen = set()
+    inflight = Report.objects.filter(
+        status__in=['pending', 'processing'],
+        source__isnull=True
+    ).exclude(cache_key='').order_by('cache_key', '-created_at')
+    for report_id, cache_key in inflight.values_list('pk', 'cache_key'):
+        if cache_key in seen:
+            Report.objects.filter(pk=report_id).update(
+                status='failed',
+                error_message='Renderização duplicada descartada'
+            )
+        seen.add(cache_key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0004_report_render_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(expire_duplicate_leaders, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='report',
+            constraint=models.UniqueConstraint(condition=models.Q(('source__isnull', True), ('status__in', ['pending', 'processing']), models.Q(('cache_key', ''), _negated=True)), fields=('cache_key',), name='report_single_inflight_leader'),
+        ),
+    ]
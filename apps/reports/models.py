@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth.models import User
 
 
@@ -6,6 +7,9 @@ class Report(models.Model):
     """Modelo para relatórios gerados"""
     
     REPORT_TYPES = (
+        ('stock', 'Relatório de Estoque'),
+        ('movements', 'Relatório de Movimentações'),
+        ('expiration', 'Relatório de Vencimentos'),
         ('estoque', 'Relatório de Estoque'),
         ('movimentacao', 'Relatório de Movimentação'),
         ('vencimento', 'Relatório de Vencimentos'),
@@ -13,6 +17,13 @@ class Report(models.Model):
         ('fornecedores', 'Relatório de Fornecedores'),
     )
     
+    STATUS_CHOICES = (
+        ('pending', 'Na Fila'),
+        ('processing', 'Processando'),
+        ('completed', 'Concluído'),
+        ('failed', 'Falhou'),
+    )
+    
     title = models.CharField(
         max_length=200,
         verbose_name='Título'
@@ -61,15 +72,89 @@ class Report(models.Model):
         verbose_name='Parâmetros'
     )
     
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name='Status'
+    )
+    
+    error_message = models.TextField(
+        blank=True,
+        null=True,
+        verbose_name='Mensagem de Erro'
+    )
+    
+    render_duration = models.FloatField(
+        blank=True,
+        null=True,
+        verbose_name='Duração da Renderização (s)'
+    )
+    
+    peak_memory_kb = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        verbose_name='Pico de Memória (KB)'
+    )
+    
+    page_count = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        verbose_name='Páginas'
+    )
+    
+    cache_key = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        verbose_name='Chave de Cache'
+    )
+    
+    source = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='followers',
+        verbose_name='Relatório de Origem'
+    )
+    
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Gerado em'
     )
     
+    started_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Início do Processamento'
+    )
+    
+    finished_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name='Fim do Processamento'
+    )
+    
     class Meta:
         verbose_name = 'Relatório'
         verbose_name_plural = 'Relatórios'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='report_status_created_idx'),
+        ]
+        constraints = [
+            # Um único líder em andamento por chave, entre todos os processos (single-flight)
+            models.UniqueConstraint(
+                fields=['cache_key'],
+                condition=Q(status__in=['pending', 'processing'], source__isnull=True) & ~Q(cache_key=''),
+                name='report_single_inflight_leader',
+            ),
+        ]
+    
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
     
     def __str__(self):
         return f"{self.title} - {self.created_at.strftime('%d/%m/%Y')}"
\ No newline at end of file
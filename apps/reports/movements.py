@@ -0,0 +1,262 @@
+"""
+Motor do relatório de movimentações.
+
+Une o razão do estoque geral (`StockMovement`) às transferências entre filiais
+(`StockTransfer`) numa consulta UNION ALL. Os totais por dia, filial e tipo são
+agregados no banco; o detalhe é lido em lotes (PDF/exportação) ou por página
+(API), sem carregar o período inteiro em memória.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.core.paginator import Paginator
+from django.db.models import CharField, Count, F, Q, Sum, Value
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from apps.branches.models import StockTransfer
+from apps.inventory.models import StockMovement
+
+# Movimentações do razão não têm filial: pertencem ao estoque geral
+GENERAL_STOCK_LABEL = 'Estoque Geral'
+TRANSFER_TYPE = 'transfer'
+# Lançamentos do razão não passam por aprovação
+LEDGER_STATUS = 'registered'
+
+MOVEMENT_TYPE_LABELS = dict(StockMovement.MOVEMENT_TYPES, **{TRANSFER_TYPE: 'Transferência'})
+STATUS_LABELS = dict(StockTransfer.STATUS_CHOICES, **{LEDGER_STATUS: 'Registrada'})
+
+# Tipos do razão que retiram quantidade do estoque geral
+OUTBOUND_TYPES = ('saida', 'vencimento')
+
+DEFAULT_PERIOD_DAYS = 30
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class MovementPeriodError(ValueError):
+    """Período do relatório inválido"""
+    pass
+
+
+def parse_period(parameters=None):
+    """
+    Período (início, fim) a partir dos parâmetros do relatório.
+
+    Aceita 'start_date'/'end_date' (AAAA-MM-DD, inclusivos) ou 'days' (os
+    últimos N dias); sem parâmetros, os últimos 30 dias.
+    """
+    parameters = parameters or {}
+    start_value = parameters.get('start_date')
+    end_value = parameters.get('end_date')
+
+    if start_value or end_value:
+        start_day = _parse_day(start_value, 'start_date') if start_value else None
+        end_day = _parse_day(end_value, 'end_date') if end_value else timezone.localdate()
+        if start_day is None:
+            start_day = end_day - timedelta(days=DEFAULT_PERIOD_DAYS)
+        if start_day > end_day:
+            raise MovementPeriodError('A data inicial deve ser anterior à data final')
+        tz = timezone.get_current_timezone()
+        start_date = timezone.make_aware(datetime.combine(start_day, time.min), tz)
+        end_date = timezone.make_aware(datetime.combine(end_day, time.max), tz)
+        return start_date, end_date
+
+    try:
+        days = int(parameters.get('days', DEFAULT_PERIOD_DAYS))
+    except (TypeError, ValueError):
+        raise MovementPeriodError('Número de dias inválido')
+    if days < 1:
+        raise MovementPeriodError('O período deve ter ao menos 1 dia')
+    end_date = timezone.now()
+    return end_date - timedelta(days=days), end_date
+
+
+def _parse_day(value, name):
+    try:
+        day = parse_date(str(value))
+    except ValueError:
+        day = None
+    if day is None:
+        raise MovementPeriodError(f'Data inválida em {name}: {value}')
+    return day
+
+
+class MovementsReport:
+    """Movimentações de estoque e transferências num período"""
+
+    def __init__(self, start_date, end_date, branch_id=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.branch_id = branch_id
+
+    @classmethod
+    def from_parameters(cls, parameters=None):
+        parameters = parameters or {}
+        start_date, end_date = parse_period(parameters)
+        return cls(start_date, end_date, parameters.get('branch_id'))
+
+    # Conjuntos de origem
+
+    def ledger_queryset(self):
+        """Razão do estoque geral no período (vazio ao filtrar por filial)"""
+        queryset = StockMovement.objects.filter(created_at__range=(self.start_date, self.end_date))
+        if self.branch_id:
+            return queryset.none()
+        return queryset
+
+    def transfer_queryset(self):
+        """Transferências solicitadas no período"""
+        queryset = StockTransfer.objects.filter(requested_at__range=(self.start_date, self.end_date))
+        if self.branch_id:
+            queryset = queryset.filter(Q(from_branch_id=self.branch_id) | Q(to_branch_id=self.branch_id))
+        return queryset
+
+    # Detalhe
+
+    def detail_queryset(self):
+        """
+        UNION ALL das duas fontes com colunas equivalentes, mais recentes primeiro
+        """
+        ledger = self.ledger_queryset().order_by().values(
+            row_id=F('id'),
+            row_date=F('created_at'),
+            row_type=F('movement_type'),
+            row_medication=F('medication__name'),
+            row_quantity=F('quantity'),
+            row_origin=Value(None, output_field=CharField()),
+            row_destination=Value(None, output_field=CharField()),
+            row_user=F('user__username'),
+            row_status=Value(LEDGER_STATUS, output_field=CharField()),
+        )
+        transfers = self.transfer_queryset().order_by().values(
+            row_id=F('id'),
+            row_date=F('requested_at'),
+            row_type=Value(TRANSFER_TYPE, output_field=CharField()),
+            row_medication=F('medication__name'),
+            row_quantity=F('quantity'),
+            row_origin=F('from_branch__name'),
+            row_destination=F('to_branch__name'),
+            row_user=F('requested_by__username'),
+            row_status=F('status'),
+        )
+        return ledger.union(transfers, all=True).order_by('-row_date', '-row_id')
+
+    def iter_rows(self, chunk_size=2000):
+        """Linhas do detalhe lidas em lotes de `chunk_size`"""
+        for row in self.detail_queryset().iterator(chunk_size=chunk_size):
+            yield self._format_row(row)
+
+    def get_page(self, number=1, page_size=DEFAULT_PAGE_SIZE):
+        """Uma página do detalhe (LIMIT/OFFSET na consulta unida)"""
+        page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+        page = Paginator(self.detail_queryset(), page_size).get_page(number)
+        return {
+            'number': page.number,
+            'num_pages': page.paginator.num_pages,
+            'count': page.paginator.count,
+            'page_size': page_size,
+            'has_next': page.has_next(),
+            'has_previous': page.has_previous(),
+            'rows': [self._format_row(row) for row in page.object_list],
+        }
+
+    def _format_row(self, row):
+        movement_type = row['row_type']
+        if movement_type == TRANSFER_TYPE:
+            from_location, to_location = row['row_origin'], row['row_destination']
+        elif movement_type in OUTBOUND_TYPES:
+            from_location, to_location = GENERAL_STOCK_LABEL, '-'
+        else:
+            from_location, to_location = '-', GENERAL_STOCK_LABEL
+        return {
+            'date': row['row_date'],
+            'type': movement_type,
+            'type_display': MOVEMENT_TYPE_LABELS.get(movement_type, movement_type),
+            'medication_name': row['row_medication'],
+            'quantity': row['row_quantity'],
+            'from_location': from_location,
+            'to_location': to_location,
+            'user': row['row_user'],
+            'status': STATUS_LABELS.get(row['row_status'], row['row_status']),
+            'status_code': row['row_status'],
+        }
+
+    # Agregados
+
+    def get_buckets(self):
+        """
+        Totais por dia, filial e tipo (GROUP BY no banco).
+
+        Transferências entram na filial de origem; o razão, no estoque geral.
+        """
+        ledger = self.ledger_queryset().order_by().annotate(
+            day=TruncDate('created_at')
+        ).values('day', 'movement_type').annotate(
+            movements=Count('id'),
+            total_quantity=Sum('quantity'),
+        )
+        transfers = self.transfer_queryset().order_by().annotate(
+            day=TruncDate('requested_at')
+        ).values('day', 'from_branch__name').annotate(
+            movements=Count('id'),
+            total_quantity=Sum('quantity'),
+        )
+
+        buckets = [
+            self._bucket(row['day'], GENERAL_STOCK_LABEL, row['movement_type'], row)
+            for row in ledger
+        ]
+        buckets.extend(
+            self._bucket(row['day'], row['from_branch__name'], TRANSFER_TYPE, row)
+            for row in transfers
+        )
+        buckets.sort(key=lambda bucket: (bucket['day'], bucket['branch'], bucket['type']), reverse=True)
+        return buckets
+
+    def _bucket(self, day, branch, movement_type, row):
+        return {
+            'day': day,
+            'branch': branch,
+            'type': movement_type,
+            'type_display': MOVEMENT_TYPE_LABELS.get(movement_type, movement_type),
+            'movements': row['movements'],
+            'total_quantity': row['total_quantity'] or 0,
+        }
+
+    def get_stats(self):
+        """Totais do período e contagem por status (agregações no banco)"""
+        ledger = self.ledger_queryset().order_by().aggregate(
+            movements=Count('id'),
+            quantity=Sum('quantity'),
+        )
+        transfers = self.transfer_queryset().order_by().aggregate(
+            movements=Count('id'),
+            quantity=Sum('quantity'),
+            completed=Count('id', filter=Q(status='completed')),
+            pending=Count('id', filter=Q(status='pending')),
+            in_transit=Count('id', filter=Q(status='in_transit')),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+        )
+        by_type = {
+            row['movement_type']: row['movements']
+            for row in self.ledger_queryset().order_by().values('movement_type').annotate(movements=Count('id'))
+        }
+        by_type[TRANSFER_TYPE] = transfers['movements']
+
+        return {
+            'total_movements': ledger['movements'] + transfers['movements'],
+            'total_quantity': (ledger['quantity'] or 0) + (transfers['quantity'] or 0),
+            'ledger_movements': ledger['movements'],
+            'transfer_movements': transfers['movements'],
+            # Lançamentos do razão já estão efetivados
+            'completed_movements': ledger['movements'] + transfers['completed'],
+            'pending_movements': transfers['pending'],
+            'in_transit_movements': transfers['in_transit'],
+            'cancelled_movements': transfers['cancelled'],
+            'by_type': [
+                {'type': key, 'type_display': label, 'movements': by_type.get(key, 0)}
+                for key, label in MOVEMENT_TYPE_LABELS.items()
+            ],
+        }
@@ -5,9 +5,12 @@ Suporta WeasyPrint (preferido) e ReportLab (fallback)
 
 import io
 import os
+import time
 import logging
+import zipfile
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from itertools import islice
+from typing import Dict, List, Any, Optional, Tuple
 
 from django.http import HttpResponse, HttpRequest
 from django.template.loader import render_to_string
@@ -16,37 +19,101 @@ from django.utils import timezone
 from django.db.models import Sum, Count, Q, Min, Max
 from django.core.paginator import Paginator
 
-# Tentativa de importação das bibliotecas PDF
-PDF_ENGINE = None
-try:
-    from weasyprint import HTML, CSS
-    from weasyprint.text.fonts import FontConfiguration
-    PDF_ENGINE = 'weasyprint'
-    print("[OK] WeasyPrint disponivel - usando como engine principal")
-except (ImportError, OSError, Exception) as e:
-    # Captura ImportError, OSError (bibliotecas GTK+ não encontradas no Windows)
-    # e qualquer outra exceção durante a importação do WeasyPrint
-    try:
-        from reportlab.lib.pagesizes import A4, letter
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import inch
-        from reportlab.lib import colors
-        from reportlab.pdfgen import canvas
-        PDF_ENGINE = 'reportlab'
-        error_msg = str(e)[:100] if e else "erro desconhecido"
-        print(f"[AVISO] WeasyPrint nao disponivel ({type(e).__name__}: {error_msg}) - usando ReportLab como fallback")
-    except ImportError:
-        PDF_ENGINE = None
-        print("[ERRO] Nenhuma biblioteca PDF disponivel - instale WeasyPrint ou ReportLab")
+# Engines PDF (WeasyPrint/ReportLab) importadas apenas no primeiro uso
+from .engines import get_available_engines, get_default_engine
 
 # Logger específico para PDFs
 logger = logging.getLogger('apps.reports.pdf')
 
+# Templates HTML (WeasyPrint) e títulos por tipo de relatório
+REPORT_TEMPLATES = {
+    'stock': 'reports/pdf/stock_report.html',
+    'movements': 'reports/pdf/movements_report.html',
+    'expiration': 'reports/pdf/expiration_report.html',
+}
+
+REPORT_TITLES = {
+    'stock': 'Relatório de Estoque',
+    'movements': 'Relatório de Movimentações',
+    'expiration': 'Relatório de Vencimentos',
+}
+
+# Listas de linhas renderizadas em chunks (caminhos no contexto, na ordem do documento)
+REPORT_ROW_SECTIONS = {
+    'stock': ('medicamentos',),
+    'movements': ('movimentacoes',),
+    'expiration': ('vencimentos.expired', 'vencimentos.near_expiry'),
+}
+
 class PDFGenerationError(Exception):
     """Exceção customizada para erros de geração de PDF"""
     pass
 
+
+class ReportRows:
+    """
+    Linhas de uma seção lidas sob demanda: cada iteração refaz a consulta em
+    lotes de PDF_CHUNK_SIZE, sem manter a seção inteira em memória
+    """
+    
+    def __init__(self, iter_rows, *args):
+        self.iter_rows = iter_rows
+        self.args = args
+    
+    def __iter__(self):
+        return iter(self.iter_rows(*self.args))
+
+
+class PagedCanvas:
+    """
+    Canvas ReportLab dividido em partes de no máximo `max_pages` páginas
+    """
+    
+    def __init__(self, title: str, max_pages: int, render_info: Optional[Dict] = None):
+        self.title = title
+        self.max_pages = max_pages
+        self.render_info = render_info
+        self.parts: List[bytes] = []
+        self.total_pages = 0
+        self._start_part()
+    
+    def _start_part(self):
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.pagesizes import A4
+        
+        self.buffer = io.BytesIO()
+        self.canvas = canvas.Canvas(self.buffer, pagesize=A4)
+        part_number = len(self.parts) + 1
+        self.canvas.setTitle(self.title if part_number == 1 else f"{self.title} - Parte {part_number}")
+        self.page_count = 0
+    
+    def show_page(self):
+        """Fechar a página atual, iniciando nova parte ao atingir o limite"""
+        self.canvas.showPage()
+        self.page_count += 1
+        self.total_pages += 1
+        if self.page_count >= self.max_pages:
+            self.canvas.save()
+            self.parts.append(self.buffer.getvalue())
+            self._start_part()
+    
+    def finish(self) -> List[bytes]:
+        """
+        Salvar a última parte e retornar todas.
+        A página atual só conta se algo foi desenhado nela (o ReportLab não
+        emite páginas vazias); um relatório sem conteúdo vira uma página em branco.
+        """
+        if self.canvas._code or not (self.parts or self.page_count):
+            self.canvas.showPage()
+            self.page_count += 1
+            self.total_pages += 1
+        if self.page_count:
+            self.canvas.save()
+            self.parts.append(self.buffer.getvalue())
+        if self.render_info is not None:
+            self.render_info['pages'] = self.total_pages
+        return self.parts
+
 class PDFGenerator:
     """
     Classe robusta para geração de PDFs com múltiplas engines e fallbacks
@@ -58,132 +125,267 @@ class PDFGenerator:
         self.timeout = getattr(settings, 'PDF_GENERATION_TIMEOUT', 60)
         self.max_pages = getattr(settings, 'PDF_MAX_PAGES', 500)
         self.chunk_size = getattr(settings, 'PDF_CHUNK_SIZE', 1000)
-        
-        if PDF_ENGINE == 'weasyprint':
+        # CSS já parseado por tipo de relatório (reutilizado entre renderizações)
+        self._stylesheets = {}
+        self._font_config_loaded = False
+        self.is_warm = False
+    
+    @property
+    def engine(self) -> Optional[str]:
+        """Engine padrão (detectada no primeiro uso)"""
+        return get_default_engine()
+    
+    def get_font_config(self):
+        """FontConfiguration do WeasyPrint, criada no primeiro uso"""
+        if not self._font_config_loaded:
+            self._font_config_loaded = True
             try:
                 from weasyprint.text.fonts import FontConfiguration
                 self.font_config = FontConfiguration()
             except (ImportError, OSError, Exception):
                 # Se FontConfiguration falhar, continuar sem ele
                 self.font_config = None
-        
-        logger.info(f"PDFGenerator inicializado com engine: {PDF_ENGINE}")
+        return self.font_config
     
     def generate_stock_report_pdf(self, request: HttpRequest) -> HttpResponse:
         """
         Gerar relatório de estoque em PDF
         """
-        logger.info("Iniciando geração do relatório de estoque")
-        
-        try:
-            # Verificar disponibilidade da engine
-            if not PDF_ENGINE:
-                raise PDFGenerationError("Nenhuma biblioteca PDF disponível")
-            
-            # 1. Buscar dados otimizados
-            medicamentos_data = self._get_stock_data_optimized()
-            
-            # 2. Calcular métricas
-            metrics = self._calculate_stock_metrics(medicamentos_data)
-            
-            # 3. Preparar contexto
-            context = {
-                'medicamentos': medicamentos_data,
-                'metrics': metrics,
-                'generated_at': timezone.now(),
-                'user': request.user,
-                'title': 'Relatório de Estoque',
-                'company_name': 'Sistema de Farmácia',
-                'report_type': 'stock',
-            }
-            
-            # 4. Gerar PDF baseado na engine disponível
-            if PDF_ENGINE == 'weasyprint':
-                return self._generate_with_weasyprint(request, context, 'reports/pdf/stock_report.html')
-            else:
-                return self._generate_with_reportlab_stock(context)
-                
-        except Exception as e:
-            logger.error(f"Erro na geração do PDF de estoque: {str(e)}", exc_info=True)
-            return self._generate_error_pdf("Relatório de Estoque", str(e))
+        return self._generate_response('stock', request)
     
     def generate_movements_report_pdf(self, request: HttpRequest) -> HttpResponse:
         """
         Gerar relatório de movimentações em PDF (últimos 30 dias)
         """
-        logger.info("Iniciando geração do relatório de movimentações")
-        
-        try:
-            if not PDF_ENGINE:
-                raise PDFGenerationError("Nenhuma biblioteca PDF disponível")
-            
-            # Calcular período
-            end_date = timezone.now()
-            start_date = end_date - timedelta(days=30)
-            
-            # Buscar movimentações
-            movimentacoes_data = self._get_movements_data_optimized(start_date, end_date)
-            
-            # Calcular estatísticas
-            stats = self._calculate_movement_stats(movimentacoes_data)
-            
-            context = {
-                'movimentacoes': movimentacoes_data,
-                'stats': stats,
-                'start_date': start_date,
-                'end_date': end_date,
-                'generated_at': timezone.now(),
-                'user': request.user,
-                'title': 'Relatório de Movimentações',
-                'company_name': 'Sistema de Farmácia',
-                'report_type': 'movements',
-            }
-            
-            if PDF_ENGINE == 'weasyprint':
-                return self._generate_with_weasyprint(request, context, 'reports/pdf/movements_report.html')
-            else:
-                return self._generate_with_reportlab_movements(context)
-                
-        except Exception as e:
-            logger.error(f"Erro na geração do PDF de movimentações: {str(e)}", exc_info=True)
-            return self._generate_error_pdf("Relatório de Movimentações", str(e))
+        return self._generate_response('movements', request)
     
     def generate_expiration_report_pdf(self, request: HttpRequest) -> HttpResponse:
         """
         Gerar relatório de vencimentos em PDF
         """
-        logger.info("Iniciando geração do relatório de vencimentos")
+        return self._generate_response('expiration', request)
+    
+    def generate_report(self, report_type: str, user, parameters: Optional[Dict] = None,
+                        base_url: Optional[str] = None, render_info: Optional[Dict] = None) -> List[bytes]:
+        """
+        Gerar o PDF de um relatório (sem depender de request).
+        Retorna uma lista de partes, cada uma com no máximo PDF_MAX_PAGES páginas.
+        """
+        logger.info(f"Iniciando geração do relatório: {report_type}")
         
-        try:
-            if not PDF_ENGINE:
-                raise PDFGenerationError("Nenhuma biblioteca PDF disponível")
+        # Verificar disponibilidade da engine
+        if not self.engine:
+            raise PDFGenerationError("Nenhuma biblioteca PDF disponível")
+        
+        deadline = time.monotonic() + self.timeout
+        # Renderização no próprio processo: as linhas vão do banco direto aos chunks
+        context = self.build_context(report_type, user, parameters, stream_rows=True)
+        self._check_deadline(deadline)
+        return self.render_pdf(report_type, context, base_url, deadline, render_info)
+    
+    def build_context(self, report_type: str, user, parameters: Optional[Dict] = None,
+                      stream_rows: bool = False) -> Dict:
+        """
+        Buscar dados e montar o contexto de um relatório.
+        Com `stream_rows`, as listas de linhas são ReportRows (lidas do banco a
+        cada iteração); sem ele são listas, para enviar o contexto a outro processo.
+        """
+        parameters = parameters or {}
+        context = {
+            'generated_at': timezone.now(),
+            'user': user,
+            'title': REPORT_TITLES[report_type],
+            'company_name': 'Sistema de Farmácia',
+            'report_type': report_type,
+            # Sobrescritos por chunk na renderização em partes
+            'is_first_chunk': True,
+            'is_last_chunk': True,
+        }
+        
+        if report_type == 'stock':
+            # 1. Buscar dados otimizados  2. Calcular métricas
+            if stream_rows:
+                medicamentos_data = ReportRows(self.iter_stock_rows)
+            else:
+                medicamentos_data = self._get_stock_data_optimized()
+            context['medicamentos'] = medicamentos_data
+            context['metrics'], context['low_stock_medicamentos'] = self._calculate_stock_metrics(medicamentos_data)
+        
+        elif report_type == 'movements':
+            from .movements import MovementsReport
+            
+            # Período e filial vindos dos parâmetros; agregados calculados no banco
+            movements_report = MovementsReport.from_parameters(parameters)
             
+            period = (movements_report.start_date, movements_report.end_date, movements_report.branch_id)
+            if stream_rows:
+                context['movimentacoes'] = ReportRows(self.iter_movement_rows, *period)
+            else:
+                context['movimentacoes'] = self._get_movements_data_optimized(*period)
+            context['stats'] = movements_report.get_stats()
+            context['buckets'] = movements_report.get_buckets()
+            context['start_date'] = movements_report.start_date
+            context['end_date'] = movements_report.end_date
+        
+        elif report_type == 'expiration':
             # Calcular datas limite
-            today = timezone.now().date()
-            thirty_days = today + timedelta(days=30)
+            today, thirty_days = self.get_expiration_period()
             
-            # Buscar dados de vencimento
-            vencimentos_data = self._get_expiration_data_optimized(today, thirty_days)
+            context['vencimentos'] = self._get_expiration_data_optimized(today, thirty_days, stream_rows)
+            context['today'] = today
+            context['thirty_days_limit'] = thirty_days
+        
+        else:
+            raise PDFGenerationError(f"Tipo de relatório desconhecido: {report_type}")
+        
+        return context
+    
+    def get_movements_period(self, parameters: Optional[Dict] = None) -> Tuple[datetime, datetime]:
+        """
+        Período do relatório de movimentações: 'start_date'/'end_date' ou
+        'days' (padrão: últimos 30 dias)
+        """
+        from .movements import parse_period
+        return parse_period(parameters)
+    
+    def get_expiration_period(self):
+        """
+        Data de referência e limite de "próximo ao vencimento" (30 dias)
+        """
+        today = timezone.now().date()
+        return today, today + timedelta(days=30)
+    
+    def render_pdf(self, report_type: str, context: Dict, base_url: Optional[str] = None,
+                   deadline: Optional[float] = None, render_info: Optional[Dict] = None,
+                   engine: Optional[str] = None) -> List[bytes]:
+        """
+        Renderizar o contexto de um relatório com a engine disponível (ou a
+        `engine` informada, ex.: em benchmarks).
+        Se `render_info` for informado, recebe o total de páginas em 'pages'.
+        """
+        engine = engine or self.engine
+        if engine not in get_available_engines():
+            raise PDFGenerationError(f"Engine PDF indisponível: {engine}")
+        
+        if engine == 'weasyprint':
+            return self._generate_with_weasyprint(
+                context, REPORT_TEMPLATES[report_type], base_url, deadline, render_info
+            )
+        
+        reportlab_renderers = {
+            'stock': self._generate_with_reportlab_stock,
+            'movements': self._generate_with_reportlab_movements,
+            'expiration': self._generate_with_reportlab_expiration,
+        }
+        return reportlab_renderers[report_type](context, deadline, render_info)
+    
+    def build_filename(self, report_type: str, extension: str = 'pdf') -> str:
+        """
+        Nome do arquivo com timestamp
+        """
+        timestamp = timezone.localtime().strftime('%Y%m%d_%H%M%S')
+        return f"{report_type}_{timestamp}.{extension}"
+    
+    def package_parts(self, report_type: str, parts: List[bytes]) -> Tuple[bytes, str]:
+        """
+        Empacotar as partes: PDF único ou ZIP com um PDF por parte
+        """
+        if len(parts) == 1:
+            return parts[0], self.build_filename(report_type)
+        
+        filename = self.build_filename(report_type, 'zip')
+        base_name = filename[:-len('.zip')]
+        buffer = io.BytesIO()
+        # PDFs já são comprimidos, apenas armazenar
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for number, part in enumerate(parts, start=1):
+                archive.writestr(f"{base_name}_parte_{number:02d}.pdf", part)
+        
+        logger.info(f"Relatório {report_type} dividido em {len(parts)} partes")
+        return buffer.getvalue(), filename
+    
+    def _check_deadline(self, deadline: Optional[float]):
+        """
+        Interromper a geração quando PDF_GENERATION_TIMEOUT for excedido
+        """
+        if deadline is not None and time.monotonic() > deadline:
+            raise PDFGenerationError(
+                f"Tempo limite de {self.timeout}s excedido na geração do relatório"
+            )
+    
+    def _iter_row_chunks(self, context: Dict):
+        """
+        Dividir as linhas do relatório em contextos de até PDF_CHUNK_SIZE linhas.
+        Seções sem linhas no chunk recebem lista vazia.
+        """
+        sections = REPORT_ROW_SECTIONS[context['report_type']]
+        rows = self._iter_section_rows(context, sections)
+        
+        # Lê um chunk à frente para saber qual é o último; as linhas de
+        # ReportRows nunca ficam todas em memória
+        chunk_rows = list(islice(rows, self.chunk_size))
+        index = 0
+        while True:
+            next_rows = list(islice(rows, self.chunk_size))
+            chunk_context = dict(context)
+            for path in sections:
+                self._set_path(chunk_context, path, [row for row_path, row in chunk_rows if row_path == path])
+            chunk_context['is_first_chunk'] = index == 0
+            chunk_context['is_last_chunk'] = not next_rows
+            yield chunk_context
             
-            context = {
-                'vencimentos': vencimentos_data,
-                'today': today,
-                'thirty_days_limit': thirty_days,
-                'generated_at': timezone.now(),
-                'user': request.user,
-                'title': 'Relatório de Vencimentos',
-                'company_name': 'Sistema de Farmácia',
-                'report_type': 'expiration',
-            }
+            if not next_rows:
+                break
+            chunk_rows = next_rows
+            index += 1
+    
+    def _iter_section_rows(self, context: Dict, sections):
+        """Pares (seção, linha) de todas as seções, na ordem do documento"""
+        for path in sections:
+            for row in self._get_path(context, path):
+                yield path, row
+    
+    def _get_path(self, context: Dict, path: str):
+        value = context
+        for key in path.split('.'):
+            value = value.get(key, {})
+        return value or []
+    
+    def _set_path(self, context: Dict, path: str, value):
+        """Atribuir valor em caminho pontuado copiando os dicts intermediários"""
+        keys = path.split('.')
+        target = context
+        for key in keys[:-1]:
+            target[key] = dict(target.get(key, {}))
+            target = target[key]
+        target[keys[-1]] = value
+    
+    def _generate_response(self, report_type: str, request: HttpRequest) -> HttpResponse:
+        """
+        Gerar relatório dentro da requisição, com PDF de erro como fallback
+        """
+        try:
+            parts = self.generate_report(
+                report_type,
+                request.user,
+                base_url=request.build_absolute_uri()
+            )
+            content, filename = self.package_parts(report_type, parts)
+            logger.info(f"PDF gerado com sucesso: {filename}")
+            return self._pdf_response(content, filename)
             
-            if PDF_ENGINE == 'weasyprint':
-                return self._generate_with_weasyprint(request, context, 'reports/pdf/expiration_report.html')
-            else:
-                return self._generate_with_reportlab_expiration(context)
-                
         except Exception as e:
-            logger.error(f"Erro na geração do PDF de vencimentos: {str(e)}", exc_info=True)
-            return self._generate_error_pdf("Relatório de Vencimentos", str(e))
+            logger.error(f"Erro na geração do PDF ({report_type}): {str(e)}", exc_info=True)
+            return self._generate_error_pdf(REPORT_TITLES.get(report_type, report_type), str(e))
+    
+    def _pdf_response(self, pdf_bytes: bytes, filename: str) -> HttpResponse:
+        """
+        Preparar response de download do PDF
+        """
+        content_type = 'application/zip' if filename.endswith('.zip') else 'application/pdf'
+        response = HttpResponse(pdf_bytes, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
     
     def _get_stock_data_optimized(self) -> List[Dict]:
         """
@@ -192,37 +394,7 @@ class PDFGenerator:
         logger.debug("Buscando dados de estoque otimizados")
         
         try:
-            from apps.branches.models import BranchStock
-            from apps.inventory.models import Medication
-            
-            # Query otimizada usando BranchStock
-            medications = Medication.objects.select_related(
-                'category'
-            ).prefetch_related(
-                'branchstock_set'
-            ).annotate(
-                total_quantity=Sum('branchstock__quantity'),
-                total_reserved=Sum('branchstock__reserved_quantity')
-            ).filter(
-                is_active=True
-            ).order_by('name')
-            
-            # Converter para lista de dicts
-            result = []
-            for med in medications:
-                available = (med.total_quantity or 0) - (med.total_reserved or 0)
-                
-                result.append({
-                    'name': med.name,
-                    'category': med.category.name if med.category else 'N/A',
-                    'total_quantity': med.total_quantity or 0,
-                    'total_reserved': med.total_reserved or 0,
-                    'available_quantity': available,
-                    'minimum_stock': med.minimum_stock,
-                    'status': 'normal',
-                    'is_low_stock': available <= med.minimum_stock if med.minimum_stock else False,
-                })
-            
+            result = list(self.iter_stock_rows())
             logger.debug(f"Dados de estoque coletados: {len(result)} medicamentos")
             return result
             
@@ -230,62 +402,77 @@ class PDFGenerator:
             logger.error(f"Erro ao buscar dados de estoque: {str(e)}")
             return []
     
-    def _calculate_stock_metrics(self, medicamentos_data: List[Dict]) -> Dict:
+    def iter_stock_rows(self):
         """
-        Calcular métricas consolidadas do estoque
+        Linhas do relatório de estoque, lidas do banco em lotes de PDF_CHUNK_SIZE
         """
-        total_medications = len(medicamentos_data)
-        total_stock = sum(med['total_quantity'] for med in medicamentos_data)
-        total_available = sum(med['available_quantity'] for med in medicamentos_data)
-        total_reserved = sum(med['total_reserved'] for med in medicamentos_data)
+        from apps.inventory.models import Medication
         
-        expired_medications = sum(1 for med in medicamentos_data if med['status'] == 'expired')
-        near_expiry_medications = sum(1 for med in medicamentos_data if med['status'] == 'near_expiry')
-        low_stock_medications = sum(1 for med in medicamentos_data if med['is_low_stock'])
+        # Query otimizada usando BranchStock (values() evita instanciar modelos)
+        medications = Medication.objects.filter(
+            is_active=True
+        ).values(
+            'name', 'category__name', 'minimum_stock'
+        ).annotate(
+            total_quantity=Sum('branchstock__quantity'),
+            total_reserved=Sum('branchstock__reserved_quantity')
+        ).order_by('name')
         
-        return {
-            'total_medications': total_medications,
-            'total_stock': total_stock,
-            'total_available': total_available,
-            'total_reserved': total_reserved,
-            'expired_medications': expired_medications,
-            'near_expiry_medications': near_expiry_medications,
-            'low_stock_medications': low_stock_medications,
+        for med in medications.iterator(chunk_size=self.chunk_size):
+            total_quantity = med['total_quantity'] or 0
+            total_reserved = med['total_reserved'] or 0
+            available = total_quantity - total_reserved
+            
+            yield {
+                'name': med['name'],
+                'category': med['category__name'] or 'N/A',
+                'total_quantity': total_quantity,
+                'total_reserved': total_reserved,
+                'available_quantity': available,
+                'minimum_stock': med['minimum_stock'],
+                'status': 'normal',
+                'is_low_stock': available <= med['minimum_stock'] if med['minimum_stock'] else False,
+            }
+    
+    def _calculate_stock_metrics(self, medicamentos_data) -> Tuple[Dict, List[Dict]]:
+        """
+        Calcular métricas consolidadas do estoque e a lista de baixo estoque
+        numa única passagem pelas linhas
+        """
+        metrics = {
+            'total_medications': 0,
+            'total_stock': 0,
+            'total_available': 0,
+            'total_reserved': 0,
+            'expired_medications': 0,
+            'near_expiry_medications': 0,
+            'low_stock_medications': 0,
         }
+        low_stock = []
+        
+        for med in medicamentos_data:
+            metrics['total_medications'] += 1
+            metrics['total_stock'] += med['total_quantity']
+            metrics['total_available'] += med['available_quantity']
+            metrics['total_reserved'] += med['total_reserved']
+            if med['status'] == 'expired':
+                metrics['expired_medications'] += 1
+            elif med['status'] == 'near_expiry':
+                metrics['near_expiry_medications'] += 1
+            if med['is_low_stock']:
+                low_stock.append(med)
+        
+        metrics['low_stock_medications'] = len(low_stock)
+        return metrics, low_stock
     
-    def _get_movements_data_optimized(self, start_date, end_date) -> List[Dict]:
+    def _get_movements_data_optimized(self, start_date, end_date, branch_id=None) -> List[Dict]:
         """
         Buscar dados de movimentações com filtro de data
         """
         logger.debug(f"Buscando movimentações de {start_date} até {end_date}")
         
         try:
-            # Como não temos modelo de movimentação específico ainda,
-            # vou simular com transferências de estoque
-            from apps.branches.models import StockTransfer
-            
-            transfers = StockTransfer.objects.select_related(
-                'medication',
-                'from_branch',
-                'to_branch',
-                'requested_by'
-            ).filter(
-                requested_at__range=[start_date, end_date]
-            ).order_by('-requested_at')
-            
-            result = []
-            for transfer in transfers:
-                result.append({
-                    'date': transfer.requested_at,
-                    'type': 'transfer',
-                    'medication_name': transfer.medication.name,
-                    'quantity': transfer.quantity,
-                    'from_location': transfer.from_branch.name if transfer.from_branch else 'Estoque Geral',
-                    'to_location': transfer.to_branch.name if transfer.to_branch else 'Estoque Geral',
-                    'user': transfer.requested_by.get_full_name() or transfer.requested_by.username,
-                    'status': transfer.get_status_display(),
-                })
-            
+            result = list(self.iter_movement_rows(start_date, end_date, branch_id))
             logger.debug(f"Movimentações coletadas: {len(result)} registros")
             return result
             
@@ -293,82 +480,48 @@ class PDFGenerator:
             logger.error(f"Erro ao buscar movimentações: {str(e)}")
             return []
     
-    def _calculate_movement_stats(self, movimentacoes_data: List[Dict]) -> Dict:
+    def iter_movement_rows(self, start_date, end_date, branch_id=None):
         """
-        Calcular estatísticas das movimentações
+        Linhas do relatório de movimentações (razão do estoque geral e
+        transferências), lidas em lotes de PDF_CHUNK_SIZE
         """
-        total_movements = len(movimentacoes_data)
-        total_quantity = sum(mov['quantity'] for mov in movimentacoes_data)
-        
-        # Contar por status
-        completed = sum(1 for mov in movimentacoes_data if mov['status'] == 'Aprovado')
-        pending = sum(1 for mov in movimentacoes_data if mov['status'] == 'Pendente')
-        rejected = sum(1 for mov in movimentacoes_data if mov['status'] == 'Rejeitado')
+        from .movements import MovementsReport
         
-        return {
-            'total_movements': total_movements,
-            'total_quantity': total_quantity,
-            'completed_movements': completed,
-            'pending_movements': pending,
-            'rejected_movements': rejected,
-        }
+        movements_report = MovementsReport(start_date, end_date, branch_id)
+        return movements_report.iter_rows(chunk_size=self.chunk_size)
     
-    def _get_expiration_data_optimized(self, today, thirty_days_limit) -> Dict:
+    def _get_expiration_data_optimized(self, today, thirty_days_limit, stream_rows: bool = False) -> Dict:
         """
-        Buscar dados de vencimento otimizados (sem lotes)
+        Buscar dados de vencimento otimizados (sem lotes).
+        Com `stream_rows`, apenas os totais são calculados aqui e as seções
+        são ReportRows.
         """
         logger.debug(f"Buscando dados de vencimento até {thirty_days_limit}")
         
         try:
-            from apps.inventory.models import Stock
+            sections = {'expired': [], 'near_expiry': []}
+            counts = {'expired': 0, 'near_expiry': 0}
+            quantities = {'expired': 0, 'near_expiry': 0}
+            for row in self.iter_expiration_rows(today, thirty_days_limit):
+                situation = row['situation']
+                counts[situation] += 1
+                quantities[situation] += row['total_quantity']
+                if not stream_rows:
+                    sections[situation].append(row)
             
-            # Estoque vencido
-            expired_stocks = Stock.objects.select_related(
-                'medication', 'medication__category'
-            ).filter(
-                is_active=True,
-                expiry_date__lt=today
-            ).order_by('expiry_date')
-            
-            # Estoque próximo ao vencimento
-            near_expiry_stocks = Stock.objects.select_related(
-                'medication', 'medication__category'
-            ).filter(
-                is_active=True,
-                expiry_date__gte=today,
-                expiry_date__lte=thirty_days_limit
-            ).order_by('expiry_date')
-            
-            # Converter para formato otimizado
-            expired_data = []
-            for stock in expired_stocks:
-                if stock.quantity > 0:
-                    expired_data.append({
-                        'medication_name': stock.medication.name,
-                        'category': stock.medication.category.name if stock.medication.category else 'N/A',
-                        'expiry_date': stock.expiry_date,
-                        'total_quantity': stock.quantity,
-                        'days_expired': (today - stock.expiry_date).days,
-                    })
-            
-            near_expiry_data = []
-            for stock in near_expiry_stocks:
-                if stock.quantity > 0:
-                    near_expiry_data.append({
-                        'medication_name': stock.medication.name,
-                        'category': stock.medication.category.name if stock.medication.category else 'N/A',
-                        'expiry_date': stock.expiry_date,
-                        'total_quantity': stock.quantity,
-                        'days_until_expiry': (stock.expiry_date - today).days,
-                    })
+            if stream_rows:
+                sections = {
+                    situation: ReportRows(self.iter_expiration_rows, today, thirty_days_limit, situation)
+                    for situation in sections
+                }
             
             return {
-                'expired': expired_data,
-                'near_expiry': near_expiry_data,
-                'expired_count': len(expired_data),
-                'near_expiry_count': len(near_expiry_data),
-                'total_expired_quantity': sum(item['total_quantity'] for item in expired_data),
-                'total_near_expiry_quantity': sum(item['total_quantity'] for item in near_expiry_data),
+                'expired': sections['expired'],
+                'near_expiry': sections['near_expiry'],
+                'expired_count': counts['expired'],
+                'near_expiry_count': counts['near_expiry'],
+                'total_expired_quantity': quantities['expired'],
+                'total_near_expiry_quantity': quantities['near_expiry'],
             }
             
         except Exception as e:
@@ -382,49 +535,169 @@ class PDFGenerator:
                 'total_near_expiry_quantity': 0,
             }
     
-    def _generate_with_weasyprint(self, request: HttpRequest, context: Dict, template_name: str) -> HttpResponse:
+    def iter_expiration_rows(self, today, thirty_days_limit, situation: Optional[str] = None):
         """
-        Gerar PDF usando WeasyPrint (engine preferida)
+        Linhas do relatório de vencimentos: vencidos e depois próximos ao vencimento.
+        Cada linha traz 'situation' ('expired' ou 'near_expiry'); com `situation`,
+        apenas a seção pedida é consultada.
         """
+        from apps.inventory.models import Stock
+        
+        stocks = Stock.objects.select_related(
+            'medication', 'medication__category'
+        ).filter(
+            is_active=True,
+            quantity__gt=0
+        )
+        
+        # Estoque vencido
+        expired_stocks = stocks.filter(expiry_date__lt=today).order_by('expiry_date')
+        if situation == 'near_expiry':
+            expired_stocks = expired_stocks.none()
+        for stock in expired_stocks.iterator(chunk_size=self.chunk_size):
+            yield {
+                'situation': 'expired',
+                'medication_name': stock.medication.name,
+                'category': stock.medication.category.name if stock.medication.category else 'N/A',
+                'expiry_date': stock.expiry_date,
+                'total_quantity': stock.quantity,
+                'days_expired': (today - stock.expiry_date).days,
+            }
+        
+        # Estoque próximo ao vencimento
+        near_expiry_stocks = stocks.filter(
+            expiry_date__gte=today,
+            expiry_date__lte=thirty_days_limit
+        ).order_by('expiry_date')
+        if situation == 'expired':
+            near_expiry_stocks = near_expiry_stocks.none()
+        for stock in near_expiry_stocks.iterator(chunk_size=self.chunk_size):
+            yield {
+                'situation': 'near_expiry',
+                'medication_name': stock.medication.name,
+                'category': stock.medication.category.name if stock.medication.category else 'N/A',
+                'expiry_date': stock.expiry_date,
+                'total_quantity': stock.quantity,
+                'days_until_expiry': (stock.expiry_date - today).days,
+            }
+    
+    def _generate_with_weasyprint(self, context: Dict, template_name: str,
+                                  base_url: Optional[str] = None,
+                                  deadline: Optional[float] = None,
+                                  render_info: Optional[Dict] = None) -> List[bytes]:
+        """
+        Gerar PDF usando WeasyPrint (engine preferida).
+        Cada chunk de linhas vira um documento separado (o custo de layout de
+        uma tabela única cresce de forma superlinear); as páginas são unidas
+        em partes de até PDF_MAX_PAGES páginas. Com mais de um chunk, cada
+        documento começa a numeração após as páginas anteriores e o rodapé
+        omite o total, que só é conhecido no fim.
+        """
+        from weasyprint import CSS, HTML
+        
         logger.debug(f"Gerando PDF com WeasyPrint - template: {template_name}")
         
         try:
-            # Renderizar HTML
-            html_string = render_to_string(template_name, context)
+            # CSS otimizado para PDF (parseado uma vez por tipo)
+            css = self.get_stylesheet(context['report_type'])
             
-            # CSS otimizado para PDF
-            css_content = self._get_pdf_css(context['report_type'])
-            css = CSS(string=css_content, font_config=self.font_config)
-            
-            # Gerar PDF
-            html_doc = HTML(
-                string=html_string,
-                base_url=request.build_absolute_uri()
-            )
-            
-            pdf_buffer = io.BytesIO()
-            html_doc.write_pdf(
-                pdf_buffer,
-                stylesheets=[css],
-                font_config=self.font_config
-            )
-            
-            # Preparar response
-            pdf_buffer.seek(0)
-            response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
-            
-            # Nome do arquivo com timestamp
-            timestamp = timezone.localtime().strftime('%Y%m%d_%H%M%S')
-            filename = f"{context['report_type']}_{timestamp}.pdf"
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            parts = []
+            pages = []
+            total_pages = 0
+            document = None
+            for chunk_context in self._iter_row_chunks(context):
+                self._check_deadline(deadline)
+                
+                stylesheets = [css]
+                if not (chunk_context['is_first_chunk'] and chunk_context['is_last_chunk']):
+                    stylesheets.append(CSS(
+                        string=self._get_chunk_page_css(total_pages),
+                        font_config=self.get_font_config()
+                    ))
+                
+                html_string = render_to_string(template_name, chunk_context)
+                document = HTML(
+                    string=html_string,
+                    base_url=base_url or str(settings.BASE_DIR)
+                ).render(stylesheets=stylesheets, font_config=self.get_font_config())
+                pages.extend(document.pages)
+                total_pages += len(document.pages)
+                
+                while len(pages) >= self.max_pages:
+                    parts.append(document.copy(pages[:self.max_pages]).write_pdf())
+                    pages = pages[self.max_pages:]
             
-            logger.info(f"PDF gerado com sucesso: {filename}")
-            return response
+            if pages or not parts:
+                parts.append(document.copy(pages).write_pdf())
+            if render_info is not None:
+                render_info['pages'] = total_pages
+            return parts
             
+        except PDFGenerationError:
+            raise
         except Exception as e:
             logger.error(f"Erro no WeasyPrint: {str(e)}")
             raise PDFGenerationError(f"Falha na geração com WeasyPrint: {str(e)}")
     
+    def get_stylesheet(self, report_type: str):
+        """
+        CSS do WeasyPrint para o tipo de relatório, parseado uma única vez
+        """
+        stylesheet = self._stylesheets.get(report_type)
+        if stylesheet is None:
+            from weasyprint import CSS
+            
+            stylesheet = CSS(string=self._get_pdf_css(report_type), font_config=self.get_font_config())
+            self._stylesheets[report_type] = stylesheet
+        return stylesheet
+    
+    def warm_up(self) -> float:
+        """
+        Pré-aquecer a engine no início do processo: compilar templates, parsear
+        os CSS e fazer uma renderização mínima (carga de fontes/bibliotecas).
+        Retorna o tempo gasto em segundos.
+        """
+        engine = self.engine
+        if self.is_warm or not engine:
+            return 0.0
+        
+        started = time.monotonic()
+        try:
+            if engine == 'weasyprint':
+                from django.template.loader import get_template
+                from weasyprint import HTML
+                
+                for report_type, template_name in REPORT_TEMPLATES.items():
+                    get_template(template_name)
+                    self.get_stylesheet(report_type)
+                HTML(string='<p>PDF</p>').render(
+                    stylesheets=[self.get_stylesheet('stock')],
+                    font_config=self.get_font_config()
+                ).write_pdf()
+            else:
+                PagedCanvas('warm-up', self.max_pages).finish()
+            self.is_warm = True
+        except Exception as e:
+            logger.warning(f"Falha no pré-aquecimento da engine PDF: {str(e)}")
+        
+        elapsed = time.monotonic() - started
+        logger.info(f"Engine PDF ({engine}) pré-aquecida em {elapsed:.3f}s")
+        return elapsed
+    
+    def _get_chunk_page_css(self, previous_pages: int) -> str:
+        """
+        Numeração contínua entre chunks: a primeira página do documento recebe
+        o número seguinte às já renderizadas (counter(pages) é só do chunk)
+        """
+        return """
+        @page {
+            @bottom-center { content: "Página " counter(page); }
+        }
+        @page :first {
+            counter-set: page %d;
+        }
+        """ % (previous_pages + 1)
+    
     def _get_pdf_css(self, report_type: str) -> str:
         """
         CSS otimizado para diferentes tipos de relatório
@@ -585,43 +858,9 @@ class PDFGenerator:
         """
         Gerar PDF de erro quando a geração principal falha
         """
-        logger.warning(f"Gerando PDF de erro para: {report_title}")
-        
         try:
-            from reportlab.pdfgen import canvas
-            from reportlab.lib.pagesizes import A4
-            
-            buffer = io.BytesIO()
-            p = canvas.Canvas(buffer, pagesize=A4)
-            
-            # Header
-            p.setFont("Helvetica-Bold", 16)
-            p.drawString(100, 750, "ERRO NA GERAÇÃO DO RELATÓRIO")
-            
-            # Error details
-            p.setFont("Helvetica", 12)
-            p.drawString(100, 700, f"Relatório: {report_title}")
-            p.drawString(100, 670, f"Data: {timezone.localtime().strftime('%d/%m/%Y %H:%M:%S')}")
-            
-            # Error message (wrapped)
-            p.setFont("Helvetica", 10)
-            y_position = 630
-            lines = self._wrap_text(f"Erro: {error_message}", 60)
-            for line in lines:
-                p.drawString(100, y_position, line)
-                y_position -= 15
-            
-            # Support message
-            p.setFont("Helvetica-Bold", 12)
-            p.drawString(100, y_position - 30, "Entre em contato com o suporte técnico.")
-            
-            p.save()
-            
-            buffer.seek(0)
-            response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-            response['Content-Disposition'] = 'attachment; filename="erro_relatorio.pdf"'
-            
-            return response
+            pdf_bytes = self._render_error_pdf(report_title, error_message)
+            return self._pdf_response(pdf_bytes, "erro_relatorio.pdf")
             
         except Exception as e:
             logger.critical(f"Falha catastrófica na geração de PDF de erro: {str(e)}")
@@ -631,6 +870,43 @@ class PDFGenerator:
                 content_type='text/plain'
             )
     
+    def _render_error_pdf(self, report_title: str, error_message: str) -> bytes:
+        """
+        Renderizar os bytes do PDF de erro
+        """
+        logger.warning(f"Gerando PDF de erro para: {report_title}")
+        
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.pagesizes import A4
+        
+        buffer = io.BytesIO()
+        p = canvas.Canvas(buffer, pagesize=A4)
+        
+        # Header
+        p.setFont("Helvetica-Bold", 16)
+        p.drawString(100, 750, "ERRO NA GERAÇÃO DO RELATÓRIO")
+        
+        # Error details
+        p.setFont("Helvetica", 12)
+        p.drawString(100, 700, f"Relatório: {report_title}")
+        p.drawString(100, 670, f"Data: {timezone.localtime().strftime('%d/%m/%Y %H:%M:%S')}")
+        
+        # Error message (wrapped)
+        p.setFont("Helvetica", 10)
+        y_position = 630
+        lines = self._wrap_text(f"Erro: {error_message}", 60)
+        for line in lines:
+            p.drawString(100, y_position, line)
+            y_position -= 15
+        
+        # Support message
+        p.setFont("Helvetica-Bold", 12)
+        p.drawString(100, y_position - 30, "Entre em contato com o suporte técnico.")
+        
+        p.save()
+        
+        return buffer.getvalue()
+    
     def _wrap_text(self, text: str, line_length: int) -> List[str]:
         """
         Quebrar texto em linhas para PDFs simples
@@ -654,16 +930,15 @@ class PDFGenerator:
         
         return lines
 
-    def _generate_with_reportlab_stock(self, context: Dict) -> HttpResponse:
+    def _generate_with_reportlab_stock(self, context: Dict, deadline: Optional[float] = None,
+                                       render_info: Optional[Dict] = None) -> List[bytes]:
         """
         Gerar PDF de estoque usando ReportLab (fallback)
         """
-        from reportlab.pdfgen import canvas
         from reportlab.lib.pagesizes import A4
-        from reportlab.lib.units import mm
 
-        buffer = io.BytesIO()
-        c = canvas.Canvas(buffer, pagesize=A4)
+        paged = PagedCanvas(context.get('title', 'Relatório de Estoque'), self.max_pages, render_info)
+        c = paged.canvas
         width, height = A4
 
         # Cabeçalho
@@ -692,7 +967,7 @@ class PDFGenerator:
             c.drawString(30, y, f"{label}: {metrics.get(key, 0)}")
             y -= 14
 
-        # Tabela simples de medicamentos (top 100)
+        # Tabela de medicamentos
         y -= 10
         c.setFont("Helvetica-Bold", 11)
         c.drawString(30, y, "Medicamentos")
@@ -708,9 +983,12 @@ class PDFGenerator:
         c.line(28, y, width - 28, y)
         y -= 8
 
-        for med in context.get('medicamentos', [])[:100]:
+        for index, med in enumerate(context.get('medicamentos', [])):
+            if index % self.chunk_size == 0:
+                self._check_deadline(deadline)
             if y < 80:
-                c.showPage()
+                paged.show_page()
+                c = paged.canvas
                 y = height - 60
             c.setFont("Helvetica", 9)
             c.drawString(30, y, str(med.get('name', ''))[:28])
@@ -721,25 +999,17 @@ class PDFGenerator:
             c.drawString(500, y, str(med.get('status', 'normal')))
             y -= 12
 
-        c.showPage()
-        c.save()
-        buffer.seek(0)
+        return paged.finish()
 
-        timestamp = timezone.localtime().strftime('%Y%m%d_%H%M%S')
-        filename = f"stock_{timestamp}.pdf"
-        response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
-
-    def _generate_with_reportlab_movements(self, context: Dict) -> HttpResponse:
+    def _generate_with_reportlab_movements(self, context: Dict, deadline: Optional[float] = None,
+                                           render_info: Optional[Dict] = None) -> List[bytes]:
         """
         Gerar PDF de movimentações usando ReportLab (fallback)
         """
-        from reportlab.pdfgen import canvas
         from reportlab.lib.pagesizes import A4
 
-        buffer = io.BytesIO()
-        c = canvas.Canvas(buffer, pagesize=A4)
+        paged = PagedCanvas(context.get('title', 'Relatório de Movimentações'), self.max_pages, render_info)
+        c = paged.canvas
         width, height = A4
 
         # Cabeçalho
@@ -759,14 +1029,15 @@ class PDFGenerator:
         for label, key in [
             ("Total de Movimentações", 'total_movements'),
             ("Quantidade Total", 'total_quantity'),
-            ("Aprovadas", 'completed_movements'),
+            ("Concluídas", 'completed_movements'),
             ("Pendentes", 'pending_movements'),
-            ("Rejeitadas", 'rejected_movements'),
+            ("Em Trânsito", 'in_transit_movements'),
+            ("Canceladas", 'cancelled_movements'),
         ]:
             c.drawString(30, y, f"{label}: {stats.get(key, 0)}")
             y -= 14
 
-        # Lista simples (top 200)
+        # Lista de movimentações
         y -= 10
         c.setFont("Helvetica-Bold", 11)
         c.drawString(30, y, "Movimentações")
@@ -782,9 +1053,12 @@ class PDFGenerator:
         c.line(28, y, width - 28, y)
         y -= 8
 
-        for mov in context.get('movimentacoes', [])[:200]:
+        for index, mov in enumerate(context.get('movimentacoes', [])):
+            if index % self.chunk_size == 0:
+                self._check_deadline(deadline)
             if y < 80:
-                c.showPage()
+                paged.show_page()
+                c = paged.canvas
                 y = height - 60
             c.setFont("Helvetica", 9)
             date_str = getattr(mov.get('date'), 'strftime', lambda x: str(mov.get('date')))("%d/%m/%Y %H:%M") if mov.get('date') else ""
@@ -796,25 +1070,17 @@ class PDFGenerator:
             c.drawString(530, y, str(mov.get('status', ''))) 
             y -= 12
 
-        c.showPage()
-        c.save()
-        buffer.seek(0)
-
-        timestamp = timezone.localtime().strftime('%Y%m%d_%H%M%S')
-        filename = f"movements_{timestamp}.pdf"
-        response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        return paged.finish()
 
-    def _generate_with_reportlab_expiration(self, context: Dict) -> HttpResponse:
+    def _generate_with_reportlab_expiration(self, context: Dict, deadline: Optional[float] = None,
+                                            render_info: Optional[Dict] = None) -> List[bytes]:
         """
         Gerar PDF de vencimentos usando ReportLab (fallback)
         """
-        from reportlab.pdfgen import canvas
         from reportlab.lib.pagesizes import A4
 
-        buffer = io.BytesIO()
-        c = canvas.Canvas(buffer, pagesize=A4)
+        paged = PagedCanvas(context.get('title', 'Relatório de Vencimentos'), self.max_pages, render_info)
+        c = paged.canvas
         width, height = A4
 
         # Cabeçalho
@@ -824,63 +1090,44 @@ class PDFGenerator:
         c.drawString(30, height - 70, f"Data: {timezone.now().strftime('%d/%m/%Y %H:%M:%S')}")
 
         y = height - 100
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(30, y, "Lotes Vencidos")
-        y -= 18
-        c.setFont("Helvetica", 9)
-        c.drawString(30, y, "Medicamento")
-        c.drawString(300, y, "Categoria")
-        c.drawString(420, y, "Qtde")
-        c.drawString(470, y, "Vencimento")
-        y -= 12
-        c.line(28, y, width - 28, y)
-        y -= 8
-
-        for item in context.get('vencimentos', {}).get('expired', [])[:100]:
-            if y < 80:
-                c.showPage()
+        sections = [
+            ("Lotes Vencidos", context.get('vencimentos', {}).get('expired', [])),
+            ("Medicamentos Próximos ao Vencimento", context.get('vencimentos', {}).get('near_expiry', [])),
+        ]
+        for section_index, (section_title, items) in enumerate(sections):
+            if section_index > 0:
+                y -= 20
+            if y < 120:
+                paged.show_page()
+                c = paged.canvas
                 y = height - 60
+            c.setFont("Helvetica-Bold", 12)
+            c.drawString(30, y, section_title)
+            y -= 18
             c.setFont("Helvetica", 9)
-            c.drawString(30, y, str(item.get('medication_name', ''))[:40])
-            c.drawString(300, y, str(item.get('category', ''))[:18])
-            c.drawRightString(450, y, str(item.get('total_quantity', 0)))
-            c.drawString(470, y, str(item.get('expiry_date', '')))
+            c.drawString(30, y, "Medicamento")
+            c.drawString(300, y, "Categoria")
+            c.drawString(420, y, "Qtde")
+            c.drawString(470, y, "Vencimento")
             y -= 12
+            c.line(28, y, width - 28, y)
+            y -= 8
 
-        # Próximos ao vencimento
-        y -= 20
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(30, y, "Medicamentos Próximos ao Vencimento")
-        y -= 18
-        c.setFont("Helvetica", 9)
-        c.drawString(30, y, "Medicamento")
-        c.drawString(300, y, "Categoria")
-        c.drawString(420, y, "Qtde")
-        c.drawString(470, y, "Vencimento")
-        y -= 12
-        c.line(28, y, width - 28, y)
-        y -= 8
-
-        for item in context.get('vencimentos', {}).get('near_expiry', [])[:100]:
-            if y < 80:
-                c.showPage()
-                y = height - 60
-            c.setFont("Helvetica", 9)
-            c.drawString(30, y, str(item.get('medication_name', ''))[:40])
-            c.drawString(300, y, str(item.get('category', ''))[:18])
-            c.drawRightString(450, y, str(item.get('total_quantity', 0)))
-            c.drawString(470, y, str(item.get('expiry_date', '')))
-            y -= 12
+            for index, item in enumerate(items):
+                if index % self.chunk_size == 0:
+                    self._check_deadline(deadline)
+                if y < 80:
+                    paged.show_page()
+                    c = paged.canvas
+                    y = height - 60
+                c.setFont("Helvetica", 9)
+                c.drawString(30, y, str(item.get('medication_name', ''))[:40])
+                c.drawString(300, y, str(item.get('category', ''))[:18])
+                c.drawRightString(450, y, str(item.get('total_quantity', 0)))
+                c.drawString(470, y, str(item.get('expiry_date', '')))
+                y -= 12
 
-        c.showPage()
-        c.save()
-        buffer.seek(0)
-
-        timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"expiration_{timestamp}.pdf"
-        response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        return paged.finish()
 
 
 # Instância global do gerador
@@ -0,0 +1,263 @@
+"""
+Renderização de PDFs fora do processo web.
+
+A renderização (WeasyPrint/ReportLab) é CPU-bound e, no processo web, disputa
+o GIL com as demais requisições. O contexto já montado (consultas feitas no
+processo de origem) é enviado para outro processo:
+
+- 'process':    ProcessPoolExecutor com PDF_RENDER_WORKERS processos reutilizados.
+                O limite de tempo vale dentro do processo (SIGALRM); se ainda
+                assim o resultado não chegar, o pool é descartado e seus
+                processos encerrados, liberando as vagas;
+- 'subprocess': um processo novo por relatório, com limite de memória
+                (RLIMIT_AS = PDF_RENDER_MEMORY_LIMIT_MB) e encerrado à força ao
+                exceder PDF_GENERATION_TIMEOUT. Com PDF_RENDER_STANDBY
+                (desligado por padrão), o processo do próximo relatório já fica
+                iniciado e aquecido de reserva: um processo Django ocioso a mais
+                por processo web, trocado por ~1s a menos em cada relatório.
+
+Ambos retornam (partes, info) com 'pages' e 'peak_rss_kb'.
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import resource
+except ImportError:
+    # Windows: sem limites de recursos por processo
+    resource = None
+
+from django.conf import settings
+
+from .pdf_generator import pdf_generator, PDFGenerationError
+
+logger = logging.getLogger('apps.reports.pdf')
+
+# Folga sobre PDF_GENERATION_TIMEOUT para serialização e início do processo
+RESULT_GRACE_SECONDS = 15
+
+_executor = None
+_executor_lock = threading.Lock()
+_isolated_slots = None
+# Processos isolados já iniciados e aquecidos, aguardando o próximo relatório
+_standby = []
+
+
+def get_worker_count():
+    """Processos do pool (padrão: número de núcleos)"""
+    return getattr(settings, 'PDF_RENDER_WORKERS', None) or os.cpu_count() or 1
+
+
+def get_executor():
+    """Criar o pool sob demanda (um por processo)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # 'spawn' evita herdar conexões de banco e threads do processo web
+            _executor = ProcessPoolExecutor(
+                max_workers=get_worker_count(),
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(getattr(settings, 'PDF_PREWARM', True),)
+            )
+            logger.info(f"Pool de renderização iniciado com {get_worker_count()} processos")
+        return _executor
+
+
+def shutdown_executor(kill=False):
+    """
+    Descartar o pool atual (ex.: após um processo filho morrer). Com `kill`,
+    encerrar também os processos: um job travado continuaria ocupando a vaga.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is None:
+        return
+    processes = list((executor._processes or {}).values()) if kill else []
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.kill()
+
+
+def render(report_type, context, base_url=None):
+    """Renderizar no pool e aguardar as partes do PDF"""
+    timeout = pdf_generator.timeout
+    future = get_executor().submit(_render_in_worker, report_type, context, base_url, timeout)
+    try:
+        return future.result(timeout=timeout + RESULT_GRACE_SECONDS)
+    except FuturesTimeoutError:
+        # future.cancel() não interrompe um job em execução
+        logger.error(f"Renderização de {report_type} sem resposta após {timeout}s; recriando o pool")
+        shutdown_executor(kill=True)
+        raise PDFGenerationError(f"Tempo limite de {timeout}s excedido na geração do relatório")
+    except BrokenProcessPool:
+        logger.error("Pool de renderização quebrado; será recriado no próximo pedido")
+        shutdown_executor()
+        raise PDFGenerationError("Processo de renderização encerrado inesperadamente")
+
+
+def render_isolated(report_type, context, base_url=None):
+    """Renderizar num processo dedicado com limite de memória e de tempo"""
+    timeout = pdf_generator.timeout
+    memory_limit_mb = getattr(settings, 'PDF_RENDER_MEMORY_LIMIT_MB', 2048)
+    
+    with _get_isolated_slots():
+        process, parent_conn = _acquire_isolated_process()
+        # Preparar o processo do próximo relatório enquanto este renderiza
+        _replenish_standby()
+        try:
+            # O contexto vai pelo pipe: model instances só podem ser
+            # desserializadas depois do django.setup() no processo filho
+            parent_conn.send((report_type, context, base_url, timeout))
+            if not parent_conn.poll(timeout + RESULT_GRACE_SECONDS):
+                process.kill()
+                logger.error(f"Renderização de {report_type} encerrada após {timeout}s")
+                raise PDFGenerationError(f"Tempo limite de {timeout}s excedido na geração do relatório")
+            outcome, payload, render_info = parent_conn.recv()
+        except (EOFError, BrokenPipeError, ConnectionResetError):
+            process.join(5)
+            raise PDFGenerationError(
+                f"Processo de renderização encerrado inesperadamente (código {process.exitcode}); "
+                f"possível estouro do limite de {memory_limit_mb} MB"
+            )
+        except BaseException:
+            if process.is_alive():
+                process.kill()
+            process.join()
+            raise
+        finally:
+            parent_conn.close()
+    
+    # O encerramento do interpretador filho leva centenas de ms; não esperar
+    # por ele aqui (o processo é recolhido em _acquire_isolated_process)
+    
+    if outcome != 'ok':
+        raise PDFGenerationError(payload)
+    return payload, render_info
+
+
+def _start_isolated_process():
+    """Iniciar um processo isolado; ele configura o Django e aguarda o job no pipe"""
+    mp_context = multiprocessing.get_context('spawn')
+    parent_conn, child_conn = mp_context.Pipe()
+    process = mp_context.Process(
+        target=_isolated_main,
+        args=(
+            child_conn,
+            getattr(settings, 'PDF_RENDER_MEMORY_LIMIT_MB', 2048),
+            getattr(settings, 'PDF_PREWARM', True)
+        ),
+        name='pdf-render',
+        daemon=True
+    )
+    process.start()
+    child_conn.close()
+    return process, parent_conn
+
+
+def _acquire_isolated_process():
+    """Usar um processo de reserva já aquecido, ou iniciar um novo"""
+    # Recolher processos de renderizações anteriores que já terminaram
+    multiprocessing.active_children()
+    with _executor_lock:
+        while _standby:
+            process, parent_conn = _standby.pop()
+            if process.is_alive():
+                return process, parent_conn
+            parent_conn.close()
+    return _start_isolated_process()
+
+
+def _replenish_standby():
+    """Manter um processo isolado aquecido de reserva (com PDF_RENDER_STANDBY)"""
+    if not getattr(settings, 'PDF_RENDER_STANDBY', False):
+        return
+    with _executor_lock:
+        if _standby:
+            return
+    entry = _start_isolated_process()
+    with _executor_lock:
+        _standby.append(entry)
+
+
+def current_peak_rss_kb():
+    """Pico de memória residente do processo atual (KB no Linux)"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _get_isolated_slots():
+    """Limitar renderizações isoladas simultâneas a PDF_RENDER_WORKERS"""
+    global _isolated_slots
+    with _executor_lock:
+        if _isolated_slots is None:
+            _isolated_slots = threading.BoundedSemaphore(get_worker_count())
+        return _isolated_slots
+
+
+def _init_worker(prewarm=False):
+    """Configurar o Django no processo filho e, se pedido, pré-aquecer a engine"""
+    import django
+    django.setup()
+    if prewarm:
+        pdf_generator.warm_up()
+
+
+@contextmanager
+def _time_limit(seconds):
+    """
+    Interromper a renderização no próprio processo filho após `seconds`
+    (SIGALRM), inclusive entre as verificações de prazo do gerador
+    """
+    if not hasattr(signal, 'SIGALRM') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    
+    def on_alarm(signum, frame):
+        raise PDFGenerationError(f"Tempo limite de {seconds}s excedido na geração do relatório")
+    
+    previous_handler = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def _render_in_worker(report_type, context, base_url, timeout):
+    deadline = time.monotonic() + timeout
+    render_info = {}
+    with _time_limit(timeout):
+        parts = pdf_generator.render_pdf(report_type, context, base_url, deadline, render_info)
+    render_info['peak_rss_kb'] = current_peak_rss_kb()
+    return parts, render_info
+
+
+def _isolated_main(conn, memory_limit_mb, prewarm=False):
+    """Ponto de entrada do processo de renderização isolado"""
+    try:
+        if resource is not None and memory_limit_mb:
+            limit = memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        _init_worker(prewarm)
+        report_type, context, base_url, timeout = conn.recv()
+        parts, render_info = _render_in_worker(report_type, context, base_url, timeout)
+        conn.send(('ok', parts, render_info))
+    except MemoryError:
+        conn.send(('error', f"Limite de memória de {memory_limit_mb} MB excedido na geração do relatório", {}))
+    except Exception as e:
+        conn.send(('error', str(e), {}))
+    finally:
+        conn.close()
@@ -1,3 +1,650 @@
-from django.test import TestCase
+import json
+import multiprocessing
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.branches.models import Branch, BranchStock, StockTransfer
+from apps.inventory.models import Category, Medication, StockMovement
+from apps.suppliers.models import Supplier
+
+from . import jobs, render_pool
+from .exporters import EXPORT_COLUMNS, XLSX_AVAILABLE, ExportWriter, export_report
+from .models import Report
+from .movements import GENERAL_STOCK_LABEL, MovementPeriodError, MovementsReport, parse_period
+from .pdf_generator import PagedCanvas, PDFGenerationError, PDFGenerator, ReportRows, pdf_generator
+from .utils import PDFReportGenerator
+
+
+class ReportReuseTests(TestCase):
+    """Reaproveitamento de relatórios pela versão dos dados e líder único por chave"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, REPORT_JOB_BACKEND='worker')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('relatorios', password='senha-teste')
+
+    def complete(self, report):
+        report.file_path.save('estoque.pdf', ContentFile(b'%PDF-1.4'), save=False)
+        report.status = 'completed'
+        report.finished_at = timezone.now()
+        report.save()
+        jobs._resolve_followers(report)
+
+    def test_completed_report_reused_until_stock_version_changes(self):
+        leader = jobs.enqueue_report('stock', self.user)
+        self.assertIsNone(leader.source)
+        self.complete(leader)
+
+        cached = jobs.enqueue_report('stock', self.user)
+        self.assertEqual(cached.source, leader)
+        self.assertEqual(cached.status, 'completed')
+        self.assertEqual(cached.file_path.name, leader.file_path.name)
+
+        # Alteração de estoque: nova versão, nova chave e nova renderização
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Antibióticos')
+        fresh = jobs.enqueue_report('stock', self.user)
+        self.assertIsNone(fresh.source)
+        self.assertNotEqual(fresh.cache_key, leader.cache_key)
+
+    def test_request_during_rendering_follows_leader(self):
+        leader = jobs.enqueue_report('stock', self.user)
+        follower = jobs.enqueue_report('stock', self.user)
+        self.assertEqual(follower.source, leader)
+        self.assertEqual(follower.status, 'pending')
+
+        self.complete(leader)
+        follower.refresh_from_db()
+        self.assertEqual(follower.status, 'completed')
+
+    def test_one_inflight_leader_per_key_across_processes(self):
+        leader = jobs.enqueue_report('stock', self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Report.objects.create(title='Duplicado', report_type='stock', cache_key=leader.cache_key)
+
+        # Outro processo não viu o líder na busca: vira seguidor ao criar
+        real_find = jobs._find_reusable_report
+        with mock.patch.object(jobs, '_find_reusable_report', side_effect=[None, real_find(leader.cache_key)]):
+            report = jobs.enqueue_report('stock', self.user)
+        self.assertEqual(report.source, leader)
+
+    def test_stale_leader_releases_key(self):
+        leader = jobs.enqueue_report('stock', self.user)
+        Report.objects.filter(pk=leader.pk).update(created_at=timezone.now() - timedelta(hours=1))
+
+        report = jobs.enqueue_report('stock', self.user)
+        self.assertIsNone(report.source)
+        leader.refresh_from_db()
+        self.assertEqual(leader.status, 'failed')
+
+
+class ReportJobTests(TestCase):
+    """Ciclo do job (pending -> processing -> completed/failed) e download do arquivo"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            REPORT_JOB_BACKEND='worker',
+            PDF_RENDER_BACKEND='inline'
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = self.create_user('farmaceutico')
+
+    def create_user(self, role, username=None):
+        user = User.objects.create_user(username or role, password='senha-teste')
+        user.userprofile.role = role
+        user.userprofile.save()
+        return user
+
+    def render(self, **kwargs):
+        return mock.patch.object(jobs.pdf_generator, 'generate_report', **kwargs)
+
+    def test_job_runs_from_pending_to_completed(self):
+        report = jobs.enqueue_report('stock', self.user)
+        self.assertEqual(report.status, 'pending')
+
+        with self.render(return_value=[b'%PDF-1.4 estoque']):
+            processed = jobs.run_report_job(report.pk)
+
+        self.assertEqual(processed.status, 'completed')
+        self.assertIsNotNone(processed.finished_at)
+        with processed.file_path.open('rb') as pdf:
+            self.assertEqual(pdf.read(), b'%PDF-1.4 estoque')
+        # Já processado: não é reservado de novo
+        self.assertIsNone(jobs.run_report_job(report.pk))
+
+    def test_failed_render_fails_leader_and_followers(self):
+        leader = jobs.enqueue_report('stock', self.user)
+        follower = jobs.enqueue_report('stock', self.user)
+
+        with self.render(side_effect=PDFGenerationError('Tempo limite excedido')):
+            jobs.run_report_job(leader.pk)
+
+        for report in (leader, follower):
+            report.refresh_from_db()
+            self.assertEqual(report.status, 'failed')
+            self.assertEqual(report.error_message, 'Tempo limite excedido')
+        # O PDF de erro fica disponível para download
+        self.assertIn('erro_', leader.file_path.name)
+        self.assertEqual(follower.file_path.name, leader.file_path.name)
+
+        # Falhas não são reaproveitadas: novo pedido, nova renderização
+        self.assertIsNone(jobs.enqueue_report('stock', self.user).source)
+
+    def test_duplicate_request_follows_inflight_leader(self):
+        url = reverse('reports:stock_report_pdf')
+        self.client.force_login(self.user)
+
+        first = self.client.get(url, HTTP_ACCEPT='application/json')
+        second = self.client.get(url, HTTP_ACCEPT='application/json')
+
+        self.assertEqual((first.status_code, second.status_code), (202, 202))
+        follower = Report.objects.get(pk=second.json()['report_id'])
+        self.assertEqual(follower.source_id, first.json()['report_id'])
+        self.assertEqual(Report.objects.filter(source__isnull=True).count(), 1)
+
+    def test_download_waits_for_unfinished_job(self):
+        report = jobs.enqueue_report('stock', self.user)
+        url = reverse('reports:report_download', args=[report.pk])
+        self.client.force_login(self.user)
+
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['status'], 'pending')
+        self.assertRedirects(self.client.get(url), reverse('reports:report_detail', args=[report.pk]))
+
+    def test_download_restricted_to_owner_and_admins(self):
+        report = jobs.enqueue_report('stock', self.user)
+        with self.render(return_value=[b'%PDF-1.4 estoque']):
+            jobs.run_report_job(report.pk)
+        url = reverse('reports:report_download', args=[report.pk])
+
+        self.client.force_login(self.create_user('farmaceutico', 'outro'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        for user in (self.user, self.create_user('admin')):
+            self.client.force_login(user)
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 estoque')
+            self.assertIn('attachment', response['Content-Disposition'])
+
+
+def pdf_page_count(data):
+    return int(re.search(rb'/Count (\d+) /Kids', data).group(1))
+
+
+class ReportExportTests(TestCase):
+    """Exportação em streaming: uma linha do relatório por bloco da resposta"""
+
+    def setUp(self):
+        user = User.objects.create_user('exportacao', password='senha-teste')
+        user.userprofile.role = 'farmaceutico'
+        user.userprofile.save()
+        self.client.force_login(user)
+        category = Category.objects.create(name='Analgésicos')
+        supplier = Supplier.objects.create(name='Distribuidora')
+        for name in ('Dipirona', 'Amoxicilina', 'Paracetamol'):
+            Medication.objects.create(name=name, category=category, supplier=supplier, price=1, minimum_stock=5)
+
+    def test_csv_streamed_one_row_per_block(self):
+        response = self.client.get(reverse('reports:report_export', args=['stock', 'csv']))
+
+        self.assertTrue(response.streaming)
+        self.assertRegex(response['Content-Disposition'], r'^attachment; filename="stock_\d{8}_\d{6}\.csv"$')
+        blocks = list(response.streaming_content)
+        # BOM, cabeçalho e uma linha por medicamento
+        self.assertEqual(len(blocks), 5)
+        self.assertEqual(blocks[0], '\ufeff'.encode('utf-8'))
+        self.assertTrue(blocks[1].decode('utf-8').startswith('Medicamento;Categoria;'))
+        self.assertEqual(
+            [block.decode('utf-8').split(';')[0] for block in blocks[2:]],
+            ['Amoxicilina', 'Dipirona', 'Paracetamol']
+        )
+
+    def test_rows_read_only_while_streaming(self):
+        with self.assertNumQueries(0):
+            writer, content = export_report('stock', 'ndjson')
+        with self.assertNumQueries(1):
+            first = json.loads(next(content))
+            rest = [json.loads(line) for line in content]
+
+        self.assertEqual(first['name'], 'Amoxicilina')
+        self.assertEqual([row['name'] for row in rest], ['Dipirona', 'Paracetamol'])
+        self.assertEqual((first['total_quantity'], first['is_low_stock']), (0, True))
+
+    @skipUnless(XLSX_AVAILABLE, 'openpyxl não instalado')
+    def test_xlsx_export(self):
+        from openpyxl import load_workbook
+
+        writer, content = export_report('stock', 'xlsx')
+        sheet = load_workbook(BytesIO(b''.join(content)), read_only=True).active
+        rows = list(sheet.values)
+        self.assertEqual(rows[0][:2], ('Medicamento', 'Categoria'))
+        self.assertEqual([row[0] for row in rows[1:]], ['Amoxicilina', 'Dipirona', 'Paracetamol'])
+
+    def test_writer_base_requires_stream(self):
+        with self.assertRaises(TypeError):
+            ExportWriter(EXPORT_COLUMNS['stock'])
+
+    def test_unknown_format_not_found(self):
+        response = self.client.get(reverse('reports:report_export', args=['stock', 'pdf']))
+        self.assertEqual(response.status_code, 404)
+
+
+class MovementsReportTests(TestCase):
+    """Razão do estoque geral e transferências unidos (UNION ALL) no relatório de movimentações"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('movimentos', password='senha-teste')
+        self.user.userprofile.role = 'farmaceutico'
+        self.user.userprofile.save()
+        category = Category.objects.create(name='Analgésicos')
+        supplier = Supplier.objects.create(name='Distribuidora')
+        self.medication = Medication.objects.create(name='Dipirona', category=category, supplier=supplier, price=1)
+        self.centro = Branch.objects.create(name='Centro', code='CTR', address='-', phone='+5514999999999')
+        self.norte = Branch.objects.create(name='Norte', code='NRT', address='-', phone='+5514999999998')
+        self.now = timezone.now().replace(microsecond=0)
+
+        self.entrada = self.movement('entrada', 50, hours_ago=1)
+        self.saida = self.movement('saida', 5, hours_ago=3)
+        # Mesmo horário: desempate pelo id, do maior para o menor
+        self.ajuste = self.movement('ajuste', 2, hours_ago=3)
+        self.movement('entrada', 99, hours_ago=24 * 40)
+        self.pending = self.transfer(self.centro, self.norte, 10, 'pending', hours_ago=2)
+        self.completed = self.transfer(self.norte, self.centro, 4, 'completed', hours_ago=26)
+
+    def movement(self, movement_type, quantity, hours_ago):
+        movement = StockMovement.objects.create(
+            medication=self.medication, movement_type=movement_type, quantity=quantity, user=self.user
+        )
+        StockMovement.objects.filter(pk=movement.pk).update(created_at=self.now - timedelta(hours=hours_ago))
+        return movement
+
+    def transfer(self, from_branch, to_branch, quantity, status, hours_ago):
+        transfer = StockTransfer.objects.create(
+            from_branch=from_branch, to_branch=to_branch, medication=self.medication,
+            quantity=quantity, status=status, reason='-', requested_by=self.user
+        )
+        StockTransfer.objects.filter(pk=transfer.pk).update(requested_at=self.now - timedelta(hours=hours_ago))
+        return transfer
+
+    def report(self, **parameters):
+        return MovementsReport.from_parameters(dict({'days': 30}, **parameters))
+
+    def test_detail_mixes_ledger_and_transfers_newest_first(self):
+        rows = list(self.report().iter_rows(chunk_size=2))
+
+        self.assertEqual(
+            [(row['type'], row['quantity']) for row in rows],
+            [('entrada', 50), ('transfer', 10), ('ajuste', 2), ('saida', 5), ('transfer', 4)]
+        )
+        entrada, pending, ajuste, saida, completed = rows
+        self.assertEqual((entrada['from_location'], entrada['to_location']), ('-', GENERAL_STOCK_LABEL))
+        self.assertEqual((saida['from_location'], saida['to_location']), (GENERAL_STOCK_LABEL, '-'))
+        self.assertEqual((pending['from_location'], pending['to_location']), ('Centro', 'Norte'))
+        self.assertEqual((pending['status_code'], completed['status_code']), ('pending', 'completed'))
+        self.assertEqual(entrada['status_code'], 'registered')
+        self.assertEqual(entrada['user'], 'movimentos')
+
+    def test_pages_keep_order_across_boundaries(self):
+        report = self.report()
+        expected = [(row['type'], row['quantity']) for row in report.iter_rows()]
+
+        pages = [report.get_page(number, page_size=2) for number in (1, 2, 3)]
+        self.assertEqual(
+            [(row['type'], row['quantity']) for page in pages for row in page['rows']], expected
+        )
+        self.assertEqual([page['count'] for page in pages], [5, 5, 5])
+        self.assertEqual((pages[0]['num_pages'], pages[0]['has_previous'], pages[2]['has_next']), (3, False, False))
+        # Página fora do intervalo: a última
+        self.assertEqual(report.get_page(9, page_size=2)['number'], 3)
+
+    def test_branch_filter_keeps_only_its_transfers(self):
+        rows = list(self.report(branch_id=self.norte.pk).iter_rows())
+        self.assertEqual([row['quantity'] for row in rows], [10, 4])
+
+    def test_buckets_and_stats_aggregated_per_day_branch_and_type(self):
+        report = self.report()
+        buckets = {(bucket['branch'], bucket['type']): bucket for bucket in report.get_buckets()}
+
+        self.assertEqual(buckets[(GENERAL_STOCK_LABEL, 'entrada')]['total_quantity'], 50)
+        self.assertEqual(buckets[('Centro', 'transfer')]['total_quantity'], 10)
+        self.assertEqual(buckets[('Norte', 'transfer')]['total_quantity'], 4)
+        self.assertEqual(sum(bucket['movements'] for bucket in buckets.values()), 5)
+
+        stats = report.get_stats()
+        self.assertEqual((stats['total_movements'], stats['total_quantity']), (5, 71))
+        self.assertEqual((stats['completed_movements'], stats['pending_movements']), (4, 1))
+
+    def test_date_range_is_inclusive(self):
+        day = timezone.localtime(self.now - timedelta(hours=26)).date().isoformat()
+        rows = list(self.report(start_date=day, end_date=day).iter_rows())
+        self.assertIn(('transfer', 4), [(row['type'], row['quantity']) for row in rows])
+
+    def test_invalid_period_rejected(self):
+        for parameters in (
+            {'start_date': '2026-02-30'},
+            {'start_date': 'ontem'},
+            {'start_date': '2026-05-10', 'end_date': '2026-05-01'},
+            {'days': 0},
+            {'days': 'trinta'},
+        ):
+            with self.subTest(parameters):
+                with self.assertRaises(MovementPeriodError):
+                    parse_period(parameters)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('reports:api_movements'), {'start_date': '2026-13-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('start_date', response.json()['error'])
+
+    def test_api_returns_page_and_aggregates(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('reports:api_movements'), {'days': 30, 'page': 2, 'page_size': 2})
+
+        body = response.json()
+        self.assertEqual(body['page']['number'], 2)
+        self.assertEqual([row['quantity'] for row in body['page']['rows']], [2, 5])
+        self.assertEqual(body['stats']['total_movements'], 5)
+
+
+class PagedCanvasTests(TestCase):
+    """Divisão do PDF ReportLab em partes de no máximo max_pages páginas"""
+
+    def render(self, pages, max_pages=2, trailing_show_page=False):
+        render_info = {}
+        paged = PagedCanvas('Estoque', max_pages, render_info)
+        for page in range(pages):
+            if page:
+                paged.show_page()
+            paged.canvas.drawString(30, 800, f'Página {page + 1}')
+        if pages and trailing_show_page:
+            paged.show_page()
+        parts = paged.finish()
+        return [pdf_page_count(part) for part in parts], render_info['pages']
+
+    def test_exact_multiple_of_max_pages_has_no_empty_part(self):
+        self.assertEqual(self.render(4), ([2, 2], 4))
+        self.assertEqual(self.render(4, trailing_show_page=True), ([2, 2], 4))
+
+    def test_last_part_keeps_remaining_pages(self):
+        self.assertEqual(self.render(5), ([2, 2, 1], 5))
+        self.assertEqual(self.render(1, max_pages=1, trailing_show_page=True), ([1], 1))
+
+    def test_empty_report_is_one_blank_page(self):
+        self.assertEqual(self.render(0), ([1], 1))
+
+    def test_reportlab_rows_split_into_parts(self):
+        generator = PDFGenerator()
+        generator.max_pages = 1
+        render_info = {}
+        context = {
+            'report_type': 'stock',
+            'title': 'Estoque',
+            'metrics': {},
+            'medicamentos': [{'name': f'Medicamento {index}'} for index in range(120)],
+        }
+        parts = generator._generate_with_reportlab_stock(context, render_info=render_info)
+        self.assertEqual([pdf_page_count(part) for part in parts], [1] * render_info['pages'])
+        self.assertGreater(render_info['pages'], 1)
+
+
+class ChunkPageNumberingTests(TestCase):
+    """Numeração das páginas do WeasyPrint contínua entre chunks"""
+
+    def test_chunk_numbering_starts_after_previous_pages(self):
+        css = PDFGenerator()._get_chunk_page_css(previous_pages=12)
+        self.assertIn('counter-set: page 13;', css)
+        self.assertNotIn('counter(pages)', css)
+
+
+
+class FakeDocument:
+    """Documento renderizado do WeasyPrint: uma página por linha do chunk"""
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def copy(self, pages):
+        return FakeDocument(list(pages))
+
+    def write_pdf(self):
+        return ','.join(self.pages).encode()
+
+
+class WeasyPrintChunkTests(TestCase):
+    """Chunks do WeasyPrint: linhas lidas sob demanda e páginas unidas em partes"""
+
+    def setUp(self):
+        self.generator = PDFGenerator()
+        self.generator.chunk_size = 3
+        self.generator.max_pages = 4
+        self.rows_read = 0
+        self.rows_read_at_render = []
+
+        weasyprint = mock.Mock()
+        weasyprint.HTML.side_effect = lambda string, base_url: mock.Mock(render=lambda **kwargs: self.render(string))
+        patches = [
+            mock.patch.dict(sys.modules, {'weasyprint': weasyprint}),
+            mock.patch.object(self.generator, 'get_stylesheet', return_value='css'),
+            mock.patch.object(self.generator, 'get_font_config', return_value=None),
+            # HTML do chunk: os nomes das linhas, uma página por linha
+            mock.patch(
+                'apps.reports.pdf_generator.render_to_string',
+                side_effect=lambda template, context: ','.join(med['name'] for med in context['medicamentos'])
+            ),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.weasyprint = weasyprint
+
+    def render(self, html):
+        self.rows_read_at_render.append(self.rows_read)
+        return FakeDocument(html.split(',') if html else [])
+
+    def iter_rows(self, count):
+        for index in range(count):
+            self.rows_read += 1
+            yield {'name': f'm{index}'}
+
+    def context(self, count):
+        return {'report_type': 'stock', 'medicamentos': ReportRows(self.iter_rows, count)}
+
+    def test_chunk_pages_merged_into_parts_of_max_pages(self):
+        render_info = {}
+        parts = self.generator._generate_with_weasyprint(
+            self.context(10), 'reports/pdf/stock_report.html', render_info=render_info
+        )
+
+        # Chunks de 3 linhas (3+3+3+1 páginas) unidos em partes de até 4 páginas
+        self.assertEqual(parts, [b'm0,m1,m2,m3', b'm4,m5,m6,m7', b'm8,m9'])
+        self.assertEqual(render_info['pages'], 10)
+        # Cada documento continua a numeração das páginas anteriores
+        page_css = [call.kwargs['string'] for call in self.weasyprint.CSS.call_args_list]
+        self.assertEqual(page_css, [self.generator._get_chunk_page_css(pages) for pages in (0, 3, 6, 9)])
+
+    def test_rows_streamed_into_chunks(self):
+        self.generator._generate_with_weasyprint(self.context(10), 'reports/pdf/stock_report.html')
+
+        # No máximo o chunk atual e o seguinte lidos antes de cada renderização
+        self.assertEqual(self.rows_read_at_render, [6, 9, 10, 10])
+
+    def test_single_chunk_keeps_template_page_numbers(self):
+        parts = self.generator._generate_with_weasyprint(self.context(2), 'reports/pdf/stock_report.html')
+
+        self.assertEqual(parts, [b'm0,m1'])
+        self.weasyprint.CSS.assert_not_called()
+
+    def test_empty_report_renders_one_part(self):
+        parts = self.generator._generate_with_weasyprint(self.context(0), 'reports/pdf/stock_report.html')
+        self.assertEqual(parts, [b''])
+
+    def test_streamed_context_matches_materialized(self):
+        user = User.objects.create_user('contexto')
+        category = Category.objects.create(name='Analgésicos')
+        supplier = Supplier.objects.create(name='Distribuidora')
+        for index in range(3):
+            Medication.objects.create(
+                name=f'Medicamento {index}', category=category, supplier=supplier, price=1, minimum_stock=index
+            )
+
+        materialized = pdf_generator.build_context('stock', user, {})
+        streamed = pdf_generator.build_context('stock', user, {}, stream_rows=True)
+
+        self.assertIsInstance(streamed['medicamentos'], ReportRows)
+        self.assertEqual(list(streamed['medicamentos']), materialized['medicamentos'])
+        for key in ('metrics', 'low_stock_medicamentos'):
+            self.assertEqual(streamed[key], materialized[key])
+
+        expiration = pdf_generator.build_context('expiration', user, {}, stream_rows=True)['vencimentos']
+        self.assertEqual((list(expiration['expired']), expiration['expired_count']), ([], 0))
+
+class RenderStandbyTests(TestCase):
+    """Processo isolado de reserva só com PDF_RENDER_STANDBY"""
+
+    def setUp(self):
+        self.addCleanup(render_pool._standby.clear)
+        patcher = mock.patch.object(render_pool, '_start_isolated_process', return_value=('processo', 'pipe'))
+        self.start_process = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_no_standby_by_default(self):
+        render_pool._replenish_standby()
+        self.start_process.assert_not_called()
+        self.assertEqual(render_pool._standby, [])
+
+    @override_settings(PDF_RENDER_STANDBY=True)
+    def test_standby_kept_when_enabled(self):
+        render_pool._replenish_standby()
+        render_pool._replenish_standby()
+        self.start_process.assert_called_once()
+        self.assertEqual(render_pool._standby, [('processo', 'pipe')])
+
+
+class RenderTimeoutTests(TestCase):
+    """Job que excede PDF_GENERATION_TIMEOUT não continua ocupando o pool"""
+
+    def test_time_limit_interrupts_render_in_worker(self):
+        started = time.monotonic()
+        with self.assertRaises(PDFGenerationError):
+            with render_pool._time_limit(0.2):
+                time.sleep(5)
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_timeout_discards_pool_and_kills_workers(self):
+        render_pool._executor = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context('spawn')
+        )
+        self.addCleanup(render_pool.shutdown_executor, kill=True)
+        future = render_pool._executor.submit(time.sleep, 60)
+        with self.assertRaises(FuturesTimeoutError):
+            future.result(timeout=0.5)
+        processes = list(render_pool._executor._processes.values())
+
+        with mock.patch.object(render_pool, 'get_executor', return_value=render_pool._executor), \
+                mock.patch.object(render_pool, 'RESULT_GRACE_SECONDS', 0), \
+                mock.patch.object(render_pool.pdf_generator, 'timeout', 0.1), \
+                mock.patch.object(render_pool._executor, 'submit', return_value=future):
+            with self.assertRaises(PDFGenerationError):
+                render_pool.render('stock', {})
+
+        self.assertIsNone(render_pool._executor)
+        for process in processes:
+            process.join(5)
+            self.assertFalse(process.is_alive())
+
+
+class RenderIsolatedTests(TestCase):
+    """Renderização num processo dedicado ('subprocess'), com limite de memória"""
+
+    def test_renders_context_in_child_process(self):
+        user = User.objects.create_user('isolado')
+        context = pdf_generator.build_context('stock', user, {})
+
+        parts, render_info = render_pool.render_isolated('stock', context)
+
+        self.assertTrue(parts[0].startswith(b'%PDF'))
+        self.assertGreaterEqual(render_info['pages'], 1)
+        if render_pool.resource is not None:
+            self.assertGreater(render_info['peak_rss_kb'], 0)
+
+    def test_render_error_raised_in_parent(self):
+        with self.assertRaises(PDFGenerationError):
+            render_pool.render_isolated('inexistente', {})
+
+    @skipUnless(render_pool.resource is not None, 'RLIMIT_AS indisponível nesta plataforma')
+    @override_settings(PDF_RENDER_MEMORY_LIMIT_MB=40)
+    def test_memory_limit_stops_render(self):
+        with self.assertRaisesRegex(PDFGenerationError, '40 MB'):
+            render_pool.render_isolated('stock', {})
+
+
+class ReportLabStockReportTests(TestCase):
+    """Relatório de estoque do PDFReportGenerator: totais agregados no banco"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Analgésicos')
+        supplier = Supplier.objects.create(name='Distribuidora')
+        branches = [
+            Branch.objects.create(name=name, code=code, address='-', phone='+5514999999999')
+            for name, code in [('Centro', 'CTR'), ('Bairro', 'BRR')]
+        ]
+        # (estoque por filial, mínimo): cobre soma entre filiais, limite exato e sem estoque
+        for index, (quantities, minimum_stock) in enumerate([((8, 7), 10), ((5, 5), 10), ((3,), 10), ((), 0)]):
+            medication = Medication.objects.create(
+                name=f'Medicamento {index}', category=category, supplier=supplier, price=1,
+                minimum_stock=minimum_stock
+            )
+            for branch, quantity in zip(branches, quantities):
+                BranchStock.objects.create(branch=branch, medication=medication, quantity=quantity)
+
+    def test_rows_and_totals_match_per_medication_properties(self):
+        generator = PDFReportGenerator()
+        tables, info = [], {}
+        add_table = generator.add_table
+
+        def capture_table(story, header, rows, *args):
+            tables.append(list(rows))
+            add_table(story, header, tables[-1], *args)
+
+        generator.add_table = capture_table
+        generator.add_info_section = lambda story, data: info.update(data)
+
+        with self.assertNumQueries(1):
+            pdf = generator.generate_stock_report(Medication.objects.order_by('name'))
+
+        # Resultado anterior: current_stock e is_low_stock consultados linha a linha
+        expected = [
+            [med.name, med.category.name, str(med.current_stock), str(med.minimum_stock),
+             '⚠️ Baixo' if med.is_low_stock else '✅ OK']
+            for med in Medication.objects.order_by('name')
+        ]
+        self.assertEqual(tables, [expected])
+        self.assertEqual(info, {
+            'Total de Medicamentos': 4,
+            'Estoque Total': f"{sum(med.current_stock for med in Medication.objects.all())} unidades",
+            'Medicamentos com Estoque Baixo': sum(med.is_low_stock for med in Medication.objects.all()),
+        })
+        self.assertTrue(pdf.getvalue().startswith(b'%PDF'))
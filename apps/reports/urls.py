@@ -8,12 +8,16 @@ urlpatterns = [
     path('generate/', views.report_generate, name='report_generate'),
     path('<int:pk>/', views.report_detail, name='report_detail'),
     path('<int:pk>/download/', views.report_download, name='report_download'),
+    path('<int:pk>/status/', views.report_status, name='report_status'),
     
     # Relatórios específicos - Nova implementação robusta
     path('stock/pdf/', views.stock_report_pdf, name='stock_report_pdf'),
     path('movements/pdf/', views.movements_report_pdf, name='movements_report_pdf'),
     path('expiration/pdf/', views.expiration_report_pdf, name='expiration_report_pdf'),
     
+    # Exportação tabular (CSV, XLSX, NDJSON)
+    path('<slug:report_type>/export/<slug:export_format>/', views.report_export, name='report_export'),
+    
     # URLs de compatibilidade (redirecionam para novas implementações)
     path('stock/', views.stock_report, name='stock_report'),
     path('movements/', views.movement_report, name='movement_report'),
@@ -21,4 +25,5 @@ urlpatterns = [
     
     # API endpoints
     path('api/pdf-status/', views.pdf_status_check, name='pdf_status_check'),
+    path('api/movements/', views.api_movements, name='api_movements'),
 ]
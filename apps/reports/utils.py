@@ -1,5 +1,7 @@
 from io import BytesIO
-from datetime import datetime
+from datetime import datetime, timedelta
+from django.db.models import Count, IntegerField, Q, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.http import HttpResponse
 from django.template.loader import get_template
@@ -15,8 +17,19 @@ from reportlab.graphics.charts.linecharts import HorizontalLineChart
 from reportlab.lib.colors import HexColor
 
 
+# Linhas por tabela Platypus: tabelas menores são divididas entre páginas
+# sem recalcular o layout de todas as linhas anteriores
+TABLE_CHUNK_ROWS = 500
+
+
 class PDFReportGenerator:
-    """Gerador de relatórios em PDF para o sistema de farmácia"""
+    """
+    Gerador de relatórios em PDF para o sistema de farmácia.
+    
+    Os relatórios recebem querysets (padrão: todos os registros) e leem apenas
+    as colunas necessárias via values(); totais são agregados no banco, com um
+    número fixo de consultas independentemente da quantidade de linhas.
+    """
     
     def __init__(self):
         self.styles = getSampleStyleSheet()
@@ -85,8 +98,75 @@ class PDFReportGenerator:
         story.append(info_table)
         story.append(Spacer(1, 20))
     
-    def generate_stock_report(self, medications):
+    def add_table(self, story, header, rows, col_widths, style_commands):
+        """
+        Adicionar tabela a partir de um iterador de linhas, em blocos de
+        TABLE_CHUNK_ROWS (o cabeçalho se repete em cada bloco e página)
+        """
+        chunk = [header]
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) > TABLE_CHUNK_ROWS:
+                story.append(self._build_table(chunk, col_widths, style_commands))
+                chunk = [header]
+        if len(chunk) > 1:
+            story.append(self._build_table(chunk, col_widths, style_commands))
+    
+    def _build_table(self, data, col_widths, style_commands):
+        table = Table(data, colWidths=col_widths, repeatRows=1)
+        table.setStyle(TableStyle(style_commands))
+        return table
+    
+    def generate_stock_report(self, medications=None):
         """Gerar relatório de estoque"""
+        from apps.inventory.models import Medication
+        
+        if medications is None:
+            medications = Medication.objects.all()
+        
+        # Uma consulta: estoque somado por medicamento no banco
+        rows = medications.annotate(
+            stock_total=Coalesce(Sum('branchstock__quantity'), Value(0), output_field=IntegerField())
+        ).values_list('name', 'category__name', 'stock_total', 'minimum_stock').iterator(chunk_size=TABLE_CHUNK_ROWS)
+        
+        totals = {'medications': 0, 'stock': 0, 'low_stock': 0}
+        
+        def table_rows():
+            for name, category_name, stock_total, minimum_stock in rows:
+                is_low_stock = stock_total <= minimum_stock
+                totals['medications'] += 1
+                totals['stock'] += stock_total
+                totals['low_stock'] += is_low_stock
+                yield [
+                    name,
+                    category_name,
+                    str(stock_total),
+                    str(minimum_stock),
+                    "⚠️ Baixo" if is_low_stock else "✅ OK"
+                ]
+        
+        # Tabela montada primeiro: os totais saem da mesma leitura
+        details = []
+        details.append(Paragraph("Detalhes do Estoque", self.create_subheader_style()))
+        self.add_table(
+            details,
+            ['Medicamento', 'Categoria', 'Estoque Atual', 'Estoque Mínimo', 'Status'],
+            table_rows(),
+            [2.5*inch, 1.5*inch, 1*inch, 1*inch, 1*inch],
+            [
+                ('BACKGROUND', (0, 0), (-1, 0), self.primary_color),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, 0), 12),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+                ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ]
+        )
+        
         buffer = BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=A4)
         story = []
@@ -95,58 +175,40 @@ class PDFReportGenerator:
         self.add_header(
             story, 
             "Relatório de Estoque de Medicamentos",
-            f"Total de medicamentos: {len(medications)}"
+            f"Total de medicamentos: {totals['medications']}"
         )
         
         # Informações gerais
-        total_stock = sum(med.current_stock for med in medications)
-        low_stock_count = sum(1 for med in medications if med.is_low_stock)
-        
         self.add_info_section(story, {
-            'Total de Medicamentos': len(medications),
-            'Estoque Total': f"{total_stock} unidades",
-            'Medicamentos com Estoque Baixo': low_stock_count
+            'Total de Medicamentos': totals['medications'],
+            'Estoque Total': f"{totals['stock']} unidades",
+            'Medicamentos com Estoque Baixo': totals['low_stock']
         })
         
-        # Tabela de medicamentos
-        subheader_style = self.create_subheader_style()
-        story.append(Paragraph("Detalhes do Estoque", subheader_style))
-        
-        data = [['Medicamento', 'Categoria', 'Estoque Atual', 'Estoque Mínimo', 'Status']]
-        
-        for med in medications:
-            status = "⚠️ Baixo" if med.is_low_stock else "✅ OK"
-            data.append([
-                med.name,
-                med.category.name,
-                str(med.current_stock),
-                str(med.minimum_stock),
-                status
-            ])
-        
-        table = Table(data, colWidths=[2.5*inch, 1.5*inch, 1*inch, 1*inch, 1*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), self.primary_color),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ]))
-        
-        story.append(table)
+        story.extend(details)
         
         # Construir PDF
         doc.build(story)
         buffer.seek(0)
         return buffer
     
-    def generate_expiry_report(self, stock_items):
+    def generate_expiry_report(self, stock_items=None):
         """Gerar relatório de vencimentos"""
+        from apps.inventory.models import Stock
+        
+        if stock_items is None:
+            stock_items = Stock.objects.all()
+        
+        today = timezone.now().date()
+        near_expiry_limit = today + timedelta(days=30)
+        
+        # Contagens por situação numa única agregação
+        totals = stock_items.aggregate(
+            total=Count('id'),
+            expired=Count('id', filter=Q(expiry_date__lt=today)),
+            near_expiry=Count('id', filter=Q(expiry_date__gte=today, expiry_date__lte=near_expiry_limit)),
+        )
+        
         buffer = BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=A4)
         story = []
@@ -155,78 +217,85 @@ class PDFReportGenerator:
         self.add_header(
             story,
             "Relatório de Vencimentos",
-            f"Total de lotes: {len(stock_items)}"
+            f"Total de lotes: {totals['total']}"
         )
         
-        # Separar por status
-        expired = [item for item in stock_items if item.is_expired]
-        near_expiry = [item for item in stock_items if item.is_near_expiry and not item.is_expired]
-        
         self.add_info_section(story, {
-            'Total de Lotes': len(stock_items),
-            'Lotes Vencidos': len(expired),
-            'Próximos ao Vencimento': len(near_expiry)
+            'Total de Lotes': totals['total'],
+            'Lotes Vencidos': totals['expired'],
+            'Próximos ao Vencimento': totals['near_expiry']
         })
         
+        subheader_style = self.create_subheader_style()
+        header = ['Medicamento', 'Quantidade', 'Data de Vencimento']
+        
         # Medicamentos vencidos
-        if expired:
-            subheader_style = self.create_subheader_style()
+        if totals['expired']:
             story.append(Paragraph("🚨 Medicamentos Vencidos", subheader_style))
-            
-            data = [['Medicamento', 'Quantidade', 'Data de Vencimento']]
-            for item in expired:
-                data.append([
-                    item.medication.name,
-                    str(item.quantity),
-                    item.expiry_date.strftime('%d/%m/%Y')
-                ])
-            
-            table = Table(data, colWidths=[2.5*inch, 1.5*inch, 1*inch, 1.5*inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), self.danger_color),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ]))
-            
-            story.append(table)
+            self.add_table(
+                story,
+                header,
+                self._expiry_rows(stock_items.filter(expiry_date__lt=today)),
+                [2.5*inch, 1.5*inch, 1.5*inch],
+                [
+                    ('BACKGROUND', (0, 0), (-1, 0), self.danger_color),
+                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+                    ('FONTSIZE', (0, 1), (-1, -1), 9),
+                ]
+            )
             story.append(Spacer(1, 20))
         
         # Próximos ao vencimento
-        if near_expiry:
+        if totals['near_expiry']:
             story.append(Paragraph("⚠️ Próximos ao Vencimento (30 dias)", subheader_style))
-            
-            data = [['Medicamento', 'Quantidade', 'Data de Vencimento']]
-            for item in near_expiry:
-                data.append([
-                    item.medication.name,
-                    str(item.quantity),
-                    item.expiry_date.strftime('%d/%m/%Y')
-                ])
-            
-            table = Table(data, colWidths=[3*inch, 1*inch, 2*inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), self.warning_color),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ]))
-            
-            story.append(table)
+            self.add_table(
+                story,
+                header,
+                self._expiry_rows(stock_items.filter(expiry_date__gte=today, expiry_date__lte=near_expiry_limit)),
+                [3*inch, 1*inch, 2*inch],
+                [
+                    ('BACKGROUND', (0, 0), (-1, 0), self.warning_color),
+                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+                    ('FONTSIZE', (0, 1), (-1, -1), 9),
+                ]
+            )
         
         # Construir PDF
         doc.build(story)
         buffer.seek(0)
         return buffer
     
-    def generate_movement_report(self, movements):
+    def _expiry_rows(self, stock_items):
+        """Linhas (medicamento, quantidade, vencimento) lidas em lotes"""
+        rows = stock_items.order_by('expiry_date').values_list(
+            'medication__name', 'quantity', 'expiry_date'
+        ).iterator(chunk_size=TABLE_CHUNK_ROWS)
+        for medication_name, quantity, expiry_date in rows:
+            yield [medication_name, str(quantity), expiry_date.strftime('%d/%m/%Y')]
+    
+    def generate_movement_report(self, movements=None):
         """Gerar relatório de movimentações"""
+        from apps.inventory.models import StockMovement
+        
+        if movements is None:
+            movements = StockMovement.objects.all()
+        
+        # Resumo por tipo
+        totals = movements.aggregate(
+            total=Count('id'),
+            entradas=Count('id', filter=Q(movement_type='entrada')),
+            saidas=Count('id', filter=Q(movement_type='saida')),
+        )
+        type_labels = dict(StockMovement.MOVEMENT_TYPES)
+        
         buffer = BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=A4)
         story = []
@@ -235,49 +304,50 @@ class PDFReportGenerator:
         self.add_header(
             story,
             "Relatório de Movimentações",
-            f"Total de movimentações: {len(movements)}"
+            f"Total de movimentações: {totals['total']}"
         )
         
-        # Resumo por tipo
-        entrada_count = len([m for m in movements if m.movement_type == 'entrada'])
-        saida_count = len([m for m in movements if m.movement_type == 'saida'])
-        
         self.add_info_section(story, {
-            'Total de Movimentações': len(movements),
-            'Entradas': entrada_count,
-            'Saídas': saida_count
+            'Total de Movimentações': totals['total'],
+            'Entradas': totals['entradas'],
+            'Saídas': totals['saidas']
         })
         
         # Tabela de movimentações
         subheader_style = self.create_subheader_style()
         story.append(Paragraph("Histórico de Movimentações", subheader_style))
         
-        data = [['Data', 'Medicamento', 'Tipo', 'Quantidade', 'Usuário']]
-        
-        for movement in movements:
-            movement_type = movement.get_movement_type_display()
-            quantity_str = f"+{movement.quantity}" if movement.movement_type == 'entrada' else f"-{movement.quantity}"
-            
-            data.append([
-                movement.created_at.strftime('%d/%m/%Y'),
-                movement.medication.name,
-                movement_type,
-                quantity_str,
-                movement.user.get_full_name() or movement.user.username
-            ])
-        
-        table = Table(data, colWidths=[1*inch, 2*inch, 1*inch, 1*inch, 1.5*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), self.primary_color),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-        ]))
+        rows = movements.values_list(
+            'created_at', 'medication__name', 'movement_type', 'quantity',
+            'user__username', 'user__first_name', 'user__last_name'
+        ).iterator(chunk_size=TABLE_CHUNK_ROWS)
+        
+        def table_rows():
+            for created_at, medication_name, movement_type, quantity, username, first_name, last_name in rows:
+                quantity_str = f"+{quantity}" if movement_type == 'entrada' else f"-{quantity}"
+                yield [
+                    timezone.localtime(created_at).strftime('%d/%m/%Y'),
+                    medication_name,
+                    type_labels.get(movement_type, movement_type),
+                    quantity_str,
+                    f"{first_name} {last_name}".strip() or username
+                ]
         
-        story.append(table)
+        self.add_table(
+            story,
+            ['Data', 'Medicamento', 'Tipo', 'Quantidade', 'Usuário'],
+            table_rows(),
+            [1*inch, 2*inch, 1*inch, 1*inch, 1.5*inch],
+            [
+                ('BACKGROUND', (0, 0), (-1, 0), self.primary_color),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+                ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ]
+        )
         
         # Construir PDF
         doc.build(story)
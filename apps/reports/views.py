@@ -1,14 +1,18 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, FileResponse, StreamingHttpResponse, Http404
+from django.urls import reverse
 from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 from datetime import timedelta
 import logging
+import os
 
 from .models import Report
-from .pdf_generator import pdf_generator, PDFGenerationError
+from .jobs import enqueue_report, ReportQueueFull
+from .exporters import export_report, ExportError, EXPORT_WRITERS
+from .movements import MovementsReport, MovementPeriodError, DEFAULT_PAGE_SIZE
 from apps.authentication.decorators import farmaceutico_required, admin_required
 
 # Logger para views de relatórios
@@ -19,7 +23,10 @@ logger = logging.getLogger(__name__)
 def report_list(request):
     """Lista de relatórios"""
     reports = Report.objects.filter(generated_by=request.user).order_by('-created_at')
-    context = {'reports': reports}
+    context = {
+        'reports': reports,
+        'export_formats': list(EXPORT_WRITERS),
+    }
     return render(request, 'reports/report_list.html', context)
 
 
@@ -34,136 +41,182 @@ def report_generate(request):
     return render(request, 'reports/report_generate.html')
 
 
+def _get_user_report(request, pk):
+    """Buscar relatório do usuário (administradores acessam todos)"""
+    report = get_object_or_404(Report.objects.select_related('generated_by'), pk=pk)
+    user_profile = getattr(request, 'user_profile', None)
+    if report.generated_by_id != request.user.pk and not (user_profile and user_profile.is_admin):
+        raise Http404("Relatório não encontrado")
+    return report
+
+
+def _report_status_payload(report):
+    """Dados de status do job para polling do frontend"""
+    payload = {
+        'report_id': report.pk,
+        'status': report.status,
+        'status_display': report.get_status_display(),
+        'status_url': reverse('reports:report_status', args=[report.pk]),
+        'detail_url': reverse('reports:report_detail', args=[report.pk]),
+    }
+    # Jobs com falha trazem o PDF de erro
+    if report.is_finished and report.file_path:
+        payload['download_url'] = reverse('reports:report_download', args=[report.pk])
+    if report.status == 'failed':
+        payload['error'] = report.error_message
+    return payload
+
+
+def _wants_json(request):
+    """Requisição feita via fetch/AJAX pelo frontend"""
+    return (
+        request.headers.get('x-requested-with') == 'XMLHttpRequest'
+        or 'application/json' in request.headers.get('accept', '')
+    )
+
+
 @login_required
 def report_detail(request, pk):
     """Detalhes do relatório"""
-    report = get_object_or_404(Report, pk=pk)
-    context = {'report': report}
+    report = _get_user_report(request, pk)
+    context = {
+        'report': report,
+        'status_payload': _report_status_payload(report),
+    }
     return render(request, 'reports/report_detail.html', context)
 
 
+@login_required
+@require_http_methods(["GET"])
+def report_status(request, pk):
+    """Status do job de geração (consultado periodicamente pela interface)"""
+    report = _get_user_report(request, pk)
+    return JsonResponse(_report_status_payload(report))
+
+
 @login_required
 def report_download(request, pk):
     """Download do relatório"""
-    report = get_object_or_404(Report, pk=pk)
-    # Lógica para download
-    return HttpResponse("Download do relatório em desenvolvimento")
+    report = _get_user_report(request, pk)
+    
+    if not report.is_finished or not report.file_path:
+        if _wants_json(request):
+            return JsonResponse(_report_status_payload(report), status=409)
+        messages.info(request, 'O relatório ainda não está pronto para download.')
+        return redirect('reports:report_detail', pk=pk)
+    
+    try:
+        report_file = report.file_path.open('rb')
+    except FileNotFoundError:
+        logger.error(f"Arquivo do relatório {pk} não encontrado: {report.file_path.name}")
+        raise Http404("Arquivo do relatório não encontrado")
+    
+    return FileResponse(
+        report_file,
+        as_attachment=True,
+        filename=os.path.basename(report.file_path.name),
+        content_type='application/zip' if report.file_path.name.endswith('.zip') else 'application/pdf'
+    )
 
 
 # ===============================
 # 📊 VIEWS ROBUSTAS PARA GERAÇÃO DE PDFs
 # ===============================
 
+def _report_parameters(request):
+    """
+    Parâmetros do relatório a partir da query string: 'days' ou o intervalo
+    'start_date'/'end_date' (AAAA-MM-DD) e, nas movimentações, 'branch'
+    """
+    parameters = {}
+    if request.GET.get('days', '').isdigit():
+        parameters['days'] = int(request.GET['days'])
+    for name in ('start_date', 'end_date'):
+        if request.GET.get(name):
+            parameters[name] = request.GET[name]
+    if request.GET.get('branch', '').isdigit():
+        parameters['branch_id'] = int(request.GET['branch'])
+    return parameters
+
+
+def _enqueue_report_response(request, report_type, parameters=None):
+    """Enfileirar relatório e responder com o status do job (JSON) ou a página de detalhes"""
+    try:
+        report = enqueue_report(report_type, request.user, parameters)
+    except ReportQueueFull as e:
+        logger.info(f"Relatório {report_type} recusado para {request.user.username}: {str(e)}")
+        if _wants_json(request):
+            response = JsonResponse({'error': str(e), 'retry_after': e.retry_after}, status=e.status_code)
+        else:
+            response = HttpResponse(str(e), status=e.status_code, content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = str(e.retry_after)
+        return response
+    
+    if _wants_json(request):
+        return JsonResponse(_report_status_payload(report), status=202)
+    
+    messages.info(request, 'Relatório enviado para a fila de geração. O download ficará disponível nesta página.')
+    return redirect('reports:report_detail', pk=report.pk)
+
+
 @farmaceutico_required
 @require_http_methods(["GET"])
 def stock_report_pdf(request):
     """
-    Gerar relatório de estoque em PDF - Nova implementação robusta
+    Enfileirar relatório de estoque em PDF
     """
     logger.info(f"Usuário {request.user.username} solicitou relatório de estoque PDF")
-    
-    try:
-        # Usar o gerador robusto
-        response = pdf_generator.generate_stock_report_pdf(request)
-        
-        # Registrar no banco apenas se geração foi bem-sucedida
-        try:
-            Report.objects.create(
-                title=f"Relatório de Estoque - {timezone.localtime().strftime('%d/%m/%Y %H:%M')}",
-                report_type='stock',
-                generated_by=request.user,
-                description="Relatório completo de estoque com métricas consolidadas",
-                status='completed'
-            )
-        except Exception as db_error:
-            logger.warning(f"Erro ao registrar relatório no banco: {db_error}")
-            # Não falhar a resposta por causa do registro
-        
-        logger.info(f"Relatório de estoque gerado com sucesso para {request.user.username}")
-        return response
-        
-    except PDFGenerationError as e:
-        logger.error(f"Erro na geração do PDF de estoque: {str(e)}")
-        messages.error(request, f"Erro ao gerar relatório: {str(e)}")
-        return redirect('reports:report_list')
-    except Exception as e:
-        logger.error(f"Erro inesperado na geração do PDF de estoque: {str(e)}", exc_info=True)
-        messages.error(request, "Erro inesperado ao gerar relatório. Tente novamente.")
-        return redirect('reports:report_list')
+    return _enqueue_report_response(request, 'stock')
 
 
 @farmaceutico_required
 @require_http_methods(["GET"])
 def movements_report_pdf(request):
     """
-    Gerar relatório de movimentações em PDF - Nova implementação robusta
+    Enfileirar relatório de movimentações em PDF
     """
     logger.info(f"Usuário {request.user.username} solicitou relatório de movimentações PDF")
-    
+    parameters = _report_parameters(request)
     try:
-        # Usar o gerador robusto
-        response = pdf_generator.generate_movements_report_pdf(request)
-        
-        # Registrar no banco
-        try:
-            Report.objects.create(
-                title=f"Relatório de Movimentações - {timezone.localtime().strftime('%d/%m/%Y %H:%M')}",
-                report_type='movements',
-                generated_by=request.user,
-                description="Relatório de movimentações dos últimos 30 dias",
-                status='completed'
-            )
-        except Exception as db_error:
-            logger.warning(f"Erro ao registrar relatório no banco: {db_error}")
-        
-        logger.info(f"Relatório de movimentações gerado com sucesso para {request.user.username}")
-        return response
-        
-    except PDFGenerationError as e:
-        logger.error(f"Erro na geração do PDF de movimentações: {str(e)}")
-        messages.error(request, f"Erro ao gerar relatório: {str(e)}")
-        return redirect('reports:report_list')
-    except Exception as e:
-        logger.error(f"Erro inesperado na geração do PDF de movimentações: {str(e)}", exc_info=True)
-        messages.error(request, "Erro inesperado ao gerar relatório. Tente novamente.")
+        MovementsReport.from_parameters(parameters)
+    except MovementPeriodError as e:
+        if _wants_json(request):
+            return JsonResponse({'error': str(e)}, status=400)
+        messages.error(request, str(e))
         return redirect('reports:report_list')
+    return _enqueue_report_response(request, 'movements', parameters)
 
 
 @farmaceutico_required
 @require_http_methods(["GET"])
 def expiration_report_pdf(request):
     """
-    Gerar relatório de vencimentos em PDF - Nova implementação robusta
+    Enfileirar relatório de vencimentos em PDF
     """
     logger.info(f"Usuário {request.user.username} solicitou relatório de vencimentos PDF")
+    return _enqueue_report_response(request, 'expiration')
+
+
+@farmaceutico_required
+@require_http_methods(["GET"])
+def report_export(request, report_type, export_format):
+    """
+    Exportar os dados do relatório em CSV, XLSX ou NDJSON (streaming)
+    """
+    parameters = _report_parameters(request)
     
     try:
-        # Usar o gerador robusto
-        response = pdf_generator.generate_expiration_report_pdf(request)
-        
-        # Registrar no banco
-        try:
-            Report.objects.create(
-                title=f"Relatório de Vencimentos - {timezone.localtime().strftime('%d/%m/%Y %H:%M')}",
-                report_type='expiration',
-                generated_by=request.user,
-                description="Relatório de lotes vencidos e próximos ao vencimento",
-                status='completed'
-            )
-        except Exception as db_error:
-            logger.warning(f"Erro ao registrar relatório no banco: {db_error}")
-        
-        logger.info(f"Relatório de vencimentos gerado com sucesso para {request.user.username}")
-        return response
-        
-    except PDFGenerationError as e:
-        logger.error(f"Erro na geração do PDF de vencimentos: {str(e)}")
-        messages.error(request, f"Erro ao gerar relatório: {str(e)}")
-        return redirect('reports:report_list')
-    except Exception as e:
-        logger.error(f"Erro inesperado na geração do PDF de vencimentos: {str(e)}", exc_info=True)
-        messages.error(request, "Erro inesperado ao gerar relatório. Tente novamente.")
-        return redirect('reports:report_list')
+        writer, content = export_report(report_type, export_format, parameters)
+    except ExportError as e:
+        raise Http404(str(e))
+    except MovementPeriodError as e:
+        return HttpResponse(str(e), status=400, content_type='text/plain; charset=utf-8')
+    
+    logger.info(f"Usuário {request.user.username} exportou relatório {report_type} em {export_format}")
+    timestamp = timezone.localtime().strftime('%Y%m%d_%H%M%S')
+    response = StreamingHttpResponse(content, content_type=writer.content_type)
+    response['Content-Disposition'] = f'attachment; filename="{report_type}_{timestamp}.{writer.extension}"'
+    return response
 
 
 # ===============================
@@ -175,22 +228,27 @@ def expiration_report_pdf(request):
 def pdf_status_check(request):
     """
     Verificar status do sistema de geração de PDFs
+    
+    As engines são importadas na primeira verificação do processo (e não no
+    carregamento das URLs); as chamadas seguintes usam o resultado guardado.
     """
     try:
-        from .pdf_generator import PDF_ENGINE
+        from .engines import ENGINES, get_default_engine
         
+        pdf_engine = get_default_engine()
         status = {
-            'pdf_engine': PDF_ENGINE,
-            'engine_available': PDF_ENGINE is not None,
+            'pdf_engine': pdf_engine,
+            'engine_available': pdf_engine is not None,
+            'engines': {
+                name: {'available': engine.available, 'error': engine.error}
+                for name, engine in ENGINES.items() if engine.probed
+            },
             'timestamp': timezone.localtime().isoformat(),
         }
         
-        if PDF_ENGINE == 'weasyprint':
-            status['engine_name'] = 'WeasyPrint (Preferido)'
-            status['engine_status'] = 'optimal'
-        elif PDF_ENGINE == 'reportlab':
-            status['engine_name'] = 'ReportLab (Fallback)'
-            status['engine_status'] = 'functional'
+        if pdf_engine:
+            status['engine_name'] = ENGINES[pdf_engine].label
+            status['engine_status'] = ENGINES[pdf_engine].status
         else:
             status['engine_name'] = 'Nenhum'
             status['engine_status'] = 'error'
@@ -205,6 +263,33 @@ def pdf_status_check(request):
         }, status=500)
 
 
+@farmaceutico_required
+@require_http_methods(["GET"])
+def api_movements(request):
+    """
+    Movimentações do período: agregados por dia, filial e tipo e uma página
+    do detalhe (?page=, ?page_size=)
+    """
+    try:
+        movements_report = MovementsReport.from_parameters(_report_parameters(request))
+    except MovementPeriodError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    page_size = request.GET.get('page_size', '')
+    page = movements_report.get_page(
+        request.GET.get('page', 1),
+        int(page_size) if page_size.isdigit() else DEFAULT_PAGE_SIZE
+    )
+    
+    return JsonResponse({
+        'start_date': timezone.localtime(movements_report.start_date).isoformat(),
+        'end_date': timezone.localtime(movements_report.end_date).isoformat(),
+        'stats': movements_report.get_stats(),
+        'buckets': movements_report.get_buckets(),
+        'page': page,
+    })
+
+
 # ===============================
 # 📋 VIEWS EXISTENTES MANTIDAS
 # ===============================
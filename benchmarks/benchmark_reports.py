@@ -0,0 +1,119 @@
+"""
+Benchmark da geração de relatórios com catálogos sintéticos (1k, 10k e 100k medicamentos).
+
+    python benchmarks/benchmark_reports.py
+    python benchmarks/benchmark_reports.py --sizes 1000,10000 --report-type stock --engine reportlab
+    python benchmarks/benchmark_reports.py --compare benchmarks/results/reports_anterior.json
+
+Cada tamanho roda num banco de teste descartável (apps/reports/benchmark.py);
+o JSON vai para benchmarks/results/reports_<data>.json por padrão.
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+ENGINES = ['weasyprint', 'reportlab']
+
+
+def setup_django():
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pharmacy_management.settings')
+    import django
+    django.setup()
+
+
+def print_results(results):
+    print(
+        f"\n{'Tamanho':>8}  {'Relatório':<11}{'Fase':<17}{'tempo (s)':>11}"
+        f"{'consultas':>11}{'pico (KB)':>12}"
+    )
+    for run in results['runs']:
+        for report in run['reports']:
+            phases = [('dados', report['data_collection']), ('html', report['html_render'])]
+            phases.extend((f'pdf {engine}', measurement) for engine, measurement in report['engines'].items())
+            for label, measurement in phases:
+                prefix = f"{run['size']:>8}  {report['report_type']:<11}{label:<17}"
+                if measurement.get('available') is False:
+                    print(f"{prefix}{'indisponível':>11}")
+                    continue
+                peak = measurement['peak_memory_kb']
+                print(
+                    f"{prefix}{measurement['seconds']:>11.3f}{measurement['queries']:>11}"
+                    f"{peak if peak is not None else '-':>12}"
+                )
+
+
+def print_comparison(comparison):
+    print(f"\n{'Tamanho':>8}  {'Relatório':<11}{'Fase':<17}{'antes':>9}{'agora':>9}{'variação':>10}")
+    for item in comparison:
+        line = (
+            f"{item['size']:>8}  {item['report_type']:<11}{item['phase']:<17}"
+            f"{item['baseline_seconds']:>9.3f}{item['seconds']:>9.3f}{item['change']:>+10.1%}"
+        )
+        print(f'{line}  <- regressão' if item['regression'] else line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000', help='Tamanhos de catálogo separados por vírgula')
+    parser.add_argument('--report-type', action='append', dest='report_types',
+                        help='Tipo de relatório medido (repetível; padrão: todos)')
+    parser.add_argument('--engine', action='append', choices=ENGINES, dest='engines',
+                        help='Engine PDF medida (repetível; padrão: todas)')
+    parser.add_argument('--branches', type=int, default=3, help='Filiais do catálogo sintético')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='Não medir o pico de memória (evita a segunda execução de cada fase)')
+    parser.add_argument('--output', help='Arquivo JSON de saída (padrão: benchmarks/results/reports_<data>.json)')
+    parser.add_argument('--compare', help='JSON de uma execução anterior para comparar os tempos')
+    options = parser.parse_args()
+
+    try:
+        sizes = [int(size) for size in options.sizes.split(',') if size.strip()]
+    except ValueError:
+        parser.error('--sizes deve ser uma lista de inteiros separados por vírgula')
+    if not sizes or min(sizes) < 1:
+        parser.error('Informe ao menos um tamanho de catálogo positivo')
+
+    baseline = None
+    if options.compare:
+        try:
+            baseline = json.loads(Path(options.compare).read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            parser.error(f'Não foi possível ler {options.compare}: {e}')
+
+    setup_django()
+    from apps.reports import benchmark
+    from apps.reports.pdf_generator import REPORT_TEMPLATES
+
+    unknown = sorted(set(options.report_types or ()) - set(REPORT_TEMPLATES))
+    if unknown:
+        parser.error(f"Tipo de relatório desconhecido: {', '.join(unknown)} (opções: {', '.join(sorted(REPORT_TEMPLATES))})")
+
+    results = benchmark.run_benchmark(
+        sizes=sizes,
+        report_types=options.report_types,
+        engines=options.engines,
+        branches=options.branches,
+        track_memory=not options.no_memory,
+        progress=lambda message: print(f'⏳ {message}'),
+    )
+
+    output = options.output or BASE_DIR / 'benchmarks' / 'results' / (
+        f"reports_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    path = benchmark.write_results(results, output)
+
+    print_results(results)
+    if baseline is not None:
+        print_comparison(benchmark.compare_results(baseline, results))
+    print(f'\n✅ Resultados gravados em {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+"""
+Django configurado para os benchmarks sob pytest (sem pytest-django).
+
+    python -m pytest benchmarks -s
+"""
+
+import os
+
+import django
+
+
+def pytest_configure(config):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pharmacy_management.settings')
+    django.setup()
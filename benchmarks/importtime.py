@@ -0,0 +1,107 @@
+"""
+Tempo de importação de um comando do manage.py (`python -X importtime`).
+
+    python benchmarks/importtime.py                  # manage.py check, 5 execuções
+    python benchmarks/importtime.py --runs 10 --top 15
+    python benchmarks/importtime.py --output benchmarks/results/importtime.json
+
+Mostra o tempo total de importação (mediana), os módulos mais caros e se as
+engines PDF (WeasyPrint/ReportLab) ou o openpyxl (exportação XLSX) foram
+carregados pelo comando.
+"""
+
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Pacotes que só devem ser importados ao gerar um PDF
+PDF_ENGINE_PACKAGES = ('weasyprint', 'reportlab', 'pydyf', 'cffi', 'tinycss2', 'cssselect2')
+# Pacotes que só devem ser importados ao exportar um relatório
+EXPORT_PACKAGES = ('openpyxl',)
+
+LINE_PATTERN = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def parse_importtime(stderr):
+    """Linhas do -X importtime: [(módulo, self_us, cumulativo_us, nível)]"""
+    modules = []
+    for line in stderr.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return modules
+
+
+def measure_command(args=('check',), python=sys.executable):
+    """Executar `manage.py <args>` com -X importtime e resumir as importações"""
+    completed = subprocess.run(
+        [python, '-X', 'importtime', 'manage.py', *args],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f'manage.py {" ".join(args)} falhou:\n{completed.stderr[-2000:]}')
+
+    modules = parse_importtime(completed.stderr)
+    top_level = [module for module in modules if module[3] == 0]
+    loaded = {name.split('.')[0] for name, _, _, _ in modules}
+    return {
+        'total_us': sum(cumulative for _, _, cumulative, _ in top_level),
+        'modules': len(modules),
+        'pdf_engines_loaded': sorted(loaded.intersection(PDF_ENGINE_PACKAGES)),
+        'export_packages_loaded': sorted(loaded.intersection(EXPORT_PACKAGES)),
+        'top': sorted(top_level, key=lambda module: module[2], reverse=True),
+    }
+
+
+def run(args=('check',), runs=5, top=10):
+    measurements = [measure_command(args) for _ in range(runs)]
+    last = measurements[-1]
+    return {
+        'command': f'manage.py {" ".join(args)}',
+        'runs': runs,
+        'median_ms': statistics.median(m['total_us'] for m in measurements) / 1000,
+        'min_ms': min(m['total_us'] for m in measurements) / 1000,
+        'modules': last['modules'],
+        'pdf_engines_loaded': last['pdf_engines_loaded'],
+        'export_packages_loaded': last['export_packages_loaded'],
+        'top': [
+            {'module': name, 'cumulative_ms': cumulative / 1000}
+            for name, _, cumulative, _ in last['top'][:top]
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('command', nargs='*', default=['check'], help='Comando do manage.py (padrão: check)')
+    parser.add_argument('--runs', type=int, default=5, help='Execuções (usa a mediana)')
+    parser.add_argument('--top', type=int, default=10, help='Módulos mais caros exibidos')
+    parser.add_argument('--output', help='Gravar o resultado em JSON')
+    options = parser.parse_args()
+
+    result = run(options.command, options.runs, options.top)
+    print(f"{result['command']}: importações em {result['median_ms']:.1f} ms "
+          f"(mediana de {result['runs']}, mínimo {result['min_ms']:.1f} ms), {result['modules']} módulos")
+    print(f"Engines PDF carregadas: {', '.join(result['pdf_engines_loaded']) or 'nenhuma'}")
+    print(f"Pacotes de exportação carregados: {', '.join(result['export_packages_loaded']) or 'nenhum'}")
+    for item in result['top']:
+        print(f"{item['cumulative_ms']:>10.1f} ms  {item['module']}")
+
+    if options.output:
+        path = Path(options.output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f'Resultado gravado em {path}')
+
+
+if __name__ == '__main__':
+    main()
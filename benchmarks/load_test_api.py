@@ -0,0 +1,237 @@
+"""
+Teste de carga dos endpoints de polling: WSGI (gunicorn) x ASGI (uvicorn).
+
+    python benchmarks/load_test_api.py                        # os dois servidores
+    python benchmarks/load_test_api.py --server asgi --workers 2 --concurrency 32
+    python benchmarks/load_test_api.py --base-url http://127.0.0.1:8000
+    python benchmarks/load_test_api.py --output benchmarks/results/load_test_api.json
+
+O gunicorn executa as views síncronas e o uvicorn as versões async
+(ASYNC_API_VIEWS, ligado pelo asgi.py); cada conexão keep-alive repete o GET
+até o fim do período. Usa o banco configurado no settings (um administrador
+e ao menos um estoque de filial).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SERVERS = {
+    'wsgi': lambda port, workers, threads: [
+        sys.executable, '-m', 'gunicorn', 'pharmacy_management.wsgi:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--threads', str(threads),
+        '--log-level', 'warning',
+    ],
+    'asgi': lambda port, workers, threads: [
+        sys.executable, '-m', 'uvicorn', 'pharmacy_management.asgi:application',
+        '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers),
+        '--log-level', 'warning', '--no-access-log',
+    ],
+}
+
+
+def setup_django():
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pharmacy_management.settings')
+    import django
+    django.setup()
+
+
+def login_session():
+    """Sessão de um administrador (cookie usado por todas as conexões)"""
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    user = User.objects.filter(is_superuser=True).order_by('pk').first() or User.objects.order_by('pk').first()
+    if user is None:
+        raise SystemExit('Nenhum usuário cadastrado para autenticar as requisições')
+    client = Client()
+    client.force_login(user)
+    return settings.SESSION_COOKIE_NAME, client.cookies[settings.SESSION_COOKIE_NAME].value
+
+
+def endpoint_paths():
+    from apps.branches.models import BranchStock
+
+    stock = BranchStock.objects.order_by('pk').first()
+    if stock is None:
+        raise SystemExit('Cadastre ao menos um estoque de filial para testar as APIs de estoque')
+    return {
+        'get_notifications': '/api/notifications/',
+        'get_critical_notifications': '/api/notifications/critical/',
+        'api_branch_stats': f'/branches/api/{stock.branch_id}/stats/',
+        'api_stock_sync': f'/branches/api/stock/{stock.branch_id}/{stock.medication_id}/sync/',
+        'api_get_available_stock': (
+            f'/branches/api/stock/available/?branch_id={stock.branch_id}&medication_id={stock.medication_id}'
+        ),
+    }
+
+
+def start_server(server, workers, threads):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        SERVERS[server](port, workers, threads),
+        cwd=BASE_DIR,
+        env=dict(os.environ, DEBUG='False'),
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'O servidor {server} encerrou ao iniciar (gunicorn/uvicorn instalados?)')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit(f'O servidor {server} não respondeu em 30s')
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {
+        name.strip().lower(): value.strip()
+        for name, _, value in (line.partition(':') for line in lines[1:] if line)
+    }
+    await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def load(base_url, path, cookie, concurrency, duration):
+    """Conexões keep-alive repetindo o GET até o fim do período"""
+    host, port = base_url.split('://', 1)[1].split(':')
+    request = (
+        f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n'
+        f'Cookie: {cookie[0]}={cookie[1]}\r\nConnection: keep-alive\r\n\r\n'
+    ).encode()
+    latencies = []
+    errors = 0
+    stop_at = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, int(port))
+        try:
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                writer.write(request)
+                status, keep_alive = await read_response(reader)
+                latencies.append(time.perf_counter() - started)
+                if status != 200:
+                    errors += 1
+                if not keep_alive:
+                    writer.close()
+                    reader, writer = await asyncio.open_connection(host, int(port))
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'path': path,
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else None,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else None,
+    }
+
+
+def print_result(result):
+    print(
+        f"{result['server']:<8}{result['endpoint']:<29}{result['rps']:>9.1f} req/s"
+        f"{result['p50_ms']:>9.1f} ms p50{result['p99_ms']:>9.1f} ms p99"
+        f"{result['errors']:>7} erros"
+    )
+
+
+def print_comparison(results):
+    by_key = {(result['server'], result['endpoint']): result for result in results}
+    print(f"\n{'Endpoint':<29}{'req/s WSGI':>12}{'req/s ASGI':>12}{'p99 WSGI':>11}{'p99 ASGI':>11}")
+    for endpoint in dict.fromkeys(result['endpoint'] for result in results):
+        wsgi, asgi = by_key.get(('wsgi', endpoint)), by_key.get(('asgi', endpoint))
+        if not wsgi or not asgi:
+            continue
+        print(
+            f"{endpoint:<29}{wsgi['rps']:>12.1f}{asgi['rps']:>12.1f}"
+            f"{wsgi['p99_ms']:>9.1f}ms{asgi['p99_ms']:>9.1f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--server', choices=['wsgi', 'asgi', 'both'], default='both',
+                        help='Servidor(es) iniciados para o teste')
+    parser.add_argument('--base-url',
+                        help='Testar um servidor já em execução (ex.: http://127.0.0.1:8000) em vez de iniciar um')
+    parser.add_argument('--concurrency', type=int, default=50, help='Conexões simultâneas')
+    parser.add_argument('--duration', type=float, default=10.0, help='Segundos de carga por endpoint')
+    parser.add_argument('--workers', type=int, default=1, help='Processos do servidor')
+    parser.add_argument('--threads', type=int, default=8, help='Threads por processo do gunicorn (WSGI)')
+    parser.add_argument('--output', help='Gravar os resultados em JSON')
+    options = parser.parse_args()
+    if options.concurrency < 1 or options.duration <= 0:
+        parser.error('--concurrency e --duration devem ser positivos')
+
+    setup_django()
+    cookie = login_session()
+    paths = endpoint_paths()
+
+    if options.base_url:
+        targets = [('externo', options.base_url.rstrip('/'), None)]
+    else:
+        servers = ['wsgi', 'asgi'] if options.server == 'both' else [options.server]
+        targets = [(name, None, name) for name in servers]
+
+    results = []
+    for label, base_url, server in targets:
+        process = None
+        if server:
+            process, base_url = start_server(server, options.workers, options.threads)
+        try:
+            for endpoint, path in paths.items():
+                result = asyncio.run(load(base_url, path, cookie, options.concurrency, options.duration))
+                result.update(server=label, endpoint=endpoint)
+                results.append(result)
+                print_result(result)
+        finally:
+            if process:
+                process.terminate()
+                process.wait(timeout=10)
+
+    if len(targets) > 1:
+        print_comparison(results)
+    if options.output:
+        path = Path(options.output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({
+            'timestamp': datetime.now().isoformat(),
+            'concurrency': options.concurrency,
+            'duration': options.duration,
+            'workers': options.workers,
+            'threads': options.threads,
+            'results': results,
+        }, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f'Resultados gravados em {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+"""
+Importações do `manage.py check` (mesma medição de benchmarks/importtime.py).
+
+    python -m pytest benchmarks/test_import_time.py -s
+"""
+
+from importtime import measure_command
+
+
+def test_check_does_not_load_pdf_or_export_packages():
+    result = measure_command(('check',))
+    print(f"manage.py check: importações em {result['total_us'] / 1000:.1f} ms, {result['modules']} módulos")
+    # WeasyPrint/ReportLab só devem ser carregados ao gerar um PDF
+    assert result['pdf_engines_loaded'] == []
+    # openpyxl só ao exportar em XLSX (as URLs importam apps.reports.exporters)
+    assert result['export_packages_loaded'] == []
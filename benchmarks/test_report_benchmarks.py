@@ -0,0 +1,33 @@
+"""
+Benchmark dos relatórios sob pytest (mesma suíte do benchmarks/benchmark_reports.py).
+
+    python -m pytest benchmarks -s
+    REPORT_BENCHMARK_SIZES=1000,10000,100000 python -m pytest benchmarks -s
+
+Tamanhos em REPORT_BENCHMARK_SIZES (padrão: 1000) e JSON gravado em
+REPORT_BENCHMARK_OUTPUT (padrão: diretório temporário do pytest).
+"""
+
+import os
+
+import pytest
+
+from apps.reports import benchmark
+
+SIZES = [int(size) for size in os.environ.get('REPORT_BENCHMARK_SIZES', '1000').split(',') if size.strip()]
+
+
+@pytest.mark.parametrize('size', SIZES)
+def test_report_benchmark(size, tmp_path):
+    results = benchmark.run_benchmark(sizes=[size], progress=print)
+    output = os.environ.get('REPORT_BENCHMARK_OUTPUT') or tmp_path / f'reports_{size}.json'
+    print(f'Resultados gravados em {benchmark.write_results(results, output)}')
+
+    run = results['runs'][0]
+    for report in run['reports']:
+        assert report['rows'] > 0
+        # Consultas da coleta não podem crescer com o número de linhas
+        assert report['data_collection']['queries'] < 20
+        for engine, measurement in report['engines'].items():
+            if measurement['available']:
+                assert measurement['pages'] >= 1
@@ -5,6 +5,8 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+    uvicorn pharmacy_management.asgi:application --workers 4
 """
 
 import os
@@ -12,5 +14,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pharmacy_management.settings')
+# Endpoints de polling async (ver ASYNC_API_VIEWS em settings)
+os.environ.setdefault('ASYNC_API_VIEWS', 'True')
 
 application = get_asgi_application()
@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 
+import django
+from decouple import config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -23,7 +26,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-(%xur)wb0q0j*!6*n85b7!lee6&=jg1sg++k5#i%pr1ms6&=z3'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = config('DEBUG', default=True, cast=bool)
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', 'testserver']
 
@@ -49,7 +52,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.core.middleware.HealthCheckMiddleware',  # /health/live/ e /health/ready/ sem o restante da pilha
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',  # Estáticos com hash, gzip/brotli e cache longo
+    'apps.core.middleware.RequestMetricsMiddleware',  # Latência, consultas e tamanho por view (/metrics)
     'apps.core.middleware.UTF8ResponseMiddleware',  # Força UTF-8 em todas as respostas
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
@@ -75,23 +81,91 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'apps.authentication.middleware.user_profile_context_processor',
+                'apps.core.fragments.fragment_cache_context',
             ],
         },
     },
 ]
 
+# Fragmentos em cache ({% cache %}) versionados por DataVersion: o timeout só
+# descarta entradas de versões antigas (segundos)
+FRAGMENT_CACHE_TIMEOUT = 3600
+
+# Cache padrão em memória do processo, com contagem de acertos/falhas (/metrics)
+CACHES = {
+    'default': {
+        'BACKEND': 'apps.core.metrics.MetricsLocMemCache',
+        'LOCATION': 'default',
+    }
+}
+
+# Métricas de desempenho: requisições acima deste tempo (segundos) vão para o
+# log com as consultas mais lentas; o token permite a coleta pelo Prometheus
+# sem sessão de administrador
+SLOW_REQUEST_SECONDS = config('SLOW_REQUEST_SECONDS', default=1.0, cast=float)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# /health/status/ (readiness + contadores de alertas) é recalculado no máximo
+# uma vez a cada HEALTH_STATUS_CACHE_TIMEOUT segundos
+HEALTH_STATUS_CACHE_TIMEOUT = 30
+
+# Endpoints de polling (notificações e estoque das filiais) em versões async.
+# O asgi.py liga por padrão; no WSGI as views síncronas evitam o custo de
+# executar cada view async num event loop próprio.
+ASYNC_API_VIEWS = config('ASYNC_API_VIEWS', default=False, cast=bool)
+
+# Lista de notificações em cache (segundos); a chave inclui a versão do estoque
+NOTIFICATIONS_CACHE_TIMEOUT = 30
+
 WSGI_APPLICATION = 'pharmacy_management.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Perfil escolhido por variável de ambiente (ou .env):
+#   DATABASE_ENGINE=sqlite     - arquivo db.sqlite3 local (padrão, desenvolvimento)
+#   DATABASE_ENGINE=postgresql - produção; várias filiais gravando ao mesmo tempo
+#                                sem "database is locked"
+DATABASE_ENGINE = config('DATABASE_ENGINE', default='sqlite')
+SQLITE_DATABASE_PATH = config('SQLITE_DATABASE_PATH', default=str(BASE_DIR / 'db.sqlite3'))
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DATABASE_NAME', default='pharmacy_db'),
+            'USER': config('DATABASE_USER', default='postgres'),
+            'PASSWORD': config('DATABASE_PASSWORD', default=''),
+            'HOST': config('DATABASE_HOST', default='localhost'),
+            'PORT': config('DATABASE_PORT', default='5432'),
+            # Conexões persistentes, verificadas antes de reutilizar
+            'CONN_MAX_AGE': config('DATABASE_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': config('DATABASE_CONNECT_TIMEOUT', default=5, cast=int),
+            },
+        },
+        # Banco SQLite antigo, origem do comando copy_sqlite_to_postgres
+        'sqlite_source': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': SQLITE_DATABASE_PATH,
+        },
     }
-}
+    # Pool no servidor (PgBouncer em modo transaction): cursores do lado do
+    # servidor não sobrevivem à troca de conexão entre transações
+    if config('DATABASE_POOLER', default=False, cast=bool):
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': SQLITE_DATABASE_PATH,
+        }
+    }
+    # Django 5.1+: toda transação começa com BEGIN IMMEDIATE (ver apps.core.db)
+    if django.VERSION >= (5, 1):
+        DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
 
 
 # Password validation
@@ -140,11 +214,37 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
+STATIC_ROOT = config('STATIC_ROOT', default=str(BASE_DIR / 'staticfiles'))
+
+# Produção: `collectstatic` minifica CSS/JS, gera nomes com hash e variantes
+# .gz/.br (apps.core.storage). Em desenvolvimento os arquivos de static/ são
+# servidos diretamente, sem build.
+STATIC_MINIFY = True
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'apps.core.storage.MinifiedManifestStaticFilesStorage'
+        ),
+    },
+}
+# Arquivos sem hash (ex.: favicon referenciado diretamente): 1 dia
+WHITENOISE_MAX_AGE = 0 if DEBUG else 86400
 
 # Configuração de arquivos de media
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Autenticação: o perfil (função) é carregado na mesma consulta do usuário.
+# ModelBackend continua na lista para as sessões abertas antes da troca.
+AUTHENTICATION_BACKENDS = [
+    'apps.authentication.backends.ProfileModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # Configuração de login
 LOGIN_URL = '/auth/login/'
 LOGIN_REDIRECT_URL = '/'
@@ -168,11 +268,47 @@ WHATSAPP_API_URL = ''  # URL da API do WhatsApp
 WHATSAPP_API_TOKEN = ''  # Token de acesso
 WHATSAPP_FROM_NUMBER = ''  # Número de origem
 
+# Janela de silêncio para alertas repetidos (filial, medicamento, tipo).
+# Os alertas são enviados pelo comando flush_pending_alerts (cron)
+NOTIFICATION_QUIET_WINDOW = 3600  # segundos
+
+# Retenção de logs de notificação (linhas antigas viram contagens mensais)
+NOTIFICATION_LOG_RETENTION_DAYS = 180
+NOTIFICATION_LOG_BATCH_SIZE = 500  # registros por INSERT/DELETE em lote
+
+# Resumo de vencimentos por filial (comando send_expiry_digests)
+EXPIRY_DIGEST_DAYS = 30  # dias à frente considerados "próximo ao vencimento"
+EXPIRY_DIGEST_INTERVAL_HOURS = 24  # intervalo mínimo entre resumos da mesma filial
+
 # Configurações de PDF
 PDF_GENERATION_TIMEOUT = 60  # segundos
 PDF_MAX_PAGES = 500  # máximo de páginas por PDF
 PDF_CHUNK_SIZE = 1000  # registros por chunk para relatórios grandes
 
+# Execução dos jobs de relatório:
+#   'thread' - thread em segundo plano no próprio processo web (desenvolvimento)
+#   'worker' - apenas enfileira; processado por `manage.py run_report_worker`
+REPORT_JOB_BACKEND = 'thread'
+REPORT_WORKER_POLL_INTERVAL = 2  # segundos entre consultas à fila
+REPORT_CACHE_INFLIGHT_TIMEOUT = 300  # segundos até um job em andamento deixar de receber seguidores
+
+# Renderização dos PDFs:
+#   'inline'     - no próprio processo que executa o job
+#   'process'    - em ProcessPoolExecutor com PDF_RENDER_WORKERS processos (padrão: núcleos)
+#   'subprocess' - um processo isolado por relatório, com limite de memória e
+#                  encerramento forçado após PDF_GENERATION_TIMEOUT
+PDF_RENDER_BACKEND = 'subprocess'
+PDF_RENDER_WORKERS = None  # também limita renderizações isoladas simultâneas
+PDF_RENDER_MEMORY_LIMIT_MB = 2048  # RLIMIT_AS do processo isolado
+PDF_PREWARM = True  # pré-aquecer a engine (CSS, fontes, templates) ao iniciar workers
+# Manter um processo isolado aquecido de reserva para o próximo relatório
+# ('subprocess'). Cada processo web passa a ter um processo Django ocioso a
+# mais; ligar apenas onde há memória sobrando e poucos processos web.
+PDF_RENDER_STANDBY = config('PDF_RENDER_STANDBY', default=False, cast=bool)
+REPORT_QUEUE_LIMIT = 20  # jobs em andamento no total antes de responder 503
+REPORT_USER_QUEUE_LIMIT = 3  # jobs em andamento por usuário antes de responder 429
+REPORT_RETRY_AFTER = 30  # segundos informados no header Retry-After
+
 # Configurações de Logging
 LOGGING = {
     'version': 1,
@@ -212,6 +348,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'apps.core.middleware': {
+            'handlers': ['file', 'console'],
+            'level': 'INFO',
+            'propagate': True,
+        },
         'apps.reports.pdf': {
             'handlers': ['pdf_file', 'console'],
             'level': 'DEBUG',